@@ -1,13 +1,30 @@
+import contextlib
 import math
+import os
+import threading
+import uuid
 
 import dash
+import numpy as np
 import pandas as pd
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ALL
 from dash import html, dash_table
 from dash import dcc
+from flask import Response, jsonify, request
 
+from background_search import BackgroundSearches, SearchCancelled, checkpoint
+from candidate_data import memory_report
+from candidate_reload import CandidateReloader
+from candidate_store import CandidateStore, default_snapshot_path
 from comparison_framework import SuitabilityScoreFramework
+from file_lock import file_lock
+from job_matching import JobMatcher, JobReloader, MatchIndex, build_match_index, match_version
+from parallel_scoring import ParallelScorer
+from saved_searches import SavedSearches
+from scoring_rules import load_rules
+from search_cache import SearchCache, DimensionScoreCache
+from metrics import MetricsRegistry, SearchMetrics, Gauge, ReadCounter, select_values
 
 #Instantiates the Dash app and identify the server
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], meta_tags=[
@@ -71,6 +88,37 @@ def create_rangeslider(label_text: str = None, range_min: int = None, range_max:
 
     return range_slider_row
 
+def create_slider(label_text: str = None, slider_min: int = None, slider_max: int = None, slider_step: int = None, slider_value: int = None, slider_id=None):
+    """
+    This function creates a slider for a single value between slider_min and slider_max.
+
+    Args:
+        label_text: The text shown as default on the slider
+        slider_min: The minimum value of the slider
+        slider_max: The maximum value of the slider
+        slider_step: The step between values of the slider
+        slider_value: The starting value of the slider
+        slider_id: The id of the slider, a string or a pattern matching dictionary
+
+    Returns:
+        A row object including the slider
+    """
+
+    slider_row = dbc.Row(
+        [
+            dbc.Col(html.Label(children=label_text,
+                               className='input-text'),
+                                className='input-labels'),
+            dbc.Col(dcc.Slider(min=slider_min,
+                               max=slider_max,
+                               step=slider_step,
+                               value=slider_value,
+                               id=slider_id))
+        ], className='rangeslider-input'
+    )
+
+    return slider_row
+
 def create_datatable(datatable_id):
     """
     This function creates a datatable based on the data passed to it from the callback.
@@ -95,6 +143,9 @@ def create_datatable(datatable_id):
                                  style_cell={'height': 'auto',
                                              'minWidth': '180px', 'width': '180px', 'maxWidth': '180px',
                                              'whiteSpace': 'normal', 'textAlign': 'left'},
+                                 page_action='custom',
+                                 page_current=0,
+                                 page_size=25,
                                  sort_action='custom',
                                  sort_mode='single',
                                  sort_by=[]
@@ -104,274 +155,831 @@ def create_datatable(datatable_id):
 
     return datatable_row
 
-def convert_list_as_string(ls_as_string: list):
+locations_file = 'Locations.csv'
+# an optional json file of scoring rules, see scoring_rules, replacing the default rules of those dimensions
+rules_file = os.environ.get('PROSPECTING_RULES_FILE')
+ss = SuitabilityScoreFramework(locations_file=locations_file if os.path.exists(locations_file) else None,
+                               rules=load_rules(rules_file) if rules_file else None)
+ss.framework_weighting = {'Location': 5,
+                           'Salary': 5,
+                           'Skills': 3,
+                           'Experience': 3,
+                           'WFH': 3,
+                           'Sector': 3,
+                           'Area': 3,
+                           'Expertise' : 5,
+                           'Last Move': 3,
+                           'Move Status': 5,
+                           }
+candidate_data_file = os.environ.get('PROSPECTING_DATA_FILE', 'Dummy_Candidate_Data.csv')
+snapshot_file = os.environ.get('PROSPECTING_SNAPSHOT_FILE', default_snapshot_path(candidate_data_file))
+
+move_types = ['Urgently Looking', 'Actively Looking', 'Open Minded', 'Unlikely to Move']
+unique_areas = ['London Market', "Lloyd's Syndicate", 'Consultancy', 'Personal Lines', 'Commercial Lines', 'Reinsurer', 'Broker', 'Reinsurance Broker', 'Regulator']
+
+def create_memory_report(store: CandidateStore) -> pd.DataFrame:
+    return memory_report(store.df, stores={'{} ({})'.format(x, type(y).__name__): y for x, y in [*store.lists.items(), *store.column_indexes.items()] if hasattr(y, 'nbytes')})
+
+def create_parallel_scorer(store: CandidateStore):
+    return ParallelScorer(df=store.df, framework=ss, column_indexes=store.column_indexes, n_workers=scoring_workers, min_candidates=parallel_min_candidates) if scoring_workers > 1 else None
+
+def swap_dataset(store: CandidateStore, old_store: CandidateStore):
     """
-    Data is contained in a list gets saved as a string when on disk. This function coverts the string back into a list
+    Rebuilds the state derived from the candidate data once the reloader has swapped in a new version. The caches
+    are keyed by the dataset version, so they drop the old version's results on their next use.
 
     Args:
-        ls_as_string: the string which has values in a list within it
+        store: the new candidate store
+        old_store: the store it replaced
+    """
+    global dataset_memory, parallel_scorer
+
+    dataset_memory = create_memory_report(store)
+    with search_metrics.stage('refresh_saved_searches', n_candidates=len(store.df)):
+        saved_searches.refresh(store)
+
+    old_scorer = parallel_scorer
+    parallel_scorer = create_parallel_scorer(store)
+    if old_scorer is not None:
+        # waits for the shards of any search still scoring on the old version, a search which read the old scorer
+        # just before the swap is then scored in process
+        old_scorer.close()
+
+    refresh_match_index(store)
+
+# loaded from the binary snapshot of the csv when it is up to date, otherwise the csv is parsed and the snapshot rebuilt.
+# The snapshot is memory-mapped read-only, so gunicorn workers, whether forked after --preload or each loading it
+# themselves, share one copy of the candidate data in the page cache. The csv is then polled for changes, which are
+# applied as a delta and swapped in, each search reads candidate_reloader.store once and finishes on that version
+candidate_reloader = CandidateReloader(candidate_data_file, store=CandidateStore.load(candidate_data_file, snapshot_path=snapshot_file),
+                                       snapshot_path=snapshot_file, key_column=os.environ.get('PROSPECTING_KEY_COLUMN'),
+                                       interval_seconds=float(os.environ.get('PROSPECTING_RELOAD_SECONDS', 30)), on_swap=swap_dataset)
+server.before_request(candidate_reloader.start)
+
+dataset_memory = create_memory_report(candidate_reloader.store)
+search_cache = SearchCache()
+# with prune_searches set a search with a depth fully scores only the candidates which can still reach its best
+# depth scores, off by default until it has been run against production traffic
+prune_searches = os.environ.get('PROSPECTING_PRUNE_SEARCHES', '0') == '1'
+
+# each session's last dimension scores, so a resubmit only rescores the dimensions whose inputs changed
+dimension_cache = DimensionScoreCache()
+
+# batch searches score their searches x candidates matrix in blocks within this many bytes
+batch_memory_budget = int(os.environ.get('PROSPECTING_BATCH_MEMORY_BYTES', 256 * 1024 ** 2))
+batch_max_searches = 1000
+batch_max_k = 1000
+
+# jobs for candidates to be matched against, polled for changes like the candidate csv. The best matches of every job
+# and candidate are kept in a match index built from one version of each and stored in match_index_file. Whenever
+# either changes a new index is built in the background, and the last one is served with its versions meanwhile
+job_data_file = os.environ.get('PROSPECTING_JOBS_FILE', 'Dummy_Job_Data.csv')
+job_reloader = JobReloader(job_data_file, interval_seconds=float(os.environ.get('PROSPECTING_RELOAD_SECONDS', 30)),
+                           on_swap=lambda jobs: refresh_match_index())
+server.before_request(job_reloader.start)
+match_index_file = os.environ.get('PROSPECTING_MATCHES_FILE', os.path.splitext(job_data_file)[0] + '.matches.npz')
+match_index_k = 50
+# a tuple of the match index, the candidate store and the jobs it was built from, None until the first is built
+match_index = None
+# the version of the match index being built and the process building it
+match_index_build = None
+match_index_lock = threading.Lock()
+job_search_max_k = 1000
+candidate_profile_columns = ['Location', 'Sector', 'Major Expertise', 'Minor Expertise', 'Min Salary', 'Max Salary', 'Years Experience', 'WFH Days', 'Skills', 'Job Type']
+
+# with background_searches set the table's searches run on a local thread pool and the page polls for their progress,
+# so a large search does not hold the request, and a session's new search cancels the one it replaces
+background_searches = os.environ.get('PROSPECTING_BACKGROUND_SEARCHES', '0') == '1'
+search_tasks = BackgroundSearches(max_workers=int(os.environ.get('PROSPECTING_BACKGROUND_WORKERS', 2)))
+search_poll_milliseconds = 500
+
+# named searches whose best saved_search_depth candidates are kept in saved_searches_directory, refreshed with only
+# the changed candidates whenever a new version is swapped in, so opening one never scores the pool
+saved_searches_directory = os.environ.get('PROSPECTING_SAVED_SEARCHES_DIR', os.path.splitext(candidate_data_file)[0] + '.saved')
+saved_search_depth = 500
+saved_searches = SavedSearches(saved_searches_directory, framework=ss, depth=saved_search_depth)
+saved_search_max_k = 1000
+
+# searches are scored across this many processes, pools under parallel_min_candidates are scored in process
+scoring_workers = int(os.environ.get('PROSPECTING_SCORING_WORKERS', 1))
+parallel_min_candidates = 50000
+parallel_scorer = create_parallel_scorer(candidate_reloader.store)
+
+# per-stage search timings, the dataset size and version and the cache stats, served as Prometheus text on /metrics
+metrics_registry = MetricsRegistry()
+search_metrics = SearchMetrics(metrics_registry)
+metrics_registry.register(Gauge('prospecting_dataset_candidates', 'Number of candidates loaded.', lambda: len(candidate_reloader.store.df)))
+metrics_registry.register(Gauge('prospecting_dataset_version', 'The version of the candidate data being searched, always 1.',
+                                lambda: {candidate_reloader.store.version: 1}, label_name='version'))
+metrics_registry.register(ReadCounter('prospecting_dataset_reloads', 'Reloads of the candidate data and the candidates appended, changed and removed by them.',
+                                      lambda: candidate_reloader.stats(), label_name='stat'))
+metrics_registry.register(ReadCounter('prospecting_job_reloads', 'Reloads of the job data.',
+                                      lambda: job_reloader.stats(), label_name='stat'))
+metrics_registry.register(ReadCounter('prospecting_search_cache', 'Search cache hits, misses, evictions and invalidations.',
+                                      select_values(lambda: search_cache.stats(), ['hits', 'misses', 'evictions', 'invalidations']), label_name='stat'))
+metrics_registry.register(Gauge('prospecting_search_cache_held', 'Search cache entries and bytes held.',
+                                select_values(lambda: search_cache.stats(), ['entries', 'bytes']), label_name='stat'))
+metrics_registry.register(Gauge('prospecting_dataset_bytes', 'Bytes held by each column of the candidate data and the structures alongside it.',
+                                lambda: dataset_memory['Bytes'].drop('Total').to_dict(), label_name='column'))
+metrics_registry.register(Gauge('prospecting_dataset_mapped_bytes', 'Bytes of the candidate data memory-mapped from the snapshot and shared between workers.',
+                                lambda: int(dataset_memory.loc[dataset_memory['Mapped'].astype(bool), 'Bytes'].drop('Total', errors='ignore').sum())))
+metrics_registry.register(ReadCounter('prospecting_background_searches', 'Background searches submitted, completed, cancelled and failed.',
+                                      select_values(lambda: search_tasks.stats(), ['submitted', 'completed', 'cancelled', 'failed']), label_name='stat'))
+metrics_registry.register(Gauge('prospecting_background_searches_running', 'Background searches running.',
+                                lambda: search_tasks.stats()['running']))
+metrics_registry.register(ReadCounter('prospecting_saved_searches', 'Saved searches saved, opened, refreshed incrementally, rescored and failed, and the rows rescored.',
+                                      select_values(lambda: saved_searches.stats(), ['saved', 'opened', 'refreshed', 'rescored', 'failed', 'rows_rescored']), label_name='stat'))
+metrics_registry.register(Gauge('prospecting_saved_searches_held', 'Saved searches held.',
+                                lambda: saved_searches.stats()['searches']))
+metrics_registry.register(ReadCounter('prospecting_dimension_cache', 'Dimension scores reused and rescored.',
+                                      select_values(lambda: dimension_cache.stats(), ['dimensions_reused', 'dimensions_scored']), label_name='stat'))
+metrics_registry.register(Gauge('prospecting_dimension_cache_held', 'Dimension cache sessions and bytes held.',
+                                select_values(lambda: dimension_cache.stats(), ['sessions', 'bytes']), label_name='stat'))
+
+# searches saved against an earlier version are brought up to date before the first is opened, by whichever worker
+# starts first, the others reading its results
+saved_searches.refresh(candidate_reloader.store)
+
+@server.route('/metrics')
+def serve_metrics():
+    return Response(metrics_registry.render(), content_type=metrics_registry.content_type)
+
+@server.route('/dataset')
+def serve_dataset_version():
+    # the version changes whenever new candidate data is swapped in, so clients can drop results cached against it
+    store = candidate_reloader.store
+    response = jsonify({'version': store.version, 'candidates': len(store.df)})
+    response.headers['ETag'] = store.version
+
+    return response
+
+def score_candidates(criteria: dict, contract_type_input: list, store: CandidateStore = None, depth: int = None, session_id: str = None):
+    """
+    Scores every candidate of the selected contract types against the search criteria. Results are cached,
+    so repeating a search returns the stored scores rather than scoring the pool again. When prune_searches
+    is set and a depth is given, only the candidates which can reach the best depth scores are fully scored, and
+    when scoring_workers is above 1 they are scored across the parallel scorer's worker processes. Otherwise, given
+    a session_id, only the dimensions whose inputs changed since the session's last search are scored again. Each
+    stage is timed in search_metrics.
+
+    Args:
+        criteria: the search criteria, keyed by the input argument names of the apply_framework_* functions
+        contract_type_input: the contract types to include
+        store: the candidate store to search, defaults to the current version
+        depth: the number of best candidates which must be ranked, e.g. offset + k of the page being shown
+        session_id: the id of the session searching, to reuse the dimension scores of its last search
 
     Returns:
-        a list of values, which are not whitespace, within that string
+        a tuple of the positions in store.df of the scored candidates, a DataFrame of their scores and the number of
+        candidates of the selected contract types
     """
-    ls_as_string = ls_as_string[2:-2]
-    if "'s" not in ls_as_string:
-        string_to_list = ls_as_string.split("'")
-        ls_as_ls = [x for x in string_to_list if not x.isspace()]
-    else:
-        string_to_list = ls_as_string.split('"')
-        contains_apostrophe = [x for x in string_to_list if "'s" in x]
-        not_contains_apostrophe = [x for x in string_to_list if x not in contains_apostrophe]
-        not_contains_apostrophe_as_ls = [x.split("'") for x in not_contains_apostrophe]
-        not_contains_apostrophe_as_ls = [item for sublist in not_contains_apostrophe_as_ls for item in sublist]
-        ls_as_ls = [x for x in not_contains_apostrophe_as_ls if not x.isspace()]
-        ls_as_ls = ls_as_ls + contains_apostrophe
+    store = candidate_reloader.store if store is None else store
+    df = store.df
+    dataset_version = store.version
+    # a search which started before a reload is scored in process rather than by the new version's scorer
+    scorer = parallel_scorer if parallel_scorer is not None and parallel_scorer.df is df else None
 
-    return ls_as_ls
+    search = dict(criteria, contract_type=contract_type_input)
+    if (prune_searches or scorer is not None) and depth is not None:
+        search['depth'] = depth
 
-def convert_col_with_ls(df_col):
+    with search_metrics.stage('cache_lookup'):
+        scored = search_cache.get(search, dataset_version=dataset_version)
 
-    df_col = df_col.apply(lambda x: convert_list_as_string(x))
+    def report_dimension(dimension: str, share_scored: float):
+        checkpoint('Scoring {}'.format(ss.kwargs_to_framework_mapping[dimension]), 0.05 + 0.8 * share_scored)
 
-    unique_list = []
+    if scored is None and scorer is not None and depth is not None:
+        checkpoint('Scoring', 0.05)
+        with search_metrics.stage('score_parallel', n_candidates=len(df)):
+            scored = scorer.score_top_k(criteria=criteria, depth=depth, contract_types=contract_type_input)
+        search_cache.put(search, dataset_version=dataset_version, result=scored)
 
-    for x in range(0, len(df_col)):
-        unique_list.extend(df_col[x])
+    elif scored is None:
+        with search_metrics.stage('filter', n_candidates=len(df)):
+            positions = np.flatnonzero(df['Job Type'].isin(contract_type_input).to_numpy())
+            data_df = df.iloc[positions]
+            data_column_indexes = {x: y.take(positions) for x, y in store.column_indexes.items()}
 
-    unique_list = sorted(list(set(unique_list)))
+        if prune_searches and depth is not None:
+            checkpoint('Scoring', 0.05)
+            with search_metrics.stage('score_pruned', n_candidates=len(positions)):
+                kept_positions, scores_df = ss.score_frame_pruned(df=data_df, criteria=criteria, depth=depth, column_indexes=data_column_indexes)
+            scored = (positions[kept_positions], scores_df, len(positions))
+        else:
+            with search_metrics.stage('score_dimensions', n_candidates=len(positions)):
+                if session_id is None:
+                    scores = ss.score_dimensions(df=data_df, criteria=criteria, column_indexes=data_column_indexes, on_dimension=report_dimension)
+                else:
+                    dimension_inputs = {x: {y: criteria[y] for y in z} for x, z in ss.kwargs_to_criteria_mapping.items()}
+                    scores = dimension_cache.score(session_id=session_id, dataset_version=dataset_version,
+                                                   candidates_key=tuple(sorted(contract_type_input)), dimension_inputs=dimension_inputs,
+                                                   score_dimensions=lambda x: ss.score_dimensions(df=data_df, criteria=criteria, dimensions=x, column_indexes=data_column_indexes,
+                                                                                                  on_dimension=report_dimension))
+            checkpoint('Combining scores', 0.85)
+            with search_metrics.stage('apply_framework', n_candidates=len(positions)):
+                scores_df = ss.scores_to_frame(scores=scores, index=data_df.index)
+            scored = (positions, scores_df, len(positions))
+        search_cache.put(search, dataset_version=dataset_version, result=scored)
 
-    return unique_list
+    return scored
 
-ss = SuitabilityScoreFramework()
-ss.framework_weighting = {'Location': 5,
-                           'Salary': 5,
-                           'Skills': 3,
-                           'Experience': 3,
-                           'WFH': 3,
-                           'Sector': 3,
-                           'Area': 3,
-                           'Expertise' : 5,
-                           'Last Move': 3,
-                           'Move Status': 5,
-                           }
-dummy_data_df = pd.read_csv('Dummy_Candidate_Data.csv')
-
-sectors = sorted(list(dummy_data_df['Sector'].unique()))
-locations = sorted(list(dummy_data_df['Location'].unique()))
-all_mapped_distances = {'London': {'London': 0.0,
-  'Manchester': 327.0534023452525,
-  'Leeds': 328.54296482510466,
-  'Edinburgh': 651.9728973902871,
-  'Birmingham': 212.02048615776175,
-  'Glasgow': 694.2705845566147,
-  'Liverpool': 367.924008163767,
-  'Bristol': 237.1499097041376,
-  'Sheffield': 276.1494460389414,
-  'Cardiff': 288.67655028845087,
-  'Belfast': 678.9959441045239,
-  'Nottingham': 212.36976463568564,
-  'Dublin': 620.1974113114027},
- 'Manchester': {'London': 327.0534023452525,
-  'Manchester': 0.0,
-  'Leeds': 76.3419704540872,
-  'Edinburgh': 339.82577522112757,
-  'Birmingham': 135.45078654882843,
-  'Glasgow': 369.247420001182,
-  'Liverpool': 70.16581598512694,
-  'Bristol': 268.54923272562064,
-  'Sheffield': 72.95851341336338,
-  'Cardiff': 280.16617941923903,
-  'Belfast': 370.8999539925509,
-  'Nottingham': 123.06099275400156,
-  'Dublin': 368.8502225572842},
- 'Leeds': {'London': 328.54296482510466,
-  'Manchester': 76.3419704540872,
-  'Leeds': 0.0,
-  'Edinburgh': 323.5300463192462,
-  'Birmingham': 176.129439098532,
-  'Glasgow': 372.8685556755922,
-  'Liverpool': 142.98690679967604,
-  'Bristol': 323.00410747307467,
-  'Sheffield': 55.34818294496408,
-  'Cardiff': 342.57321325563066,
-  'Belfast': 416.8184504751833,
-  'Nottingham': 117.39021168274492,
-  'Dublin': 436.4260243579798},
- 'Edinburgh': {'London': 651.9728973902871,
-  'Manchester': 339.82577522112757,
-  'Leeds': 323.5300463192462,
-  'Edinburgh': 0.0,
-  'Birmingham': 475.27071417203297,
-  'Glasgow': 100.02038747358328,
-  'Liverpool': 339.1346663005028,
-  'Bristol': 597.993046341532,
-  'Sheffield': 376.2427617543404,
-  'Cardiff': 596.4151580003646,
-  'Belfast': 307.8224573231335,
-  'Nottingham': 439.94271043814035,
-  'Dublin': 448.1443703814557},
- 'Birmingham': {'London': 212.02048615776175,
-  'Manchester': 135.45078654882843,
-  'Leeds': 176.129439098532,
-  'Edinburgh': 475.27071417203297,
-  'Birmingham': 0.0,
-  'Glasgow': 500.7774465541888,
-  'Liverpool': 158.78247239585613,
-  'Bristol': 149.73432132800136,
-  'Sheffield': 124.88094440508978,
-  'Cardiff': 178.71035309864465,
-  'Belfast': 467.05961872466037,
-  'Nottingham': 93.02127419339682,
-  'Dublin': 416.5678505090497},
- 'Glasgow': {'London': 694.2705845566147,
-  'Manchester': 369.247420001182,
-  'Leeds': 372.8685556755922,
-  'Edinburgh': 100.02038747358328,
-  'Birmingham': 500.7774465541888,
-  'Glasgow': 0.0,
-  'Liverpool': 349.07586401341024,
-  'Bristol': 605.9238758586514,
-  'Sheffield': 420.0964923374065,
-  'Cardiff': 595.8000787505088,
-  'Belfast': 226.21537275728448,
-  'Nottingham': 483.0932413032937,
-  'Dublin': 384.68080475666574},
- 'Liverpool': {'London': 367.924008163767,
-  'Manchester': 70.16581598512694,
-  'Leeds': 142.98690679967604,
-  'Edinburgh': 339.1346663005028,
-  'Birmingham': 158.78247239585613,
-  'Glasgow': 349.07586401341024,
-  'Liverpool': 0.0,
-  'Bristol': 259.5755303540825,
-  'Sheffield': 141.31374426210272,
-  'Cardiff': 258.02267281128474,
-  'Belfast': 313.9210365040131,
-  'Nottingham': 181.2186086908623,
-  'Dublin': 299.0373970395838},
- 'Bristol': {'London': 237.1499097041376,
-  'Manchester': 268.54923272562064,
-  'Leeds': 323.00410747307467,
-  'Edinburgh': 597.993046341532,
-  'Birmingham': 149.73432132800136,
-  'Glasgow': 605.9238758586514,
-  'Liverpool': 259.5755303540825,
-  'Bristol': 0.0,
-  'Sheffield': 274.0837957058634,
-  'Cardiff': 51.55129337880057,
-  'Belfast': 519.3778024726266,
-  'Nottingham': 238.3285852260219,
-  'Dublin': 418.15547456953044},
- 'Sheffield': {'London': 276.1494460389414,
-  'Manchester': 72.95851341336338,
-  'Leeds': 55.34818294496408,
-  'Edinburgh': 376.2427617543404,
-  'Birmingham': 124.88094440508978,
-  'Glasgow': 420.0964923374065,
-  'Liverpool': 141.31374426210272,
-  'Bristol': 274.0837957058634,
-  'Sheffield': 0.0,
-  'Cardiff': 298.12346798446157,
-  'Belfast': 442.003312408971,
-  'Nottingham': 63.78938653227092,
-  'Dublin': 440.226797720866},
- 'Cardiff': {'London': 288.67655028845087,
-  'Manchester': 280.16617941923903,
-  'Leeds': 342.57321325563066,
-  'Edinburgh': 596.4151580003646,
-  'Birmingham': 178.71035309864465,
-  'Glasgow': 595.8000787505088,
-  'Liverpool': 258.02267281128474,
-  'Bristol': 51.55129337880057,
-  'Sheffield': 298.12346798446157,
-  'Cardiff': 0.0,
-  'Belfast': 491.4719912419304,
-  'Nottingham': 271.19746033448587,
-  'Dublin': 378.44601166059954},
- 'Belfast': {'London': 678.9959441045239,
-  'Manchester': 370.8999539925509,
-  'Leeds': 416.8184504751833,
-  'Edinburgh': 307.8224573231335,
-  'Birmingham': 467.05961872466037,
-  'Glasgow': 226.21537275728448,
-  'Liverpool': 313.9210365040131,
-  'Bristol': 519.3778024726266,
-  'Sheffield': 442.003312408971,
-  'Cardiff': 491.4719912419304,
-  'Belfast': 0.0,
-  'Nottingham': 492.5846784062072,
-  'Dublin': 174.15078798282545},
- 'Nottingham': {'London': 212.36976463568564,
-  'Manchester': 123.06099275400156,
-  'Leeds': 117.39021168274492,
-  'Edinburgh': 439.94271043814035,
-  'Birmingham': 93.02127419339682,
-  'Glasgow': 483.0932413032937,
-  'Liverpool': 181.2186086908623,
-  'Bristol': 238.3285852260219,
-  'Sheffield': 63.78938653227092,
-  'Cardiff': 271.19746033448587,
-  'Belfast': 492.5846784062072,
-  'Nottingham': 0.0,
-  'Dublin': 472.8392412197905},
- 'Dublin': {'London': 620.1974113114027,
-  'Manchester': 368.8502225572842,
-  'Leeds': 436.4260243579798,
-  'Edinburgh': 448.1443703814557,
-  'Birmingham': 416.5678505090497,
-  'Glasgow': 384.68080475666574,
-  'Liverpool': 299.0373970395838,
-  'Bristol': 418.15547456953044,
-  'Sheffield': 440.226797720866,
-  'Cardiff': 378.44601166059954,
-  'Belfast': 174.15078798282545,
-  'Nottingham': 472.8392412197905,
-  'Dublin': 0.0}}
-
-wfh_days = sorted(list(dummy_data_df['WFH Days'].unique()))
-experience_years = sorted(list(dummy_data_df['Years Experience'].unique()))
-last_move_years = sorted(list(dummy_data_df['Last Moved Years'].unique()))
-salary_min = dummy_data_df['Min Salary'].min()
-salary_min = int(math.floor(salary_min / 10000)) * 10000
-salary_max = dummy_data_df['Max Salary'].max()
-salary_max = int(math.ceil(salary_max / 10000)) * 10000
-move_types = ['Urgently Looking', 'Actively Looking', 'Open Minded', 'Unlikely to Move']
+def reweight_candidates(search: dict, scores_df: pd.DataFrame, weights: dict, store: CandidateStore = None):
+    """
+    Re-ranks scored candidates under new framework weights. The suitability score is recombined from the cached
+    dimension scores with SuitabilityScoreFramework.apply_framework_matrix, so no dimension is scored again, and
+    the re-weighted scores are cached with the search and the weights.
 
-unique_skills = convert_col_with_ls(dummy_data_df['Skills'])
-unique_areas = ['London Market', "Lloyd's Syndicate", 'Consultancy', 'Personal Lines', 'Commercial Lines', 'Reinsurer', 'Broker', 'Reinsurance Broker', 'Regulator']
+    Args:
+        search: the search criteria and contract types the candidates were scored for
+        scores_df: the scores of the candidates, as returned by score_candidates
+        weights: the weighting of each framework, keyed as ss.framework_weighting
+        store: the candidate store the candidates were scored from, defaults to the current version
 
-dummy_data_df['Skills'] = dummy_data_df['Skills'].apply(lambda x: convert_list_as_string(x))
-dummy_data_df['Minor Expertise'] = dummy_data_df['Minor Expertise'].apply(lambda x: convert_list_as_string(x))
+    Returns:
+        a copy of scores_df with the Suitability Score under weights
+    """
+    dataset_version = (candidate_reloader.store if store is None else store).version
+    weighted_search = dict(search, weights=tuple(weights[x] for x in ss.framework_weighting))
 
-applayout = [
-    dbc.Container(
-        [
-            dbc.Col(html.H1("Foxy Prospecting")),
-            create_dropdown(label_text="Select the sector that you wish to search:", dropdown_list=sectors, select_multi=False, dropdown_id='sector-input'),
-            create_dropdown(label_text="Select the candidate's contract type:", dropdown_list=['Permanent', 'Contractor'], select_multi=True, dropdown_id='contract-type-input'),
-            create_dropdown(label_text="Select the location that you wish to search:", dropdown_list=locations, select_multi=False, dropdown_id='location-input'),
-            create_rangeslider(label_text="Select the salary range that you wish to search:", range_min=salary_min, range_max=salary_max, range_step=20000, range_value=[salary_min * 2, salary_max / 2], rangeslider_id='salary-input'),
-            create_rangeslider(label_text="Select the years of experience that you wish to search:", range_min=experience_years[0], range_max=experience_years[-1], range_step=1, range_value=[3, 5], rangeslider_id='years-experience-input'),
-            create_rangeslider(label_text="Select the WFH days that you wish to search:", range_min=wfh_days[0], range_max=wfh_days[-1], range_step=1, range_value=[2, 3], rangeslider_id='wfh-input'),
-            create_rangeslider(label_text="Select the years since last move that you wish to search:", range_min=last_move_years[0], range_max=last_move_years[-1], range_step=1, range_value=[3, 5], rangeslider_id='last-moved-input'),
-            create_dropdown(label_text="Select the most desired candidate experience:", dropdown_list=unique_areas, select_multi=False, dropdown_id='major-experience-input'),
-            create_dropdown(label_text="Select other desired candidate experience:", dropdown_list=unique_areas, select_multi=True, dropdown_id='minor-experience-input'),
-            create_dropdown(label_text="Select the desired candidate skills:", dropdown_list=unique_skills, select_multi=True, dropdown_id='skills-input'),
-            create_dropdown(label_text="Select the latest movement status of the candidate:", dropdown_list=move_types, select_multi=True, dropdown_id='move-status-input'),
-            dbc.Row(dbc.Col(html.Button(id='submit-button-state', n_clicks=0, children=['Submit'], className='submit-button'), width={'offset' : 6}))
-        ], className='user-selections'
-    ),
-    dbc.Container(
-        [
-            create_datatable(datatable_id='prospecting-outputs')
-        ]
-    )
-]
+    with search_metrics.stage('cache_lookup'):
+        weighted_df = search_cache.get(weighted_search, dataset_version=dataset_version)
+
+    if weighted_df is None:
+        with search_metrics.stage('reweight', n_candidates=len(scores_df)):
+            score_matrix = scores_df[list(ss.kwargs_to_score_column_mapping.values())].to_numpy()
+            weight_vector = [weights[ss.kwargs_to_framework_mapping[x]] for x in ss.kwargs_to_score_column_mapping]
+            weighted_df = scores_df.assign(**{'Suitability Score': ss.apply_framework_matrix(score_matrix=score_matrix, weights=weight_vector)})
+        search_cache.put(weighted_search, dataset_version=dataset_version, result=weighted_df)
+
+    return weighted_df
+
+def sort_candidates(search: dict, positions: np.ndarray, scores_df: pd.DataFrame, sort_by: dict, skills_input: list, store: CandidateStore = None):
+    """
+    Orders the scored candidates by a column of the table. Candidates with equal values keep their suitability
+    ranking. The order is cached with the search, so paging through a sorted table only slices it.
+
+    Args:
+        search: the search criteria and contract types the candidates were scored for
+        positions: the positions in df of the scored candidates
+        scores_df: the scores of the candidates, aligned with positions
+        sort_by: the DataTable sort, e.g. {'column_id': 'Min Salary', 'direction': 'asc'}
+        skills_input: the skills searched for, Matched Skills is sorted by the number matched
+        store: the candidate store the candidates were scored from, defaults to the current version
+
+    Returns:
+        an array of positions in scores_df, in display order
+    """
+    store = candidate_reloader.store if store is None else store
+    df = store.df
+    dataset_version = store.version
+    column = sort_by['column_id']
+    ascending = sort_by['direction'] == 'asc'
+    sort_search = dict(search, sort_by=(column, ascending))
+
+    with search_metrics.stage('cache_lookup'):
+        order = search_cache.get(sort_search, dataset_version=dataset_version)
+
+    if order is None:
+        with search_metrics.stage('sort', n_candidates=len(positions)):
+            if column in scores_df.columns:
+                values = pd.Series(scores_df[column].to_numpy())
+            elif column == 'Matched Skills':
+                values = pd.Series(store.column_indexes['Skills'].take(positions).count_matches(skills_input)[1])
+            elif column in store.lists:
+                values = pd.Series(store.lists[column].join(positions))
+            elif column in df.columns:
+                values = df[column].iloc[positions].reset_index(drop=True)
+            else:
+                values = pd.Series(np.zeros(len(positions)))
+
+            # the suitability ranking first, so a stable sort by the column keeps it between equal values
+            ranking, _ = ss.select_top_k(scores=scores_df['Suitability Score'].to_numpy(), k=len(scores_df))
+            order = values.iloc[ranking].sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+        search_cache.put(sort_search, dataset_version=dataset_version, result=order)
+
+    return order
+
+def batch_search(searches: list, k: int, store: CandidateStore = None) -> list:
+    """
+    Finds the best k candidates for each of many searches in one pass with SuitabilityScoreFramework.score_batch,
+    e.g. for scoring every open role against the candidate pool overnight.
+
+    Args:
+        searches: the searches, each a dictionary of criteria keyed as for score_candidates, with optional
+                  contract_type, a list of contract types, and weights, keyed as ss.framework_weighting
+        k: the number of best candidates to return for each search
+        store: the candidate store to search, defaults to the current version
+
+    Returns:
+        a list with, for each search, a tuple of a DataFrame of its best candidates, best first, with their scores
+        and the columns shown in the table, and the number of candidates of its contract types
+    """
+    store = candidate_reloader.store if store is None else store
+    df = store.df
+
+    with search_metrics.stage('batch_score', n_candidates=len(df) * len(searches)):
+        results = ss.score_batch(df=df, criteria_list=[{x: y[x] for x in ss.criteria_inputs} for y in searches], k=k,
+                                 contract_types=[x.get('contract_type') for x in searches], weights=[x.get('weights') for x in searches],
+                                 column_indexes=store.column_indexes, memory_budget=batch_memory_budget)
+
+    with search_metrics.stage('batch_join', n_candidates=k * len(searches)):
+        candidates = []
+        for positions, scores_df, n_matches in results:
+            data_df = df.iloc[positions].join(scores_df)
+            data_df['Skills'] = store.lists['Skills'].join(positions)
+            data_df['Minor Expertise'] = store.lists['Minor Expertise'].join(positions)
+            data_df.insert(0, 'Position', positions)
+            candidates.append((data_df, n_matches))
+
+    return candidates
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def is_range(value) -> bool:
+    return isinstance(value, list) and len(value) == 2 and all(is_number(x) for x in value)
+
+def is_text_list(value) -> bool:
+    return isinstance(value, list) and all(isinstance(x, str) for x in value)
+
+# the check each search input must pass and how it is described when it fails. The app's sector dropdown gives a
+# single sector, the framework also takes a list of them
+search_input_checks = {'input_salary': (is_range, 'a [min, max] pair of numbers'),
+                       'input_location': (lambda x: isinstance(x, str), 'a location'),
+                       'input_sector': (lambda x: isinstance(x, str) or is_text_list(x), 'a sector or a list of sectors'),
+                       'input_wfh': (is_range, 'a [min, max] pair of numbers'),
+                       'input_skills': (is_text_list, 'a list of skills'),
+                       'input_experience': (is_range, 'a [min, max] pair of numbers'),
+                       'input_areas': (is_text_list, 'a list of areas of expertise'),
+                       'input_expertise': (lambda x: isinstance(x, str), 'an area of expertise'),
+                       'input_moved': (is_range, 'a [min, max] pair of numbers'),
+                       'input_move_status': (is_text_list, 'a list of move statuses')}
+
+def validate_search(search) -> str:
+    """
+    Checks the shape of a search posted to the API, so a malformed search is refused before it is scored.
+
+    Args:
+        search: the posted search, the criteria keyed as for score_candidates, with optional contract_type, a list
+                of contract types, and weights, keyed as ss.framework_weighting
+
+    Returns:
+        an error message, or None if the search is valid
+    """
+    if not isinstance(search, dict):
+        return 'Expected a JSON object with the search criteria'
+
+    missing = [x for x in ss.criteria_inputs if x not in search]
+    if missing:
+        return 'The search is missing {}'.format(', '.join(missing))
+
+    for x, (check, description) in search_input_checks.items():
+        if not check(search[x]):
+            return '{} must be {}'.format(x, description)
+
+    if search.get('contract_type') is not None and not is_text_list(search['contract_type']):
+        return 'contract_type must be a list of contract types'
+
+    weights = search.get('weights')
+    if weights is not None and (not isinstance(weights, dict) or set(weights) != set(ss.framework_weighting) or not all(is_number(x) for x in weights.values())):
+        return 'weights must give a number for each of {}'.format(', '.join(ss.framework_weighting))
+
+    return None
+
+# the check each column of a candidate profile posted to /api/job-search must pass and how it is described when it fails
+candidate_profile_checks = {'Location': (lambda x: isinstance(x, str), 'a location'),
+                            'Sector': (lambda x: isinstance(x, str), 'a sector'),
+                            'Major Expertise': (lambda x: isinstance(x, str), 'an area of expertise'),
+                            'Minor Expertise': (is_text_list, 'a list of areas of expertise'),
+                            'Min Salary': (is_number, 'a number'),
+                            'Max Salary': (is_number, 'a number'),
+                            'Years Experience': (is_number, 'a number'),
+                            'WFH Days': (is_number, 'a number'),
+                            'Skills': (is_text_list, 'a list of skills'),
+                            'Job Type': (lambda x: isinstance(x, str), 'a contract type')}
+
+def validate_candidate_profile(candidate) -> str:
+    """
+    Checks the shape of a candidate profile posted to the API, so a malformed profile is refused before jobs are
+    scored against it.
+
+    Args:
+        candidate: the posted profile, with the columns of candidate_profile_columns
+
+    Returns:
+        an error message, or None if the profile is valid
+    """
+    if not isinstance(candidate, dict):
+        return 'Expected a JSON object with a candidate'
+
+    missing = [x for x in candidate_profile_columns if x not in candidate]
+    if missing:
+        return 'The candidate is missing {}'.format(', '.join(missing))
+
+    for x in candidate_profile_columns:
+        check, description = candidate_profile_checks[x]
+        if not check(candidate[x]):
+            return '{} must be {}'.format(x, description)
+
+    return None
+
+@server.route('/api/batch-search', methods=['POST'])
+def serve_batch_search():
+    """
+    Scores a batch of searches, posted as JSON: {"k": 25, "searches": [{"input_salary": [60000, 80000], ...}]}.
+    Responds with the best k candidates of each search and the version of the data they were scored from, the
+    Position of a candidate is its row in that version.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('searches'), list):
+        return jsonify({'error': 'Expected a JSON object with a list of searches'}), 400
+
+    searches = body['searches']
+    k = body.get('k', 25)
+    if not isinstance(k, int) or not 0 < k <= batch_max_k or len(searches) > batch_max_searches:
+        return jsonify({'error': 'k must be between 1 and {} and at most {} searches may be sent'.format(batch_max_k, batch_max_searches)}), 400
+
+    for i, search in enumerate(searches):
+        error = validate_search(search)
+        if error is not None:
+            return jsonify({'error': 'Search {}: {}'.format(i, error)}), 400
+
+    store = candidate_reloader.store
+    try:
+        results = batch_search(searches=searches, k=k, store=store)
+    except (IndexError, KeyError, TypeError, ValueError) as e:
+        # e.g. a sector or location the framework has no mapping for
+        return jsonify({'error': 'Invalid search: {!r}'.format(e)}), 400
+
+    return jsonify({'dataset_version': store.version,
+                    'results': [{'matches': n_matches, 'candidates': data_df.to_dict('records')} for data_df, n_matches in results]})
+
+def load_match_index(store: CandidateStore, jobs: tuple) -> MatchIndex:
+    """
+    Finds the match index of a version of the jobs against a version of the candidate data. The stored index is used
+    when it was built from the same versions, otherwise the index is rebuilt across scoring_workers processes and
+    stored. Processes take turns, so a worker which waited for another's build loads the index it stored.
+
+    Args:
+        store: the candidate store the index must be built from
+        jobs: a tuple of the job data and its version
+
+    Returns:
+        a MatchIndex
+    """
+    jobs_df, jobs_version = jobs
+    version = match_version(store.version, jobs_version)
+    # a read only deployment cannot create the lock file, nor store the index, so each process builds its own
+    writable = os.access(os.path.dirname(os.path.abspath(match_index_file)), os.W_OK)
+
+    with file_lock(match_index_file + '.lock') if writable else contextlib.nullcontext():
+        index = MatchIndex.load(match_index_file) if os.path.exists(match_index_file) else None
+        if index is None or index.version != version or index.k < match_index_k:
+            with search_metrics.stage('match_index', n_candidates=len(store.df) * len(jobs_df)):
+                matcher = JobMatcher(framework=ss, jobs_df=jobs_df, candidate_df=store.df, candidate_bitsets=store.bitsets)
+                index = build_match_index(matcher, k=match_index_k, version=version, n_workers=scoring_workers, memory_budget=batch_memory_budget)
+            if writable:
+                index.save(match_index_file)
+
+    return index
+
+def build_match_index_in_background(store: CandidateStore, jobs: tuple):
+    global match_index, match_index_build
+
+    try:
+        index = load_match_index(store, jobs)
+    except Exception:
+        server.logger.exception('Building the match index failed')
+        index = None
+
+    with match_index_lock:
+        match_index_build = None
+        if index is not None:
+            match_index = (index, store, jobs)
+
+    if index is not None:
+        # the candidates or jobs may have changed again while it was built
+        refresh_match_index()
+
+def refresh_match_index(store: CandidateStore = None):
+    """
+    Starts building the match index of the current jobs against a version of the candidate data in a background
+    thread, unless it is built already. One index is built at a time per process, each build refreshes again when it
+    finishes, so a version swapped in meanwhile is built next.
+
+    Args:
+        store: the candidate store the index must be built from, defaults to the current version
+    """
+    global match_index_build
+
+    store = candidate_reloader.store if store is None else store
+    jobs = job_reloader.jobs
+    if jobs[0] is None:
+        return
+
+    version = match_version(store.version, jobs[1])
+    with match_index_lock:
+        if match_index is not None and match_index[0].version == version:
+            return
+        # a build started before the workers were forked runs in the parent only
+        if match_index_build is not None and match_index_build[1] == os.getpid():
+            return
+        match_index_build = (version, os.getpid())
+
+    threading.Thread(target=build_match_index_in_background, args=(store, jobs), name='match-index', daemon=True).start()
+
+def get_match_index():
+    """
+    Returns:
+        a tuple of the latest match index, the candidate store and the jobs it was built from, None until the first
+        index is built. A build of the current versions is started if the index is older
+    """
+    refresh_match_index()
+
+    return match_index
+
+def match_index_unavailable():
+    response = jsonify({'error': 'The match index is being built'})
+    response.headers['Retry-After'] = '5'
+
+    return response, 503
+
+# the index of the current versions is loaded, or built, while the first requests are served
+refresh_match_index()
+
+def create_job_records(jobs_df: pd.DataFrame, positions: np.ndarray, scores: dict) -> list:
+    """
+    Formats jobs and their scores for a JSON response, with the Position of each job as its row in jobs_df.
+
+    Args:
+        jobs_df: the job data
+        positions: the positions of the jobs, best first
+        scores: the score columns to add, each an array aligned with positions
+
+    Returns:
+        a list with a dictionary per job
+    """
+    data_df = jobs_df.iloc[positions].reset_index(drop=True)
+    for col in ['Skills', 'Minor Expertise']:
+        data_df[col] = data_df[col].apply(', '.join)
+    for col, values in scores.items():
+        data_df[col] = values
+    data_df.insert(0, 'Position', positions)
+
+    return data_df.to_dict('records')
+
+@server.route('/api/job-search', methods=['POST'])
+def serve_job_search():
+    """
+    Finds the best jobs for a candidate, posted as JSON: {"k": 25, "candidate": {"Location": "London", ...}} with the
+    columns of the candidate csv in candidate_profile_columns, Skills and Minor Expertise as lists. Each job is scored
+    with the candidate in the place of the user, see JobMatcher, and jobs of another contract type are left out.
+    """
+    jobs_df, jobs_version = job_reloader.jobs
+    if jobs_df is None:
+        return jsonify({'error': 'No job data is loaded'}), 404
+
+    body = request.get_json(silent=True)
+    candidate = body.get('candidate') if isinstance(body, dict) else None
+    error = validate_candidate_profile(candidate)
+    if error is not None:
+        return jsonify({'error': error}), 400
+
+    k = body.get('k', 25)
+    if not isinstance(k, int) or not 0 < k <= job_search_max_k:
+        return jsonify({'error': 'k must be between 1 and {}'.format(job_search_max_k)}), 400
+
+    with search_metrics.stage('job_search', n_candidates=len(jobs_df)):
+        try:
+            candidate_df = pd.DataFrame({x: [candidate[x]] for x in candidate_profile_columns})
+            matcher = JobMatcher(framework=ss, jobs_df=jobs_df, candidate_df=candidate_df)
+            jobs = np.arange(len(jobs_df))
+            suitability = matcher.suitability(jobs, 0)
+            positions, _ = ss.select_top_k(scores=suitability, k=min(k, int((suitability >= 0).sum())))
+            scores = {ss.kwargs_to_score_column_mapping[x]: y for x, y in matcher.score_pairs(positions, 0).items()}
+        except (IndexError, KeyError, TypeError, ValueError) as e:
+            # e.g. a sector or location the framework has no mapping for
+            return jsonify({'error': 'Invalid candidate: {!r}'.format(e)}), 400
+
+    scores['Suitability Score'] = suitability[positions]
+
+    return jsonify({'jobs_version': jobs_version, 'matches': int((suitability >= 0).sum()), 'jobs': create_job_records(jobs_df, positions, scores)})
+
+@server.route('/api/jobs/<int:job>/candidates')
+def serve_job_matches(job: int):
+    """
+    Responds with the best candidates of a job, read from the latest match index, with the Position of each candidate
+    as its row in the version of the candidate data the index was built from, and the versions it was built from.
+    """
+    if job_reloader.jobs[0] is None:
+        return jsonify({'error': 'No job data is loaded'}), 404
+
+    built = get_match_index()
+    if built is None:
+        return match_index_unavailable()
+
+    index, store, (jobs_df, jobs_version) = built
+    if not 0 <= job < len(jobs_df):
+        return jsonify({'error': 'No job at position {}'.format(job)}), 404
+
+    positions, scores = index.candidates_for_job(job)
+    data_df = store.df.iloc[positions].reset_index(drop=True)
+    data_df['Skills'] = store.lists['Skills'].join(positions)
+    data_df['Minor Expertise'] = store.lists['Minor Expertise'].join(positions)
+    data_df['Suitability Score'] = scores
+    data_df.insert(0, 'Position', positions)
+
+    return jsonify({'dataset_version': store.version, 'jobs_version': jobs_version, 'candidates': data_df.to_dict('records')})
+
+@server.route('/api/candidates/<int:candidate>/jobs')
+def serve_candidate_matches(candidate: int):
+    """
+    Responds with the best jobs of the candidate at a position in the version of the candidate data the latest match
+    index was built from, read from the index, with the versions it was built from.
+    """
+    if job_reloader.jobs[0] is None:
+        return jsonify({'error': 'No job data is loaded'}), 404
+
+    built = get_match_index()
+    if built is None:
+        return match_index_unavailable()
+
+    index, store, (jobs_df, jobs_version) = built
+    if not 0 <= candidate < len(store.df):
+        return jsonify({'error': 'No candidate at position {}'.format(candidate)}), 404
+
+    positions, scores = index.jobs_for_candidate(candidate)
+
+    return jsonify({'dataset_version': store.version, 'jobs_version': jobs_version, 'jobs': create_job_records(jobs_df, positions, {'Suitability Score': scores})})
+
+def parse_saved_search(body) -> tuple:
+    """
+    Checks a search posted to be saved, as validate_search, except that its contract types must be given.
+
+    Args:
+        body: the posted JSON, the criteria keyed as for score_candidates, with contract_type, a list of contract
+              types, and optional weights, keyed as ss.framework_weighting
+
+    Returns:
+        a tuple of the search and an error message, which is None if the search is valid
+    """
+    error = validate_search(body)
+    if error is not None:
+        return None, error
+    if body.get('contract_type') is None:
+        return None, 'The search is missing contract_type'
+
+    weights = body.get('weights')
+    search = {x: body[x] for x in ss.criteria_inputs + ['contract_type']}
+    if weights is not None:
+        search['weights'] = weights
+
+    return search, None
+
+def describe_saved_search(saved) -> dict:
+    return {'name': saved.name, 'dataset_version': saved.version, 'matches': saved.n_matches, 'ranked': len(saved.positions), 'complete': saved.complete}
+
+@server.route('/api/saved-searches')
+def serve_saved_searches():
+    """
+    Lists the saved searches, with the version of the data each was last refreshed to, the number of candidates of
+    its contract types and how many of them are ranked.
+    """
+    return jsonify({'saved_searches': [describe_saved_search(x) for x in saved_searches.list_searches()]})
+
+@server.route('/api/saved-searches/<name>', methods=['PUT'])
+def serve_save_search(name: str):
+    """
+    Saves a search under a name, posted as JSON: {"input_salary": [60000, 80000], ..., "contract_type": ["Permanent"]}
+    with optional weights. Its best candidates are scored once now, and kept up to date as the data changes.
+    """
+    search, error = parse_saved_search(request.get_json(silent=True))
+    if error is not None:
+        return jsonify({'error': error}), 400
+
+    store = candidate_reloader.store
+    try:
+        with search_metrics.stage('save_search', n_candidates=len(store.df)):
+            saved = saved_searches.save(name, search, store)
+    except (KeyError, TypeError, ValueError) as e:
+        # e.g. a sector or location the framework has no mapping for
+        return jsonify({'error': 'Invalid search: {!r}'.format(e)}), 400
+
+    return jsonify(describe_saved_search(saved)), 201
+
+@server.route('/api/saved-searches/<name>', methods=['GET'])
+def serve_saved_search(name: str):
+    """
+    Opens a saved search, responding with a page of its ranked candidates, ?offset=0&k=25, read from its stored
+    results. The Position of a candidate is its row in the version of the data the results were refreshed to.
+    """
+    offset = request.args.get('offset', 0, type=int)
+    k = request.args.get('k', 25, type=int)
+    if offset < 0 or not 0 < k <= saved_search_max_k:
+        return jsonify({'error': 'offset must be at least 0 and k between 1 and {}'.format(saved_search_max_k)}), 400
+
+    opened = saved_searches.get(name)
+    if opened is None:
+        return jsonify({'error': 'No search is saved as {}'.format(name)}), 404
+
+    saved, store = opened
+    if store is None:
+        # refreshed by another worker to a version this one has not loaded yet
+        response = jsonify({'error': 'The saved search is being refreshed'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    with search_metrics.stage('open_saved_search', n_candidates=k):
+        positions, scores_df = saved.page(offset=offset, k=k, score_columns=list(ss.kwargs_to_score_column_mapping.values()))
+        data_df = store.df.iloc[positions].reset_index(drop=True).join(scores_df)
+        data_df['Skills'] = store.lists['Skills'].join(positions)
+        data_df['Minor Expertise'] = store.lists['Minor Expertise'].join(positions)
+        data_df.insert(0, 'Position', positions)
+
+    return jsonify(dict(describe_saved_search(saved), candidates=data_df.to_dict('records')))
+
+@server.route('/api/saved-searches/<name>', methods=['DELETE'])
+def serve_delete_saved_search(name: str):
+    if not saved_searches.delete(name):
+        return jsonify({'error': 'No search is saved as {}'.format(name)}), 404
+
+    return '', 204
+
+def create_app_layout(summary: dict) -> list:
+    """
+    Builds the search inputs and results table, with the dropdown options and slider bounds of the candidate data.
+
+    Args:
+        summary: the summary of the candidate data, see CandidateStore.summarise
+
+    Returns:
+        a list of the layout's containers
+    """
+    sectors = summary['sectors']
+    locations = summary['locations']
+    wfh_days = summary['wfh_days']
+    experience_years = summary['experience_years']
+    last_move_years = summary['last_move_years']
+    salary_min = int(math.floor(summary['salary_min'] / 10000)) * 10000
+    salary_max = int(math.ceil(summary['salary_max'] / 10000)) * 10000
+    unique_skills = summary['unique_skills']
+
+    return [
+        dbc.Container(
+            [
+                dbc.Col(html.H1("Foxy Prospecting")),
+                create_dropdown(label_text="Select the sector that you wish to search:", dropdown_list=sectors, select_multi=False, dropdown_id='sector-input'),
+                create_dropdown(label_text="Select the candidate's contract type:", dropdown_list=['Permanent', 'Contractor'], select_multi=True, dropdown_id='contract-type-input'),
+                create_dropdown(label_text="Select the location that you wish to search:", dropdown_list=locations, select_multi=False, dropdown_id='location-input'),
+                create_rangeslider(label_text="Select the salary range that you wish to search:", range_min=salary_min, range_max=salary_max, range_step=20000, range_value=[salary_min * 2, salary_max / 2], rangeslider_id='salary-input'),
+                create_rangeslider(label_text="Select the years of experience that you wish to search:", range_min=experience_years[0], range_max=experience_years[-1], range_step=1, range_value=[3, 5], rangeslider_id='years-experience-input'),
+                create_rangeslider(label_text="Select the WFH days that you wish to search:", range_min=wfh_days[0], range_max=wfh_days[-1], range_step=1, range_value=[2, 3], rangeslider_id='wfh-input'),
+                create_rangeslider(label_text="Select the years since last move that you wish to search:", range_min=last_move_years[0], range_max=last_move_years[-1], range_step=1, range_value=[3, 5], rangeslider_id='last-moved-input'),
+                create_dropdown(label_text="Select the most desired candidate experience:", dropdown_list=unique_areas, select_multi=False, dropdown_id='major-experience-input'),
+                create_dropdown(label_text="Select other desired candidate experience:", dropdown_list=unique_areas, select_multi=True, dropdown_id='minor-experience-input'),
+                create_dropdown(label_text="Select the desired candidate skills:", dropdown_list=unique_skills, select_multi=True, dropdown_id='skills-input'),
+                create_dropdown(label_text="Select the latest movement status of the candidate:", dropdown_list=move_types, select_multi=True, dropdown_id='move-status-input'),
+                html.Details(
+                    [
+                        html.Summary("Adjust the framework weightings", className='input-text'),
+                        *[create_slider(label_text="{} weighting:".format(x), slider_min=0, slider_max=10, slider_step=1, slider_value=y,
+                                        slider_id={'type': 'weight-input', 'index': x}) for x, y in ss.framework_weighting.items()]
+                    ], className='weight-inputs'
+                ),
+                dbc.Row(dbc.Col(html.Button(id='submit-button-state', n_clicks=0, children=['Submit'], className='submit-button'), width={'offset' : 6}))
+            ], className='user-selections'
+        ),
+        dbc.Container(
+            [
+                dbc.Row(html.Label(id='prospecting-count', className='input-text')),
+                dcc.Interval(id='search-progress-interval', interval=search_poll_milliseconds, disabled=True),
+                create_datatable(datatable_id='prospecting-outputs')
+            ]
+        )
+    ]
+
+@app.callback(
+    Output('prospecting-outputs', 'page_current'),
+    Input('submit-button-state', 'n_clicks')
+)
+
+def reset_page(n_clicks):
+    # a new search starts from its first page
+    return 0
 
 @app.callback(
     Output('prospecting-outputs', 'data'),
     Output('prospecting-outputs', 'columns'),
+    Output('prospecting-count', 'children'),
+    Output('prospecting-outputs', 'page_count'),
+    Output('search-progress-interval', 'disabled'),
     Input('submit-button-state', 'n_clicks'),
+    Input('prospecting-outputs', 'page_current'),
+    Input('prospecting-outputs', 'page_size'),
+    Input('prospecting-outputs', 'sort_by'),
+    Input({'type': 'weight-input', 'index': ALL}, 'value'),
+    Input('search-progress-interval', 'n_intervals'),
     State('sector-input', 'value'),
     State('contract-type-input', 'value'),
     State('location-input', 'value'),
@@ -382,10 +990,51 @@ applayout = [
     State('major-experience-input', 'value'),
     State('minor-experience-input', 'value'),
     State('skills-input', 'value'),
-    State('move-status-input', 'value')
+    State('move-status-input', 'value'),
+    State('session-id', 'data')
 )
 
-def display_prospecting_outputs(n_clicks, sector_input, contract_type_input, location_input, salary_input, experience_input, wfh_input, last_moved_input, major_expertise_input, minor_expertise_input, skills_input, move_status_input, df=dummy_data_df):
+def update_prospecting_outputs(n_clicks, page_current, page_size, sort_by, weight_inputs, n_intervals, *search_inputs):
+    """
+    Runs the table's search with display_prospecting_outputs, in the request or, with background_searches set, on
+    search_tasks. A background search is submitted when the search or page changes, cancelling the session's
+    previous search, and the progress interval is enabled. Each tick of the interval shows the search's progress
+    until it is done, then shows its results and disables the interval.
+
+    Returns:
+        the outputs of display_prospecting_outputs, with whether the progress interval is disabled
+    """
+    session_id = search_inputs[-1]
+    search = dict(n_clicks=n_clicks, page_current=page_current, page_size=page_size, sort_by=sort_by, weight_inputs=weight_inputs)
+    search.update(zip(search_input_names, search_inputs))
+
+    if not background_searches or not n_clicks:
+        return display_prospecting_outputs(**search) + (True,)
+
+    if dash.callback_context.triggered_id != 'search-progress-interval':
+        search_tasks.submit(session_id, display_prospecting_outputs, kwargs=search)
+        return dash.no_update, dash.no_update, 'Searching...', dash.no_update, False
+
+    task = search_tasks.get(session_id)
+    if task is None:
+        # e.g. the result was already shown by an earlier tick
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, True
+    if not task.done:
+        return dash.no_update, dash.no_update, '{}... {:.0%}'.format(task.stage, task.progress), dash.no_update, False
+
+    search_tasks.pop(session_id, task)
+    try:
+        return task.result() + (True,)
+    except SearchCancelled:
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, True
+    except Exception as e:
+        return None, None, 'The search failed: {!r}'.format(e), 1, True
+
+# the states of the table's callback, in the order they are passed
+search_input_names = ['sector_input', 'contract_type_input', 'location_input', 'salary_input', 'experience_input', 'wfh_input', 'last_moved_input',
+                      'major_expertise_input', 'minor_expertise_input', 'skills_input', 'move_status_input', 'session_id']
+
+def display_prospecting_outputs(n_clicks, page_current, page_size, sort_by, weight_inputs, sector_input, contract_type_input, location_input, salary_input, experience_input, wfh_input, last_moved_input, major_expertise_input, minor_expertise_input, skills_input, move_status_input, session_id=None, store=None):
 
 
     if n_clicks > 0:
@@ -396,54 +1045,84 @@ def display_prospecting_outputs(n_clicks, sector_input, contract_type_input, loc
         if (type(contract_type_input)) is str:
             contract_type_input = [contract_type_input]
 
-        data_df = df.copy()
-        data_df = data_df.loc[data_df['Job Type'].isin(contract_type_input)]
-
-        data_df['Salary Score'] = data_df.apply(lambda row: ss.apply_framework_to_salary(input_salary=salary_input, data_min_salary=row['Min Salary'], data_max_salary=row['Max Salary']), axis=1)
-        data_df['Location Score'] = data_df['Location'].apply(lambda x: ss.apply_framework_location(input_location=location_input, data_location=x, all_mapped_distances=all_mapped_distances))
-        data_df['Sector Score'] = data_df['Sector'].apply(lambda x: ss.apply_framework_to_sector(input_sector=sector_input, data_sector=x))
-        data_df['WFH Score'] = data_df['WFH Days'].apply(lambda x: ss.apply_framework_to_wfh(input_wfh=wfh_input, data_wfh=x))
-        data_df['Skills Score'] = data_df.apply(lambda row: ss.apply_framework_to_skills(input_skills=skills_input, data_skills=row['Skills']), axis=1)
-        data_df['Years Experience Score'] = data_df['Years Experience'].apply(lambda x: ss.apply_framework_experience_prospecting(input_experience=experience_input, data_experience=x))
-        data_df['Minor Expertise Score'] = data_df['Minor Expertise'].apply(lambda x: ss.apply_framework_to_areas(input_areas=minor_expertise_input, data_areas=x))
-        data_df['Major Expertise Score'] = data_df['Major Expertise'].apply(lambda x: ss.apply_framework_to_area_of_expertise(input_expertise=major_expertise_input, data_expertise=x))
-        data_df['Move Score'] = data_df['Last Moved Years'].apply(lambda x: ss.apply_framework_to_last_moved(input_moved=last_moved_input, data_moved=x))
-        data_df['Status Score'] = data_df['Move Status'].apply(lambda x: ss.apply_framework_to_move_status(input_move_status=move_status_input, data_move_status=x))
-        data_df['Matched Skills'] = data_df['Skills'].apply(lambda x: list(set(x).intersection(skills_input)))
-
-        data_df['Suitability Score'] = data_df.apply(lambda row:
-                                           ss.apply_framework(salary_score=row['Salary Score'],
-                                           location_score=row['Location Score'],
-                                           sector_score=row['Sector Score'],
-                                           experience_score=row['Years Experience Score'],
-                                           wfh_score=row['WFH Score'],
-                                           skills_score=row['Skills Score'],
-                                           area_score=row['Minor Expertise Score'],
-                                           expertise_score=row['Major Expertise Score'],
-                                           move_score=row['Move Score'],
-                                           status_score=row['Status Score']
-                                           ), axis=1)
-
-        data_df['Skills'] = data_df['Skills'].apply(lambda x: ', '.join(x) if type(x) is list else x)
-        data_df['Minor Expertise'] = data_df['Minor Expertise'].apply(lambda x: ', '.join(x) if type(x) is list else x)
-        data_df['Matched Skills'] = data_df['Matched Skills'].apply(lambda x: ', '.join(x) if type(x) is list else x)
-
-        data_df = data_df.sort_values(by='Suitability Score', ascending=False)[:25]
-        data_df['Max Salary'] = data_df['Max Salary'].apply(lambda x: int(math.ceil(x / 1000)) * 1000)
-        data_df = data_df.loc[:, ['Suitability Score', 'Location', 'Sector', 'Major Expertise', 'Minor Expertise', 'Min Salary', 'Max Salary', 'Years Experience', 'WFH Days', 'Skills', 'Matched Skills', 'Job Type', 'Last Moved Years', 'Move Status']]
-        data_df['Request Representation'] = ["[Send Email]('https://www.google.com')"] * len(data_df)
-        data_cols = [{'id': x , 'name' : x} for x in data_df.columns]
-        data_cols[-1] = {'id' : 'Request Representation', 'name' : 'Request Representation', 'presentation' : 'markdown'}
-
-        return data_df.to_dict('records'), data_cols
+        criteria = {'input_salary': salary_input,
+                    'input_location': location_input,
+                    'input_sector': sector_input,
+                    'input_wfh': wfh_input,
+                    'input_skills': skills_input,
+                    'input_experience': experience_input,
+                    'input_areas': minor_expertise_input,
+                    'input_expertise': major_expertise_input,
+                    'input_moved': last_moved_input,
+                    'input_move_status': move_status_input}
+
+        with search_metrics.search():
+            # read once, so the whole search runs on one version of the data even if a reload swaps in another
+            store = candidate_reloader.store if store is None else store
+            df = store.df
+            offset = page_current * page_size
+
+            # the weight sliders are laid out in the order of ss.framework_weighting, all zero keeps the defaults
+            weights = ss.framework_weighting if weight_inputs is None or not any(weight_inputs) else dict(zip(ss.framework_weighting, weight_inputs))
+
+            if sort_by or weights != ss.framework_weighting:
+                # any column can be sorted on and any weights applied, so every candidate is scored
+                search = dict(criteria, contract_type=contract_type_input)
+                positions, scores_df, n_matches = score_candidates(criteria=criteria, contract_type_input=contract_type_input, store=store, session_id=session_id)
+
+                if weights != ss.framework_weighting:
+                    scores_df = reweight_candidates(search=search, scores_df=scores_df, weights=weights, store=store)
+                    search['weights'] = tuple(weights.values())
+
+                if sort_by:
+                    order = sort_candidates(search=search, positions=positions, scores_df=scores_df, sort_by=sort_by[0], skills_input=skills_input, store=store)
+                    top_positions = order[offset:offset + page_size]
+                else:
+                    with search_metrics.stage('select_top_k', n_candidates=len(scores_df)):
+                        top_positions, _ = ss.select_top_k(scores=scores_df['Suitability Score'].to_numpy(), k=page_size, offset=offset)
+            else:
+                # pruned and parallel searches rank a whole number of pages, doubling as the table is paged through
+                depth = page_size * (1 << int(page_current).bit_length())
+                positions, scores_df, n_matches = score_candidates(criteria=criteria, contract_type_input=contract_type_input, store=store, depth=depth, session_id=session_id)
+
+                with search_metrics.stage('select_top_k', n_candidates=len(scores_df)):
+                    top_positions, _ = ss.select_top_k(scores=scores_df['Suitability Score'].to_numpy(), k=page_size, offset=offset)
+
+            checkpoint('Preparing results', 0.9)
+            with search_metrics.stage('join', n_candidates=len(top_positions)):
+                data_df = df.iloc[positions[top_positions]]
+                data_df = data_df.join(scores_df.iloc[top_positions])
+                data_df['Matched Skills'] = store.column_indexes['Skills'].decode_matches(positions=positions[top_positions], input_values=skills_input)
+
+            with search_metrics.stage('format', n_candidates=len(data_df)):
+                data_df['Skills'] = store.lists['Skills'].join(positions[top_positions])
+                data_df['Minor Expertise'] = store.lists['Minor Expertise'].join(positions[top_positions])
+                data_df['Matched Skills'] = data_df['Matched Skills'].apply(lambda x: ', '.join(x) if type(x) is list else x)
+
+                data_df['Max Salary'] = data_df['Max Salary'].apply(lambda x: int(math.ceil(x / 1000)) * 1000)
+                data_df = data_df.loc[:, ['Suitability Score', 'Location', 'Sector', 'Major Expertise', 'Minor Expertise', 'Min Salary', 'Max Salary', 'Years Experience', 'WFH Days', 'Skills', 'Matched Skills', 'Job Type', 'Last Moved Years', 'Move Status']]
+                data_df['Request Representation'] = ["[Send Email]('https://www.google.com')"] * len(data_df)
+                data_cols = [{'id': x , 'name' : x} for x in data_df.columns]
+                data_cols[-1] = {'id' : 'Request Representation', 'name' : 'Request Representation', 'presentation' : 'markdown'}
+
+                n_shown = 'Showing {}-{} of {} candidates'.format(min(offset + 1, n_matches), offset + len(data_df), n_matches)
+
+            with search_metrics.stage('serialize', n_candidates=len(data_df)):
+                records = data_df.to_dict('records')
+
+        return records, data_cols, n_shown, max(1, math.ceil(n_matches / page_size))
 
     else:
-        return (None, None)
+        return (None, None, None, 1)
 
-app.layout = dbc.Container(
-    children=applayout,
-    fluid=True
-)
+def serve_layout():
+    # the layout is built per page load, giving each browser session its own id and the inputs of the current data
+    return dbc.Container(
+        children=create_app_layout(candidate_reloader.store.summary) + [dcc.Store(id='session-id', data=str(uuid.uuid4()))],
+        fluid=True
+    )
+
+app.layout = serve_layout
 
 if __name__ == '__main__':
     app.run_server(debug=True)
\ No newline at end of file
@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# the task running on the current thread, read by checkpoint
+_current = threading.local()
+
+
+class SearchCancelled(Exception):
+    """
+    Raised at a checkpoint of a search which was cancelled, e.g. because its session submitted a newer search.
+    """
+
+
+def checkpoint(stage: str, progress: float = None):
+    """
+    Reports the progress of the background search running on this thread, and stops it if it was cancelled. Does
+    nothing when called outside a background search, so searches run in the request are unaffected.
+
+    Args:
+        stage: the stage the search is in, e.g. score Location
+        progress: the share of the search done, between 0 and 1, unchanged if not given
+
+    Raises:
+        SearchCancelled: if the search was cancelled
+    """
+    task = getattr(_current, 'task', None)
+    if task is None:
+        return
+
+    if task.cancelled.is_set():
+        raise SearchCancelled(task.task_id)
+
+    task.stage = stage
+    if progress is not None:
+        task.progress = progress
+
+
+class SearchTask:
+    """
+    A search submitted to BackgroundSearches, with the stage and share of the search done as last reported by
+    checkpoint.
+    """
+
+    def __init__(self, session_id: str):
+        """
+        Args:
+            session_id: the id of the session which submitted the search
+        """
+        self.task_id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.stage = 'queued'
+        self.progress = 0.0
+        self.submitted = time.time()
+        self.cancelled = threading.Event()
+        self.future = None
+
+    @property
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def cancel(self):
+        """
+        Cancels the search. A queued search never starts, a running one stops at its next checkpoint.
+        """
+        self.cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def result(self):
+        """
+        Returns:
+            the result of the search, once it is done
+
+        Raises:
+            SearchCancelled: if the search was cancelled
+            Exception: whatever the search raised
+        """
+        if self.future.cancelled():
+            raise SearchCancelled(self.task_id)
+
+        return self.future.result()
+
+
+class BackgroundSearches:
+    """
+    Runs searches on a local thread pool, so the request which submits a search returns at once and the page polls
+    for its progress and result. Each session has at most one search: submitting a search cancels the session's
+    previous one, which stops at its next checkpoint rather than scoring on for a page nobody is waiting for.
+
+    The pool, and the searches, belong to the process which submitted them, so polls must reach the same process,
+    e.g. gunicorn with one worker and --threads, or sticky sessions across several workers. Sessions are evicted
+    least recently submitted first, cancelling any search still running.
+    """
+
+    def __init__(self, max_workers: int = 2, max_sessions: int = 256):
+        """
+        Args:
+            max_workers: the number of searches run at once, later searches queue
+            max_sessions: the maximum number of sessions whose search is held
+        """
+        self.max_workers = max_workers
+        self.max_sessions = max_sessions
+        self.tasks = OrderedDict()
+        self.submitted = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+    def _run(self, task: SearchTask, fn, kwargs: dict):
+        _current.task = task
+        try:
+            checkpoint('started', 0.0)
+            result = fn(**kwargs)
+            task.stage = 'done'
+            task.progress = 1.0
+            with self._lock:
+                self.completed += 1
+            return result
+        except SearchCancelled:
+            with self._lock:
+                self.cancelled += 1
+            raise
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            _current.task = None
+
+    def submit(self, session_id: str, fn, kwargs: dict = None) -> SearchTask:
+        """
+        Starts a search for a session in the background, cancelling the session's previous search.
+
+        Args:
+            session_id: the id of the session searching
+            fn: the search function, which should call checkpoint between its stages
+            kwargs: the keyword arguments of fn
+
+        Returns:
+            the SearchTask of the search
+        """
+        task = SearchTask(session_id)
+
+        with self._lock:
+            # the pool is started on first use, so that it belongs to the process serving the searches
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='background-search')
+                self._executor_pid = os.getpid()
+
+            superseded = self.tasks.pop(session_id, None)
+            if superseded is not None:
+                self._cancel(superseded)
+            self.tasks[session_id] = task
+            while len(self.tasks) > self.max_sessions:
+                self._cancel(self.tasks.popitem(last=False)[1])
+            self.submitted += 1
+
+            task.future = self._executor.submit(self._run, task, fn, {} if kwargs is None else kwargs)
+
+        return task
+
+    def _cancel(self, task: SearchTask):
+        if not task.done:
+            task.cancel()
+            if task.future.cancelled():
+                # never started, so _run does not count it
+                self.cancelled += 1
+
+    def get(self, session_id: str) -> SearchTask:
+        """
+        Args:
+            session_id: the id of the session
+
+        Returns:
+            the session's latest search, or None if it has none
+        """
+        with self._lock:
+            return self.tasks.get(session_id)
+
+    def pop(self, session_id: str, task: SearchTask):
+        """
+        Forgets a session's search once its result has been delivered, unless a newer search replaced it.
+
+        Args:
+            session_id: the id of the session
+            task: the search delivered
+        """
+        with self._lock:
+            if self.tasks.get(session_id) is task:
+                del self.tasks[session_id]
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            a dictionary with the number of searches submitted, completed, cancelled and failed, and the number of
+            searches held which are still running or queued
+        """
+        with self._lock:
+            return {'submitted': self.submitted,
+                    'completed': self.completed,
+                    'cancelled': self.cancelled,
+                    'failed': self.failed,
+                    'running': sum(not x.done for x in self.tasks.values())}
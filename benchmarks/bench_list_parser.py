@@ -0,0 +1,47 @@
+"""
+Compares parse_list_column with the original convert_list_as_string / convert_col_with_ls parsing of the Skills and
+Minor Expertise columns of the candidate csv. Run from the repository root:
+
+    python benchmarks/bench_list_parser.py [path to candidate csv]
+"""
+import os
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candidate_data import convert_list_as_string, convert_col_with_ls, parse_list_column, list_columns
+
+
+def parse_with_convert_list_as_string(df_col: pd.Series) -> tuple:
+    """
+    The parsing done by app.py before parse_list_column: the unique values, then the lists of each row.
+    """
+    unique_values = convert_col_with_ls(df_col)
+    row_items = df_col.apply(lambda x: convert_list_as_string(x))
+
+    return row_items, unique_values
+
+
+if __name__ == '__main__':
+    file_path = sys.argv[1] if len(sys.argv) > 1 else 'Dummy_Candidate_Data.csv'
+    candidate_df = pd.read_csv(file_path)
+    n_repeats = 5
+
+    for col in list_columns:
+        old_items, old_unique = parse_with_convert_list_as_string(candidate_df[col])
+        new_items, new_unique, _, _ = parse_list_column(candidate_df[col])
+
+        # the old parser moves items with an apostrophe to the end of the list and can leave empty strings behind
+        n_reordered = sum(x != y for x, y in zip(old_items, new_items))
+        n_different = sum(sorted(z for z in x if z) != sorted(y) for x, y in zip(old_items, new_items))
+
+        old_seconds = min(timeit.repeat(lambda: parse_with_convert_list_as_string(candidate_df[col]), number=1, repeat=n_repeats))
+        new_seconds = min(timeit.repeat(lambda: parse_list_column(candidate_df[col]), number=1, repeat=n_repeats))
+
+        print('{}: {} rows, {} unique values ({} before)'.format(col, len(candidate_df), len(new_unique), len([x for x in old_unique if x])))
+        print('    convert_list_as_string: {:.4f}s'.format(old_seconds))
+        print('    parse_list_column:      {:.4f}s ({:.1f}x faster)'.format(new_seconds, old_seconds / new_seconds))
+        print('    rows reordered: {}, rows with different items: {}'.format(n_reordered, n_different))
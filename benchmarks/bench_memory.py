@@ -0,0 +1,37 @@
+"""
+Compares the memory held by the candidate data as originally loaded by app.py, with text columns as Python strings
+and Skills / Minor Expertise as Python lists, with the compact form from candidate_data.compact_candidate_data and
+vocabulary.ListColumn. Run from the repository root:
+
+    python benchmarks/bench_memory.py [path to candidate csv]
+"""
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candidate_data import parse_list_column, compact_candidate_data, memory_report, list_columns
+from vocabulary import Vocabulary, ListColumn
+
+if __name__ == '__main__':
+    file_path = sys.argv[1] if len(sys.argv) > 1 else 'Dummy_Candidate_Data.csv'
+    candidate_df = pd.read_csv(file_path)
+
+    original_df = candidate_df.copy()
+    compact_stores = {}
+    for col in list_columns:
+        row_items, values, row_ids, value_ids = parse_list_column(candidate_df[col])
+        original_df[col] = row_items
+        compact_stores[col] = ListColumn.from_ids(row_ids=row_ids, value_ids=value_ids, values=values, n_rows=len(candidate_df), vocabulary=Vocabulary(values))
+
+    # memory_usage counts each list but not the strings inside it, which parse_list_column interns across rows
+    original_report = memory_report(original_df)
+    compact_report = memory_report(compact_candidate_data(candidate_df.drop(columns=list_columns)), stores=compact_stores)
+
+    compact_report.index = [x.replace(' (ListColumn)', '') if x.replace(' (ListColumn)', '') in list_columns else x for x in compact_report.index]
+    report = original_report.join(compact_report, lsuffix=' Original', rsuffix=' Compact')
+    report['Ratio'] = (report['Bytes Original'] / report['Bytes Compact']).round(1)
+
+    print(report.to_string())
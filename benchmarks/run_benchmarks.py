@@ -0,0 +1,292 @@
+"""
+Benchmarks the prospecting search against synthetic candidate pools of increasing size. For each size a candidate
+csv is generated with benchmarks/synthetic_data.py and a fresh process loads app.py on it, then times:
+
+    - each apply_framework_* function and apply_framework, called row by row on a sample of candidates
+    - the batch scoring of each dimension, apply_framework_batch and score_frame over the whole pool
+    - display_prospecting_outputs end to end, with an empty search cache (cold) and on repeated searches (warm)
+
+Each timing reports latency percentiles and candidates scored per second, with the peak memory of one call traced
+separately. The results are written as json. Run from the repository root:
+
+    python benchmarks/run_benchmarks.py --sizes 18000 180000 1800000 --output benchmark_results.json
+
+The 18M candidate pool needs around 10GB of disk for its csv and more memory than most laptops, add 18000000 to
+--sizes to run it.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+repository_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repository_root)
+
+default_sizes = [18000, 180000, 1800000]
+
+# the scalar function scoring each dimension, with the criteria and candidate column(s) it is called with
+scalar_functions = {
+    'salary_score': ('apply_framework_to_salary', lambda ss, c, r, d: ss.apply_framework_to_salary(input_salary=c['input_salary'], data_min_salary=r['Min Salary'], data_max_salary=r['Max Salary'])),
+    'location_score': ('apply_framework_location', lambda ss, c, r, d: ss.apply_framework_location(input_location=c['input_location'], data_location=r['Location'], all_mapped_distances=d)),
+    'sector_score': ('apply_framework_to_sector', lambda ss, c, r, d: ss.apply_framework_to_sector(input_sector=c['input_sector'], data_sector=r['Sector'])),
+    'wfh_score': ('apply_framework_to_wfh', lambda ss, c, r, d: ss.apply_framework_to_wfh(input_wfh=c['input_wfh'], data_wfh=r['WFH Days'])),
+    'skills_score': ('apply_framework_to_skills', lambda ss, c, r, d: ss.apply_framework_to_skills(input_skills=c['input_skills'], data_skills=r['Skills'])),
+    'experience_score': ('apply_framework_experience_prospecting', lambda ss, c, r, d: ss.apply_framework_experience_prospecting(input_experience=c['input_experience'], data_experience=r['Years Experience'])),
+    'area_score': ('apply_framework_to_areas', lambda ss, c, r, d: ss.apply_framework_to_areas(input_areas=c['input_areas'], data_areas=r['Minor Expertise'])),
+    'expertise_score': ('apply_framework_to_area_of_expertise', lambda ss, c, r, d: ss.apply_framework_to_area_of_expertise(input_expertise=c['input_expertise'], data_expertise=r['Major Expertise'])),
+    'move_score': ('apply_framework_to_last_moved', lambda ss, c, r, d: ss.apply_framework_to_last_moved(input_moved=c['input_moved'], data_moved=r['Last Moved Years'])),
+    'status_score': ('apply_framework_to_move_status', lambda ss, c, r, d: ss.apply_framework_to_move_status(input_move_status=c['input_move_status'], data_move_status=r['Move Status'])),
+}
+
+
+def random_search(rng: random.Random, app_module) -> dict:
+    """
+    Draws a search as a recruiter could enter it in the app, from the options of the app's inputs.
+
+    Args:
+        rng: the random generator
+        app_module: the imported app, for its dropdown options
+
+    Returns:
+        a dictionary of display_prospecting_outputs arguments
+    """
+    def random_range(low, high):
+        start = rng.randint(low, high)
+        return [start, rng.randint(start, high)]
+
+    summary = app_module.candidate_reloader.store.summary
+    salary_min = int(math.floor(summary['salary_min'] / 10000)) * 10000
+    salary_max = int(math.ceil(summary['salary_max'] / 10000)) * 10000
+    salary_start = rng.randrange(salary_min, salary_max, 20000)
+
+    return {'page_current': 0,
+            'page_size': 25,
+            'sort_by': [],
+            'weight_inputs': list(app_module.ss.framework_weighting.values()),
+            'sector_input': rng.choice(summary['sectors']),
+            'contract_type_input': rng.choice([['Permanent'], ['Contractor'], ['Permanent', 'Contractor']]),
+            'location_input': rng.choice(summary['locations']),
+            'salary_input': [salary_start, salary_start + rng.choice([0, 20000, 40000, 100000])],
+            'experience_input': random_range(int(summary['experience_years'][0]), int(summary['experience_years'][-1])),
+            'wfh_input': random_range(int(summary['wfh_days'][0]), int(summary['wfh_days'][-1])),
+            'last_moved_input': random_range(int(summary['last_move_years'][0]), int(summary['last_move_years'][-1])),
+            'major_expertise_input': rng.choice(app_module.unique_areas),
+            'minor_expertise_input': rng.sample(app_module.unique_areas, rng.randint(1, 4)),
+            'skills_input': rng.sample(summary['unique_skills'], rng.randint(1, 6)),
+            'move_status_input': rng.sample(app_module.move_types, rng.randint(1, 3))}
+
+
+def search_to_criteria(search: dict) -> dict:
+    """
+    Maps display_prospecting_outputs arguments to the criteria the framework is scored with.
+    """
+    return {'input_salary': search['salary_input'],
+            'input_location': search['location_input'],
+            'input_sector': search['sector_input'],
+            'input_wfh': search['wfh_input'],
+            'input_skills': search['skills_input'],
+            'input_experience': search['experience_input'],
+            'input_areas': search['minor_expertise_input'],
+            'input_expertise': search['major_expertise_input'],
+            'input_moved': search['last_moved_input'],
+            'input_move_status': search['move_status_input']}
+
+
+def summarise(latencies: list, n_candidates: int, peak_memory: int = None) -> dict:
+    """
+    Summarises the timings of repeated calls which each score n_candidates.
+
+    Args:
+        latencies: the time of each call in seconds
+        n_candidates: the number of candidates each call scores
+        peak_memory: the peak traced memory of one call in bytes
+
+    Returns:
+        a dictionary of latency percentiles in ms, throughput in candidates per second and peak memory
+    """
+    latencies_ms = np.array(latencies) * 1000
+    summary = {'n_calls': len(latencies),
+               'n_candidates': n_candidates,
+               'latency_ms': {'mean': float(latencies_ms.mean()),
+                              'p50': float(np.percentile(latencies_ms, 50)),
+                              'p90': float(np.percentile(latencies_ms, 90)),
+                              'p99': float(np.percentile(latencies_ms, 99)),
+                              'max': float(latencies_ms.max())},
+               'candidates_per_second': float(n_candidates / np.mean(latencies))}
+    if peak_memory is not None:
+        summary['peak_memory_bytes'] = int(peak_memory)
+
+    return summary
+
+
+def time_calls(function, arguments: list) -> tuple:
+    """
+    Calls function once per set of arguments, then once more under tracemalloc for its peak memory.
+
+    Args:
+        function: the function to time
+        arguments: a list of argument tuples, one per call
+
+    Returns:
+        a tuple of the latency of each call in seconds and the peak traced memory of one call in bytes
+    """
+    latencies = []
+    for x in arguments:
+        start = time.perf_counter()
+        function(*x)
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(*arguments[0])
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return latencies, peak_memory
+
+
+def benchmark_dataset(file_path: str, n_searches: int, scalar_rows: int, seed: int) -> dict:
+    """
+    Loads app.py on a candidate csv and times the framework and the search callback against it. Must run in its own
+    process, as app.py loads its candidate data when first imported.
+
+    Args:
+        file_path: the candidate csv
+        n_searches: the number of random searches timed for each function
+        scalar_rows: the number of candidates the row by row functions are timed on
+        seed: the random seed for the searches
+
+    Returns:
+        a dictionary of results for the dataset
+    """
+    os.environ['PROSPECTING_DATA_FILE'] = file_path
+
+    start = time.perf_counter()
+    import app
+    startup_seconds = time.perf_counter() - start
+
+    ss = app.ss
+    store = app.candidate_reloader.store
+    df = store.df
+    rng = random.Random(seed)
+    searches = [random_search(rng, app) for _ in range(n_searches)]
+    all_criteria = [search_to_criteria(x) for x in searches]
+    mapped_distances = ss.location_registry.to_mapped_distances()
+
+    results = {'n_candidates': len(df), 'startup_seconds': startup_seconds, 'scalar': {}, 'batch': {}, 'end_to_end': {}}
+
+    # row by row, as the functions were applied before the batch scoring, on a sample of the pool
+    sample_df = df.head(scalar_rows)
+    sample_df = sample_df.assign(**{x: y.to_lists(np.arange(len(sample_df))) for x, y in store.lists.items()})
+    sample_rows = [x for _, x in sample_df.iterrows()]
+
+    for name, function in scalar_functions.values():
+        latencies, peak_memory = time_calls(lambda c: [function(ss, c, x, mapped_distances) for x in sample_rows], [(x,) for x in all_criteria])
+        results['scalar'][name] = summarise(latencies, n_candidates=len(sample_rows), peak_memory=peak_memory)
+
+    def score_rows(criteria):
+        for x in sample_rows:
+            ss.apply_framework(**{y: z(ss, criteria, x, mapped_distances) for y, (_, z) in scalar_functions.items()})
+
+    latencies, peak_memory = time_calls(score_rows, [(x,) for x in all_criteria])
+    results['scalar']['apply_framework'] = summarise(latencies, n_candidates=len(sample_rows), peak_memory=peak_memory)
+
+    # batch scoring over the whole pool
+    for dimension in ss.kwargs_to_score_column_mapping:
+        latencies, peak_memory = time_calls(lambda c: ss.score_dimensions(df=df, criteria=c, dimensions=[dimension], column_indexes=store.column_indexes),
+                                            [(x,) for x in all_criteria])
+        results['batch'][dimension] = summarise(latencies, n_candidates=len(df), peak_memory=peak_memory)
+
+    all_scores = ss.score_dimensions(df=df, criteria=all_criteria[0], column_indexes=store.column_indexes)
+    latencies, peak_memory = time_calls(ss.apply_framework_batch, [(all_scores,)] * n_searches)
+    results['batch']['apply_framework_batch'] = summarise(latencies, n_candidates=len(df), peak_memory=peak_memory)
+
+    latencies, peak_memory = time_calls(lambda c: ss.score_frame(df=df, criteria=c, column_indexes=store.column_indexes), [(x,) for x in all_criteria])
+    results['batch']['score_frame'] = summarise(latencies, n_candidates=len(df), peak_memory=peak_memory)
+
+    # the search callback, with every search new to the cache and then with every search repeated
+    def search_cold(search):
+        app.search_cache.clear()
+        app.display_prospecting_outputs(n_clicks=1, **search)
+
+    latencies, peak_memory = time_calls(search_cold, [(x,) for x in searches])
+    results['end_to_end']['display_prospecting_outputs_cold'] = summarise(latencies, n_candidates=len(df), peak_memory=peak_memory)
+
+    for x in searches:
+        app.display_prospecting_outputs(n_clicks=1, **x)
+    latencies, peak_memory = time_calls(lambda x: app.display_prospecting_outputs(n_clicks=1, **x), [(x,) for x in searches])
+    results['end_to_end']['display_prospecting_outputs_warm'] = summarise(latencies, n_candidates=len(df), peak_memory=peak_memory)
+
+    # ru_maxrss is in kb on linux and bytes on macos
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results['max_rss_bytes'] = int(max_rss if sys.platform == 'darwin' else max_rss * 1024)
+
+    if app.parallel_scorer is not None:
+        app.parallel_scorer.close()
+
+    return results
+
+
+def environment_details() -> dict:
+    """
+    Returns:
+        the versions and machine the benchmarks ran on
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=repository_root, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the prospecting search against synthetic candidate pools.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=default_sizes, help='the number of candidates in each pool')
+    parser.add_argument('--searches', type=int, default=20, help='the number of random searches timed for each function')
+    parser.add_argument('--scalar-rows', type=int, default=2000, help='the number of candidates the row by row functions are timed on')
+    parser.add_argument('--data-dir', default=os.path.join(repository_root, 'benchmarks', 'data'), help='where the synthetic csvs are written, existing files are reused')
+    parser.add_argument('--source', default=os.path.join(repository_root, 'Dummy_Candidate_Data.csv'), help='the candidate csv the synthetic data is learnt from')
+    parser.add_argument('--seed', type=int, default=0, help='the random seed')
+    parser.add_argument('--output', default=None, help='the json file to write, printed if not given')
+    parser.add_argument('--dataset', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.dataset is not None:
+        # a child process benchmarking a single dataset
+        print(json.dumps(benchmark_dataset(file_path=args.dataset, n_searches=args.searches, scalar_rows=args.scalar_rows, seed=args.seed)))
+        sys.exit(0)
+
+    from synthetic_data import CandidateGenerator
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    generator = None
+    report = {'environment': environment_details(), 'datasets': []}
+
+    for n_rows in args.sizes:
+        file_path = os.path.join(args.data_dir, 'synthetic_candidates_{}_seed{}.csv'.format(n_rows, args.seed))
+        if not os.path.exists(file_path):
+            generator = CandidateGenerator(pd.read_csv(args.source)) if generator is None else generator
+            generator.write_csv(file_path, n_rows=n_rows, seed=args.seed)
+
+        print('Benchmarking {} candidates'.format(n_rows), file=sys.stderr)
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), '--dataset', file_path, '--searches', str(args.searches),
+                                '--scalar-rows', str(args.scalar_rows), '--seed', str(args.seed)],
+                               cwd=repository_root, capture_output=True, text=True, check=True)
+        report['datasets'].append(json.loads(child.stdout.strip().splitlines()[-1]))
+
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
@@ -0,0 +1,154 @@
+"""
+Generates synthetic candidate data with the schema and value distributions of Dummy_Candidate_Data.csv, at any
+number of rows, for benchmarking the prospecting search as the candidate pool grows. With --jobs it generates jobs
+in the form of Dummy_Job_Data.csv from the same distributions instead.
+
+    python benchmarks/synthetic_data.py 1800000 synthetic_candidates.csv
+    python benchmarks/synthetic_data.py 500 Dummy_Job_Data.csv --jobs
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candidate_data import parse_list_column, list_columns
+
+# the distinct columns sampled from their own distribution, the salaries follow the years of experience
+marginal_columns = ['Location', 'Sector', 'Major Expertise', 'WFH Days', 'Job Type', 'Last Moved Years', 'Move Status']
+job_csv_columns = ['Job Title', 'Company', 'Location', 'Sector', 'Major Expertise', 'Minor Expertise', 'Min Salary', 'Max Salary',
+                   'Min Years Experience', 'WFH Days', 'Skills', 'Job Type']
+
+
+def format_list(items: list) -> str:
+    """
+    Formats a list of items as numpy saves it to csv, double quoting items which contain an apostrophe.
+
+    Args:
+        items: the items of the list
+
+    Returns:
+        the list as a string, e.g. ['Python' "Lloyd's Syndicate"]
+    """
+    return '[' + ' '.join('"{}"'.format(x) if "'" in x else "'{}'".format(x) for x in items) + ']'
+
+
+class CandidateGenerator:
+    """
+    Learns the distribution of each column of a candidate csv and samples new candidates from it. Categorical and
+    small integer columns are sampled from their frequencies, the minimum salary is sampled from candidates with
+    the same years of experience, and list columns keep the distribution of both their length and their items.
+    """
+
+    def __init__(self, source_df: pd.DataFrame):
+        """
+        Args:
+            source_df: the candidate data to learn from, as read from the csv
+        """
+        self.marginals = {x: source_df[x].value_counts(normalize=True) for x in marginal_columns + ['Years Experience']}
+        self.salaries_by_experience = {x: y.to_numpy() for x, y in source_df.groupby('Years Experience')['Min Salary']}
+        self.max_salary_ratios = (source_df['Max Salary'] / source_df['Min Salary']).to_numpy()
+
+        self.list_distributions = {}
+        for col in list_columns:
+            row_items, unique_items, _, item_ids = parse_list_column(source_df[col])
+            lengths = pd.Series([len(x) for x in row_items]).value_counts(normalize=True)
+            item_frequencies = np.bincount(item_ids, minlength=len(unique_items)) / len(item_ids)
+            self.list_distributions[col] = (lengths, np.array(unique_items, dtype=object), item_frequencies)
+
+    def _sample_list_column(self, col: str, n_rows: int, rng: np.random.Generator) -> list:
+        lengths, unique_items, item_frequencies = self.list_distributions[col]
+        row_lengths = rng.choice(lengths.index.to_numpy(), size=n_rows, p=lengths.to_numpy())
+
+        # a random priority per item, weighted by frequency, picks each row's items without replacement
+        priorities = rng.random((n_rows, len(unique_items))) ** (1 / item_frequencies)
+        ranked_items = np.argsort(-priorities, axis=1)
+
+        return [format_list(unique_items[x[:y]]) for x, y in zip(ranked_items, row_lengths)]
+
+    def generate(self, n_rows: int, seed: int = 0) -> pd.DataFrame:
+        """
+        Samples synthetic candidates.
+
+        Args:
+            n_rows: the number of candidates
+            seed: the random seed
+
+        Returns:
+            a DataFrame in the form of the candidate csv
+        """
+        rng = np.random.default_rng(seed)
+        df = pd.DataFrame({'First Name': 'synthetic fn', 'Last Name': 'synthetic ln', 'Email': 'synthetic email'},
+                          index=pd.RangeIndex(n_rows))
+
+        for col in marginal_columns + ['Years Experience']:
+            df[col] = rng.choice(self.marginals[col].index.to_numpy(), size=n_rows, p=self.marginals[col].to_numpy())
+
+        min_salary = np.empty(n_rows, dtype=np.int64)
+        for years, salaries in self.salaries_by_experience.items():
+            rows = np.flatnonzero(df['Years Experience'].to_numpy() == years)
+            min_salary[rows] = rng.choice(salaries, size=len(rows))
+        df['Min Salary'] = min_salary
+        df['Max Salary'] = np.round(min_salary * rng.choice(self.max_salary_ratios, size=n_rows), 4)
+
+        for col in list_columns:
+            df[col] = self._sample_list_column(col, n_rows, rng)
+
+        return df.loc[:, ['First Name', 'Last Name', 'Email', 'Location', 'Sector', 'Major Expertise', 'Minor Expertise',
+                          'Min Salary', 'Max Salary', 'Years Experience', 'WFH Days', 'Skills', 'Job Type',
+                          'Last Moved Years', 'Move Status']]
+
+    def write_csv(self, file_path: str, n_rows: int, seed: int = 0, chunk_size: int = 500000):
+        """
+        Writes synthetic candidates to a csv a chunk at a time, so that files larger than memory can be written.
+
+        Args:
+            file_path: the path of the csv to write
+            n_rows: the number of candidates
+            seed: the random seed
+            chunk_size: the number of candidates generated at a time
+        """
+        for chunk_number, start in enumerate(range(0, n_rows, chunk_size)):
+            chunk_df = self.generate(min(chunk_size, n_rows - start), seed=seed + chunk_number)
+            chunk_df.to_csv(file_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+
+class JobGenerator(CandidateGenerator):
+    """
+    Samples jobs from the distributions of a candidate csv, so that the jobs ask for what the candidates offer. Each
+    job takes the location, sector, expertise, skills, WFH days and contract type of a sampled candidate, with their
+    years of experience as the minimum the job requires and their salary range as the range the job pays.
+    """
+
+    def generate(self, n_rows: int, seed: int = 0) -> pd.DataFrame:
+        """
+        Samples synthetic jobs.
+
+        Args:
+            n_rows: the number of jobs
+            seed: the random seed
+
+        Returns:
+            a DataFrame in the form of the job csv
+        """
+        df = super().generate(n_rows, seed=seed)
+        df['Job Title'] = 'synthetic title'
+        df['Company'] = 'synthetic company'
+        df = df.rename(columns={'Years Experience': 'Min Years Experience'})
+
+        return df.loc[:, job_csv_columns]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Writes synthetic candidate or job data to a csv.')
+    parser.add_argument('n_rows', type=int, help='the number of candidates, or jobs')
+    parser.add_argument('file_path', help='the csv to write')
+    parser.add_argument('--source', default='Dummy_Candidate_Data.csv', help='the candidate csv to learn the distributions from')
+    parser.add_argument('--seed', type=int, default=0, help='the random seed')
+    parser.add_argument('--jobs', action='store_true', help='write jobs rather than candidates')
+    args = parser.parse_args()
+
+    (JobGenerator if args.jobs else CandidateGenerator)(pd.read_csv(args.source)).write_csv(args.file_path, n_rows=args.n_rows, seed=args.seed)
@@ -0,0 +1,216 @@
+import mmap
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# columns whose values are lists saved as strings on disk
+list_columns = ['Skills', 'Minor Expertise']
+categorical_columns = ['Location', 'Sector', 'Major Expertise', 'Job Type', 'Move Status']
+
+# the items of a numpy style list, single quoted unless they contain an apostrophe, e.g. 'Python' "Lloyd's Syndicate"
+single_quoted_item_pattern = re.compile(r"'([^']*)'")
+list_item_pattern = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+
+
+def convert_list_as_string(ls_as_string: list):
+    """
+    Data is contained in a list gets saved as a string when on disk. This function coverts the string back into a list
+
+    Args:
+        ls_as_string: the string which has values in a list within it
+
+    Returns:
+        a list of values, which are not whitespace, within that string
+    """
+    ls_as_string = ls_as_string[2:-2]
+    if "'s" not in ls_as_string:
+        string_to_list = ls_as_string.split("'")
+        ls_as_ls = [x for x in string_to_list if not x.isspace()]
+    else:
+        string_to_list = ls_as_string.split('"')
+        contains_apostrophe = [x for x in string_to_list if "'s" in x]
+        not_contains_apostrophe = [x for x in string_to_list if x not in contains_apostrophe]
+        not_contains_apostrophe_as_ls = [x.split("'") for x in not_contains_apostrophe]
+        not_contains_apostrophe_as_ls = [item for sublist in not_contains_apostrophe_as_ls for item in sublist]
+        ls_as_ls = [x for x in not_contains_apostrophe_as_ls if not x.isspace()]
+        ls_as_ls = ls_as_ls + contains_apostrophe
+
+    return ls_as_ls
+
+
+def parse_list_column(df_col: pd.Series) -> tuple:
+    """
+    Parses a column of lists saved as strings in the numpy style, e.g. ['Python' 'R'] or ["Lloyd's Syndicate" 'Broker'],
+    in a single pass. Each item is matched by its quotes, so items keep their order and apostrophes within double
+    quoted items are kept, and the items are interned to ids against the sorted unique values as they are parsed.
+
+    Args:
+        df_col: the column of lists saved as strings
+
+    Returns:
+        a tuple of a list with the list of items of each row, the sorted unique items, and two arrays giving the row
+        position and item id of every item parsed
+    """
+    row_items = [single_quoted_item_pattern.findall(x) if '"' not in x else [y or z for y, z in list_item_pattern.findall(x)]
+                 for x in df_col]
+
+    n_items = np.fromiter(map(len, row_items), dtype=np.int64, count=len(row_items))
+    row_ids = np.repeat(np.arange(len(row_items)), n_items)
+    item_ids, unique_items = pd.factorize(np.fromiter((x for y in row_items for x in y), dtype=object, count=n_items.sum()))
+
+    # renumber the ids to follow the sorted order of the unique items
+    sort_order = np.argsort(np.asarray(unique_items, dtype=str), kind='stable')
+    sorted_ids = np.empty(len(sort_order), dtype=np.int64)
+    sorted_ids[sort_order] = np.arange(len(sort_order))
+
+    return row_items, [unique_items[x] for x in sort_order], row_ids, sorted_ids[item_ids]
+
+
+def get_dataset_version(file_path: str) -> str:
+    """
+    Identifies the version of the candidate data from the modification time and size of its file, so that cached
+    results can be dropped when the file changes.
+
+    Args:
+        file_path: the path of the candidate data
+
+    Returns:
+        a string identifying the version of the data
+    """
+    file_stat = os.stat(file_path)
+
+    return '{}-{}'.format(file_stat.st_mtime_ns, file_stat.st_size)
+
+
+def downcast_numeric(df_col: pd.Series) -> pd.Series:
+    """
+    Stores a numeric column in the smallest dtype which holds every value exactly, e.g. years of experience as int8
+    and salaries as int32. Floats are only stored as float32 if no value changes, so scores are never affected.
+
+    Args:
+        df_col: the numeric column
+
+    Returns:
+        the column in its smallest exact dtype
+    """
+    if pd.api.types.is_integer_dtype(df_col.dtype):
+        return pd.to_numeric(df_col, downcast='integer')
+
+    if df_col.notna().all() and (df_col == np.round(df_col)).all():
+        return pd.to_numeric(df_col.astype(np.int64), downcast='integer')
+
+    downcast_col = df_col.astype(np.float32)
+    if np.array_equal(downcast_col.to_numpy(dtype=np.float64), df_col.to_numpy(dtype=np.float64), equal_nan=True):
+        return downcast_col
+
+    return df_col
+
+
+def compact_candidate_data(df: pd.DataFrame, category_max_ratio: float = 0.5) -> pd.DataFrame:
+    """
+    Converts candidate data into a compact form for holding in memory. The categorical columns, and any other text
+    column with few distinct values, are stored as categoricals and numeric columns in their smallest exact dtype.
+
+    Args:
+        df: the candidate data, with the list columns already removed or parsed
+        category_max_ratio: other text columns are stored as categoricals when their distinct values are at most
+                            this share of the rows
+
+    Returns:
+        the compacted candidate data
+    """
+    df[categorical_columns] = df[categorical_columns].astype('category')
+
+    for col in df.columns:
+        if pd.api.types.is_numeric_dtype(df[col].dtype):
+            df[col] = downcast_numeric(df[col])
+        elif (not isinstance(df[col].dtype, pd.CategoricalDtype) and pd.api.types.is_string_dtype(df[col].dtype)
+              and col not in list_columns and df[col].nunique() <= category_max_ratio * len(df)):
+            df[col] = df[col].astype('category')
+
+    return df
+
+
+def is_memory_mapped(values) -> bool:
+    """
+    Checks whether an array, or the data behind a Series, is a view of a memory-mapped file.
+
+    Args:
+        values: a numpy array, pandas Series or Categorical
+
+    Returns:
+        True if the values are read from a memory-mapped file
+    """
+    if isinstance(values, pd.Series):
+        values = values.array
+    if isinstance(values, pd.Categorical):
+        values = values.codes
+    values = np.asarray(values)
+
+    while values is not None:
+        if isinstance(values, (np.memmap, mmap.mmap)):
+            return True
+        values = getattr(values, 'base', None)
+
+    return False
+
+
+def memory_report(df: pd.DataFrame, stores: dict = None) -> pd.DataFrame:
+    """
+    Reports the memory held by each column of the candidate data and by any structures held alongside it.
+
+    Args:
+        df: the candidate data
+        stores: a dictionary of name to a structure with an nbytes attribute, e.g. a BitsetColumn or ListColumn
+
+    Returns:
+        a DataFrame with the dtype and bytes of each column and structure, whether they are memory-mapped, and so
+        shared between processes, and a total row
+    """
+    def store_is_mapped(store):
+        arrays = [x for x in vars(store).values() if isinstance(x, np.ndarray)]
+        return bool(arrays) and all(is_memory_mapped(x) for x in arrays)
+
+    rows = [(x, str(df[x].dtype), int(df[x].memory_usage(index=False, deep=True)), is_memory_mapped(df[x])) for x in df.columns]
+    rows.append(('Index', type(df.index).__name__, int(df.index.memory_usage(deep=True)), False))
+    rows.extend((x, type(y).__name__, int(y.nbytes), store_is_mapped(y)) for x, y in ({} if stores is None else stores).items())
+
+    report = pd.DataFrame(rows, columns=['Column', 'Type', 'Bytes', 'Mapped']).set_index('Column')
+    report.loc['Total'] = ['', report['Bytes'].sum(), report['Mapped'].all()]
+
+    return report
+
+
+def convert_col_with_ls(df_col):
+
+    df_col = df_col.apply(lambda x: convert_list_as_string(x))
+
+    unique_list = []
+
+    for x in range(0, len(df_col)):
+        unique_list.extend(df_col[x])
+
+    unique_list = sorted(list(set(unique_list)))
+
+    return unique_list
+
+
+def prepare_candidate_data(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts candidate data read from disk into the form it is scored in, with the list columns converted back into
+    lists and the categorical columns as pandas categoricals.
+
+    Args:
+        df: the candidate data as read from the csv
+
+    Returns:
+        the converted candidate data
+    """
+    for col in list_columns:
+        df[col] = parse_list_column(df[col])[0]
+
+    df[categorical_columns] = df[categorical_columns].astype('category')
+
+    return df
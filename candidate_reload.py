@@ -0,0 +1,162 @@
+import contextlib
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from candidate_data import get_dataset_version
+from candidate_store import CandidateStore, default_snapshot_path, snapshot_format_version
+from file_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+
+class CandidateReloader:
+    """
+    Keeps the candidate store up to date with its csv. The csv is polled for a new version, the rows which were
+    appended, changed or removed are applied to the store as a delta and the new store is written as the snapshot,
+    then swapped in as store. The swap replaces a single reference, so a search which read store before the swap
+    finishes on the version it started with, and the next search sees the new version.
+
+    Under gunicorn every worker polls the csv, the first to see a new version takes the reload lock and writes the
+    snapshot, and the others wait for the lock and load it, so the delta is applied once and every worker maps the
+    same files.
+    """
+
+    def __init__(self, file_path: str, store: CandidateStore, snapshot_path: str = None, key_column: str = None,
+                 interval_seconds: float = 30, on_swap=None):
+        """
+        Args:
+            file_path: the path of the candidate csv
+            store: the store loaded from the csv
+            snapshot_path: the path of the snapshot, defaults to default_snapshot_path(file_path)
+            key_column: the column which identifies a candidate, rows are matched by position when not given
+            interval_seconds: the time between polls of the csv, 0 to only check when check is called
+            on_swap: a function called with the new and the old store after each swap
+        """
+        self.file_path = file_path
+        self.snapshot_path = default_snapshot_path(file_path) if snapshot_path is None else snapshot_path
+        self.key_column = key_column
+        self.interval_seconds = interval_seconds
+        self.on_swap = on_swap
+        self.store = store
+
+        self.reloads = 0
+        self.failures = 0
+        self.counts = {'appended': 0, 'changed': 0, 'removed': 0, 'rebuilt': 0}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+
+    def _load_snapshot(self, version: str):
+        # another process may already have applied this version and written the snapshot
+        try:
+            meta = CandidateStore.read_snapshot_meta(self.snapshot_path)
+            if meta['format_version'] == snapshot_format_version and meta['version'] == version:
+                return CandidateStore.from_snapshot(self.snapshot_path)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        return None
+
+    def _reload_lock(self):
+        # a read only deployment cannot create the lock file, nor write the snapshot, so each process updates alone
+        if not os.access(os.path.dirname(os.path.abspath(self.snapshot_path)), os.W_OK):
+            return contextlib.nullcontext()
+
+        return file_lock(self.snapshot_path + '.reload.lock')
+
+    def _apply(self, version: str) -> CandidateStore:
+        store, counts = self.store.update(pd.read_csv(self.file_path), version=version, key_column=self.key_column)
+        for x, y in counts.items():
+            self.counts[x] += y
+
+        try:
+            store.save_snapshot(self.snapshot_path)
+            store = CandidateStore.from_snapshot(self.snapshot_path)
+        except OSError:
+            # e.g. a read only deployment, the updated store is kept in memory
+            pass
+
+        return store
+
+    def check(self) -> bool:
+        """
+        Checks the csv for a new version, and applies and swaps it in if there is one.
+
+        Returns:
+            True if a new version was swapped in
+        """
+        with self._lock:
+            try:
+                version = get_dataset_version(self.file_path)
+            except OSError:
+                # e.g. the csv is being replaced, the next poll tries again
+                return False
+
+            if version == self.store.version:
+                return False
+
+            try:
+                store = self._load_snapshot(version)
+
+                if store is None:
+                    with self._reload_lock():
+                        # the process which held the lock before may have written this version meanwhile
+                        store = self._load_snapshot(version)
+
+                        if store is None:
+                            store = self._apply(version)
+            except (OSError, ValueError, TypeError, KeyError) as e:
+                # a csv caught mid-write or malformed keeps the current version until the next poll
+                logger.warning('Could not reload %s at version %s, keeping version %s: %r', self.file_path, version, self.store.version, e)
+                self.failures += 1
+                return False
+
+            old_store = self.store
+            self.store = store
+            self.reloads += 1
+
+        if self.on_swap is not None:
+            self.on_swap(store, old_store)
+
+        return True
+
+    def _poll(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.check()
+            except Exception:
+                # e.g. on_swap failing, polling carries on so the next version is still picked up
+                logger.exception('Reloading %s failed', self.file_path)
+
+    def start(self):
+        """
+        Starts polling the csv in a background thread, unless interval_seconds is 0. Safe to call on every request:
+        the thread is started once per process, so workers forked after the app was loaded start their own.
+        """
+        if self.interval_seconds <= 0 or (self._thread is not None and self._thread_pid == os.getpid()):
+            return
+
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._poll, name='candidate-reloader', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def stop(self):
+        """
+        Stops polling the csv.
+        """
+        self._stop.set()
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            a dictionary with the number of reloads and failed reloads, and the number of candidates appended,
+            changed and removed by them and the number of reloads which rebuilt the store
+        """
+        return dict(self.counts, reloads=self.reloads, failures=self.failures)
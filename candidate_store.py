@@ -0,0 +1,527 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from candidate_data import parse_list_column, get_dataset_version, compact_candidate_data, list_columns
+from file_lock import file_lock
+from locations import GridIndex
+from vocabulary import Vocabulary, BitsetColumn, ListColumn
+
+# bumped whenever the layout of the snapshot changes, older snapshots are then rebuilt from the csv
+snapshot_format_version = 3
+
+
+def default_snapshot_path(file_path: str) -> str:
+    """
+    Args:
+        file_path: the path of the candidate csv
+
+    Returns:
+        the path of its snapshot, next to the csv, e.g. Dummy_Candidate_Data.snapshot
+    """
+    return os.path.splitext(file_path)[0] + '.snapshot'
+
+
+def snapshot_time(snapshot_directory: str) -> int:
+    """
+    Args:
+        snapshot_directory: a directory written by save_snapshot, e.g. Dummy_Candidate_Data.snapshot.<time_ns>-<pid>
+
+    Returns:
+        the time in nanoseconds it was written at, or None if it was not named by save_snapshot
+    """
+    written_at = os.path.basename(snapshot_directory).rsplit('.', 1)[-1].split('-')[0]
+
+    return int(written_at) if written_at.isdigit() else None
+
+
+def hash_rows(df: pd.DataFrame) -> np.ndarray:
+    """
+    Hashes each row of the candidate csv as read, so that a later read of the csv can be compared row by row.
+
+    Args:
+        df: the candidate data as read from the csv
+
+    Returns:
+        an array with a uint64 hash of each row
+    """
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+
+
+def concat_compact_columns(first: pd.Series, second: pd.Series):
+    """
+    Stacks two compacted columns, e.g. of the candidates already loaded and of a delta of new candidates. When the
+    first is categorical, the second is coded against its categories, adding any new values after them, so the
+    codes of the first are kept as they are.
+
+    Args:
+        first: the first column
+        second: the column to stack after it
+
+    Returns:
+        a Categorical or numpy array with the values of both columns
+    """
+    if isinstance(first.dtype, pd.CategoricalDtype):
+        second_values = pd.Series(np.asarray(second, dtype=object))
+        new_values = pd.Index(second_values.dropna().unique()).difference(first.cat.categories)
+        categories = first.cat.categories.append(new_values)
+        codes = np.concatenate([np.asarray(first.array.codes, dtype=np.int64), categories.get_indexer(second_values)])
+
+        return pd.Categorical.from_codes(codes, categories=categories)
+
+    if pd.api.types.is_numeric_dtype(first.dtype) and pd.api.types.is_numeric_dtype(second.dtype) and not isinstance(second.dtype, pd.CategoricalDtype):
+        return np.concatenate([first.to_numpy(), second.to_numpy()])
+
+    # e.g. a numeric column whose new rows hold text, kept as a categorical of both
+    return pd.Categorical(np.concatenate([np.asarray(first, dtype=object), np.asarray(second, dtype=object)]))
+
+
+class CandidateStore:
+    """
+    The candidate data in the form the app searches it: the compact candidate frame, Skills and Minor Expertise as
+    ListColumns and BitsetColumns over shared vocabularies, and a summary of the values the app's inputs offer.
+    A store is built by parsing the candidate csv, or loaded from a binary snapshot of an earlier parse.
+    """
+
+    def __init__(self, df: pd.DataFrame, lists: dict, bitsets: dict, summary: dict, version: str, row_hashes: np.ndarray = None,
+                 previous_version: str = None, previous_positions: np.ndarray = None):
+        """
+        Args:
+            df: the compact candidate data, without the list columns
+            lists: the ListColumn of each list column
+            bitsets: the BitsetColumn of each list column
+            summary: the distinct values and bounds of the columns the app's inputs are built from
+            version: the version of the candidate csv the store was built from
+            row_hashes: the hash of each row of the csv, see hash_rows, used to find the rows of a later csv which
+                        changed
+            previous_version: the version of the store this one was updated from, None if it was built from the csv
+            previous_positions: for a store updated from previous_version, the position in that store of each row
+                                carried over unchanged, -1 for the rows which were changed or appended, so anything
+                                derived from the previous version only needs the -1 rows again
+        """
+        self.df = df
+        self.lists = lists
+        self.bitsets = bitsets
+        self.summary = summary
+        self.version = version
+        self.row_hashes = row_hashes
+        self.previous_version = previous_version
+        self.previous_positions = previous_positions
+
+        # the indexes the framework scores through, the list columns' bitsets and the candidates' coordinates
+        self.column_indexes = dict(bitsets)
+        if {'Latitude', 'Longitude'}.issubset(df.columns):
+            self.column_indexes['Coordinates'] = GridIndex(df[['Latitude', 'Longitude']].to_numpy())
+
+    @staticmethod
+    def summarise(df: pd.DataFrame, lists: dict) -> dict:
+        """
+        Finds the distinct values and bounds of the columns the app's dropdowns and sliders are built from.
+
+        Args:
+            df: the compact candidate data
+            lists: the ListColumn of each list column
+
+        Returns:
+            a dictionary of json serialisable values
+        """
+        def distinct(col):
+            return sorted(x.item() if isinstance(x, np.generic) else x for x in df[col].dropna().unique())
+
+        return {'sectors': distinct('Sector'),
+                'locations': distinct('Location'),
+                'wfh_days': distinct('WFH Days'),
+                'experience_years': distinct('Years Experience'),
+                'last_move_years': distinct('Last Moved Years'),
+                'salary_min': float(df['Min Salary'].min()),
+                'salary_max': float(df['Max Salary'].max()),
+                'unique_skills': list(lists['Skills'].vocabulary.values),
+                'unique_areas': list(lists['Minor Expertise'].vocabulary.values)}
+
+    @classmethod
+    def from_csv(cls, file_path: str):
+        """
+        Builds the store by reading and parsing the candidate csv.
+
+        Args:
+            file_path: the path of the candidate csv
+
+        Returns:
+            a CandidateStore
+        """
+        version = get_dataset_version(file_path)
+
+        return cls.from_frame(pd.read_csv(file_path), version=version)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, version: str):
+        """
+        Builds the store from candidate data as read from the csv, with the list columns still as strings.
+
+        Args:
+            df: the candidate data
+            version: the version of the data
+
+        Returns:
+            a CandidateStore
+        """
+        row_hashes = hash_rows(df)
+
+        lists = {}
+        bitsets = {}
+        for col in list_columns:
+            _, values, row_ids, value_ids = parse_list_column(df[col])
+            vocabulary = Vocabulary(values)
+            lists[col] = ListColumn.from_ids(row_ids=row_ids, value_ids=value_ids, values=values, n_rows=len(df), vocabulary=vocabulary)
+            bitsets[col] = BitsetColumn.from_ids(row_ids=row_ids, value_ids=value_ids, values=values, n_rows=len(df), vocabulary=vocabulary)
+
+        df = compact_candidate_data(df.drop(columns=list_columns))
+
+        return cls(df=df, lists=lists, bitsets=bitsets, summary=cls.summarise(df, lists), version=version, row_hashes=row_hashes)
+
+    def find_changes(self, df: pd.DataFrame, key_column: str = None) -> tuple:
+        """
+        Compares candidate data read from a later csv with the data in the store. Rows are matched by key_column, or
+        by position when no key column is given, which finds appended rows and rows edited in place, a row removed
+        from the middle of the csv then shows as every later row changing.
+
+        Args:
+            df: the candidate data as read from the later csv
+            key_column: the column which identifies a candidate, e.g. an id or email column, its values must be unique
+
+        Returns:
+            a tuple of three arrays: the rows of df which are new or changed, the position in the store each of them
+            replaces or -1 for a new candidate, and the positions in the store of the candidates removed
+
+        Raises:
+            ValueError: if the store has no row hashes, or the key column is missing or holds duplicate values
+        """
+        if self.row_hashes is None:
+            raise ValueError('The store has no row hashes to compare against')
+
+        new_hashes = hash_rows(df)
+
+        if key_column is None:
+            n_common = min(len(self.row_hashes), len(new_hashes))
+            changed_rows = np.flatnonzero(self.row_hashes[:n_common] != new_hashes[:n_common])
+            rows = np.concatenate([changed_rows, np.arange(n_common, len(new_hashes))])
+            positions = np.concatenate([changed_rows, np.full(len(new_hashes) - n_common, -1)])
+            removed = np.arange(n_common, len(self.row_hashes))
+        else:
+            if key_column not in df.columns or key_column not in self.df.columns:
+                raise ValueError('Key column {} is missing'.format(key_column))
+            old_keys = pd.Index(np.asarray(self.df[key_column], dtype=object))
+            new_keys = pd.Index(np.asarray(df[key_column], dtype=object))
+            if not old_keys.is_unique or not new_keys.is_unique:
+                raise ValueError('Key column {} holds duplicate values'.format(key_column))
+
+            matched = old_keys.get_indexer(new_keys)
+            rows = np.flatnonzero((matched == -1) | (self.row_hashes[matched] != new_hashes))
+            positions = matched[rows]
+            removed = np.flatnonzero(new_keys.get_indexer(old_keys) == -1)
+
+        return rows.astype(np.int64), positions.astype(np.int64), removed.astype(np.int64)
+
+    def apply_delta(self, df: pd.DataFrame, positions: np.ndarray, removed: np.ndarray, version: str):
+        """
+        Builds a new store from this one with a delta applied: changed candidates are replaced in place, new
+        candidates are appended and removed candidates dropped. Only the rows of the delta are parsed, the columns,
+        lists and bitsets of the other candidates are carried over, and this store is left as it is, so searches
+        running against it are unaffected.
+
+        Args:
+            df: the new and changed candidates as read from the csv
+            positions: the position in this store each row of df replaces, or -1 to append it
+            removed: the positions in this store of the candidates to remove
+            version: the version of the data once the delta is applied
+
+        Returns:
+            a CandidateStore
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(df) == 0:
+            return self.take(np.delete(np.arange(len(self.df)), removed), version=version)
+
+        delta = CandidateStore.from_frame(df.reset_index(drop=True), version=version)
+
+        # the rows of the stacked store and delta which make up the new store, the store's rows in their order with
+        # changed rows swapped for their replacement and removed rows dropped, then the appended rows
+        order = np.arange(len(self.df), dtype=np.int64)
+        order[positions[positions >= 0]] = len(self.df) + np.flatnonzero(positions >= 0)
+        order = np.concatenate([np.delete(order, removed), len(self.df) + np.flatnonzero(positions < 0)])
+
+        columns = {}
+        for col in self.df.columns:
+            if col in delta.df.columns:
+                columns[col] = concat_compact_columns(self.df[col], delta.df[col])[order]
+            else:
+                columns[col] = concat_compact_columns(self.df[col], pd.Series(np.full(len(delta.df), np.nan)))[order]
+        df = pd.DataFrame(columns, index=pd.RangeIndex(len(order)))
+
+        lists = {}
+        bitsets = {}
+        for col in list_columns:
+            # a new vocabulary, as this store's may be in use. Its ids are kept, so only the delta is re-interned
+            vocabulary = Vocabulary(self.lists[col].vocabulary.values)
+            lists[col] = ListColumn.concat([self.lists[col], delta.lists[col]], vocabulary=vocabulary).take(order)
+            bitsets[col] = BitsetColumn.concat([self.bitsets[col], delta.bitsets[col]], vocabulary=vocabulary).take(order)
+
+        row_hashes = np.concatenate([self.row_hashes, delta.row_hashes])[order]
+
+        return CandidateStore(df=df, lists=lists, bitsets=bitsets, summary=self.summarise(df, lists), version=version, row_hashes=row_hashes,
+                              previous_version=self.version, previous_positions=np.where(order < len(self.df), order, -1))
+
+    def take(self, positions: np.ndarray, version: str):
+        """
+        Builds a new store from a subset of this store's candidates.
+
+        Args:
+            positions: the positions of the candidates to keep, in their new order
+            version: the version of the data once subset
+
+        Returns:
+            a CandidateStore
+        """
+        df = pd.DataFrame({x: self.df[x].array[positions] if isinstance(self.df[x].dtype, pd.CategoricalDtype) else self.df[x].to_numpy()[positions]
+                           for x in self.df.columns}, index=pd.RangeIndex(len(positions)))
+        lists = {x: y.take(positions) for x, y in self.lists.items()}
+        bitsets = {x: y.take(positions) for x, y in self.bitsets.items()}
+        row_hashes = None if self.row_hashes is None else self.row_hashes[positions]
+
+        return CandidateStore(df=df, lists=lists, bitsets=bitsets, summary=self.summarise(df, lists), version=version, row_hashes=row_hashes,
+                              previous_version=self.version, previous_positions=np.asarray(positions, dtype=np.int64))
+
+    def update(self, df: pd.DataFrame, version: str, key_column: str = None, max_delta_ratio: float = 0.5) -> tuple:
+        """
+        Brings the store up to date with candidate data read from a later csv, applying the changed rows as a delta,
+        or rebuilding the store when most rows changed, the columns of the csv changed or the rows cannot be
+        matched.
+
+        Args:
+            df: the candidate data as read from the later csv
+            version: the version of the later csv
+            key_column: the column which identifies a candidate, see find_changes
+            max_delta_ratio: the store is rebuilt rather than updated when more than this share of rows changed
+
+        Returns:
+            a tuple of the updated CandidateStore and a dictionary with the number of candidates appended, changed
+            and removed, and whether the store was rebuilt
+        """
+        same_columns = set(df.columns) == set(self.df.columns) | set(list_columns)
+
+        try:
+            rows, positions, removed = self.find_changes(df, key_column=key_column) if same_columns else (None, None, None)
+        except ValueError:
+            rows = None
+
+        if rows is None or len(rows) + len(removed) > max_delta_ratio * max(len(df), 1):
+            return CandidateStore.from_frame(df, version=version), {'appended': 0, 'changed': 0, 'removed': 0, 'rebuilt': 1}
+
+        counts = {'appended': int((positions < 0).sum()), 'changed': int((positions >= 0).sum()), 'removed': len(removed), 'rebuilt': 0}
+
+        if len(rows) == 0 and len(removed) == 0:
+            # e.g. the csv was rewritten unchanged, the data is shared with this store under the new version
+            return CandidateStore(df=self.df, lists=self.lists, bitsets=self.bitsets, summary=self.summary, version=version, row_hashes=self.row_hashes,
+                                  previous_version=self.version, previous_positions=np.arange(len(self.df), dtype=np.int64)), counts
+
+        return self.apply_delta(df.iloc[rows], positions=positions, removed=removed, version=version), counts
+
+    def save_snapshot(self, snapshot_path: str):
+        """
+        Writes the store as a snapshot: a directory with a .npy file per array and a meta.json. Text columns are
+        written as categorical codes, so every column can be memory-mapped. The directory is written under a new
+        name and snapshot_path, a symlink, is then swapped to it, so a process loading the snapshot never sees a
+        partly written one. Snapshots written before the one replaced are removed.
+
+        Args:
+            snapshot_path: the path of the snapshot
+
+        Raises:
+            OSError: if the snapshot cannot be written, e.g. in a read only directory
+        """
+        arrays = {}
+        columns = []
+
+        for i, col in enumerate(self.df.columns):
+            values = self.df[col]
+            if pd.api.types.is_numeric_dtype(values.dtype) and not isinstance(values.dtype, pd.CategoricalDtype):
+                columns.append({'name': col, 'kind': 'numeric', 'values': 'column_{}_values.npy'.format(i)})
+                arrays[columns[-1]['values']] = values.to_numpy()
+            else:
+                values = pd.Categorical(values)
+                columns.append({'name': col, 'kind': 'categorical', 'codes': 'column_{}_codes.npy'.format(i),
+                                'categories': 'column_{}_categories.npy'.format(i)})
+                arrays[columns[-1]['codes']] = np.asarray(values.codes)
+                categories = values.categories
+                arrays[columns[-1]['categories']] = categories.to_numpy() if pd.api.types.is_numeric_dtype(categories.dtype) else np.array(list(categories), dtype=str)
+
+        list_files = {}
+        for i, col in enumerate(list_columns):
+            list_files[col] = {x: 'list_{}_{}.npy'.format(i, x) for x in ['offsets', 'ids', 'vocabulary', 'masks']}
+            arrays[list_files[col]['offsets']] = self.lists[col].offsets
+            arrays[list_files[col]['ids']] = self.lists[col].ids
+            arrays[list_files[col]['vocabulary']] = np.array(self.lists[col].vocabulary.values, dtype=str)
+            arrays[list_files[col]['masks']] = self.bitsets[col].masks
+
+        if self.row_hashes is not None:
+            arrays['row_hashes.npy'] = self.row_hashes
+        if self.previous_positions is not None:
+            arrays['previous_positions.npy'] = self.previous_positions
+
+        meta = {'format_version': snapshot_format_version, 'version': self.version, 'n_rows': len(self.df),
+                'columns': columns, 'lists': list_files, 'row_hashes': 'row_hashes.npy' if self.row_hashes is not None else None,
+                'summary': self.summary, 'previous_version': self.previous_version,
+                'previous_positions': 'previous_positions.npy' if self.previous_positions is not None else None}
+
+        snapshot_path = os.path.abspath(snapshot_path)
+
+        # processes writing the same snapshot take turns, so one never removes a directory another is writing
+        with file_lock(snapshot_path + '.lock'):
+            snapshot_directory = '{}.{}-{}'.format(snapshot_path, time.time_ns(), os.getpid())
+            os.makedirs(snapshot_directory)
+            for file_name, values in arrays.items():
+                np.save(os.path.join(snapshot_directory, file_name), np.ascontiguousarray(values), allow_pickle=False)
+            with open(os.path.join(snapshot_directory, 'meta.json'), 'w') as meta_file:
+                json.dump(meta, meta_file)
+
+            replaced_directory = os.path.realpath(snapshot_path) if os.path.islink(snapshot_path) else None
+            temporary_link = snapshot_directory + '.link'
+            os.symlink(os.path.basename(snapshot_directory), temporary_link)
+            os.replace(temporary_link, snapshot_path)
+
+            # the replaced snapshot is kept for processes still loading it, anything written before it is removed.
+            # Processes which have mapped a removed snapshot keep reading it, the files are only freed once they are
+            # unmapped
+            removed_before = snapshot_time(replaced_directory if replaced_directory is not None else snapshot_directory)
+            for old_directory in glob.glob(glob.escape(snapshot_path) + '.*'):
+                written_at = snapshot_time(old_directory)
+                if written_at is not None and written_at < removed_before and os.path.isdir(old_directory):
+                    shutil.rmtree(old_directory, ignore_errors=True)
+
+    @staticmethod
+    def read_snapshot_meta(snapshot_path: str) -> dict:
+        """
+        Args:
+            snapshot_path: the path of the snapshot
+
+        Returns:
+            the snapshot's metadata, including the version of the csv it was built from
+        """
+        with open(os.path.join(snapshot_path, 'meta.json')) as meta_file:
+            return json.load(meta_file)
+
+    @classmethod
+    def from_snapshot(cls, snapshot_path: str, memory_map: bool = True):
+        """
+        Loads a store from a snapshot written by save_snapshot. With memory_map set, the columns, list ids and
+        bitmasks are read-only views of the snapshot files rather than copies, so every process loading the same
+        snapshot, and every worker forked after loading it, shares one copy of the data in the OS page cache.
+
+        Args:
+            snapshot_path: the path of the snapshot
+            memory_map: whether to memory-map the arrays rather than read them into memory
+
+        Returns:
+            a CandidateStore
+
+        Raises:
+            ValueError: if the snapshot was written in a different format version
+        """
+        # the symlink is resolved once, so every file is read from the same snapshot even if it is replaced meanwhile
+        snapshot_path = os.path.realpath(snapshot_path)
+        meta = cls.read_snapshot_meta(snapshot_path)
+        if meta['format_version'] != snapshot_format_version:
+            raise ValueError('Snapshot {} has format version {}, expected {}'.format(snapshot_path, meta['format_version'], snapshot_format_version))
+
+        def load_array(file_name, mapped=memory_map):
+            return np.load(os.path.join(snapshot_path, file_name), mmap_mode='r' if mapped else None, allow_pickle=False)
+
+        columns = {}
+        for column in meta['columns']:
+            if column['kind'] == 'categorical':
+                columns[column['name']] = pd.Categorical.from_codes(load_array(column['codes']), categories=load_array(column['categories'], mapped=False).tolist())
+            else:
+                columns[column['name']] = load_array(column['values'])
+
+        # copy=False keeps the columns as views of the mapped files
+        df = pd.DataFrame(columns, index=pd.RangeIndex(meta['n_rows']), copy=False)
+
+        lists = {}
+        bitsets = {}
+        for col, files in meta['lists'].items():
+            vocabulary = Vocabulary(load_array(files['vocabulary'], mapped=False).tolist())
+            lists[col] = ListColumn(offsets=load_array(files['offsets']), ids=load_array(files['ids']), vocabulary=vocabulary)
+            bitsets[col] = BitsetColumn(masks=load_array(files['masks']), vocabulary=vocabulary)
+
+        row_hashes = load_array(meta['row_hashes']) if meta['row_hashes'] is not None else None
+        # snapshots written before stores kept their lineage have neither
+        previous_positions = load_array(meta['previous_positions']) if meta.get('previous_positions') is not None else None
+
+        return cls(df=df, lists=lists, bitsets=bitsets, summary=meta['summary'], version=meta['version'], row_hashes=row_hashes,
+                   previous_version=meta.get('previous_version'), previous_positions=previous_positions)
+
+    @classmethod
+    def load(cls, file_path: str, snapshot_path: str = None, write_snapshot: bool = True, memory_map: bool = True):
+        """
+        Loads the store from its snapshot when the snapshot was built from the current csv, otherwise parses the csv
+        and, if write_snapshot is set, refreshes the snapshot and loads it, so that the data is memory-mapped here too.
+
+        Args:
+            file_path: the path of the candidate csv
+            snapshot_path: the path of the snapshot, defaults to default_snapshot_path(file_path)
+            write_snapshot: whether to write a snapshot after parsing the csv
+            memory_map: whether to memory-map the snapshot, see from_snapshot
+
+        Returns:
+            a CandidateStore
+        """
+        snapshot_path = default_snapshot_path(file_path) if snapshot_path is None else snapshot_path
+
+        if os.path.exists(snapshot_path):
+            try:
+                meta = cls.read_snapshot_meta(snapshot_path)
+                source_missing = not os.path.exists(file_path)
+                if meta['format_version'] == snapshot_format_version and (source_missing or meta['version'] == get_dataset_version(file_path)):
+                    return cls.from_snapshot(snapshot_path, memory_map=memory_map)
+            except (OSError, ValueError, KeyError):
+                # an unreadable snapshot is rebuilt from the csv
+                pass
+
+        store = cls.from_csv(file_path)
+
+        if write_snapshot:
+            try:
+                store.save_snapshot(snapshot_path)
+                return cls.from_snapshot(snapshot_path, memory_map=memory_map)
+            except OSError:
+                # e.g. a read only deployment, the next process parses the csv again
+                pass
+
+        return store
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parses a candidate csv and writes the binary snapshot the app loads at startup.')
+    parser.add_argument('file_path', nargs='?', default='Dummy_Candidate_Data.csv', help='the candidate csv')
+    parser.add_argument('--snapshot', default=None, help='the snapshot to write, defaults to <csv name>.snapshot next to the csv')
+    args = parser.parse_args()
+
+    snapshot_file = default_snapshot_path(args.file_path) if args.snapshot is None else args.snapshot
+
+    start = time.perf_counter()
+    candidate_store = CandidateStore.from_csv(args.file_path)
+    parse_seconds = time.perf_counter() - start
+    candidate_store.save_snapshot(snapshot_file)
+
+    start = time.perf_counter()
+    CandidateStore.from_snapshot(snapshot_file)
+    load_seconds = time.perf_counter() - start
+
+    print('Wrote {} with {} candidates: parsing the csv took {:.3f}s, loading the snapshot takes {:.3f}s'.format(
+        snapshot_file, len(candidate_store.df), parse_seconds, load_seconds))
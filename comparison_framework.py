@@ -3,8 +3,10 @@ warnings.simplefilter(action='ignore', category=FutureWarning)
 
 import pandas as pd
 import numpy as np
-# import geopandas as gpd
-#from shapely.geometry import Point
+
+from locations import LocationRegistry
+from scoring_rules import compile_rules, default_rules
+from vocabulary import BitsetColumn
 
 pd.options.display.max_columns = 500
 pd.set_option('display.width', 1000)
@@ -25,52 +27,27 @@ class SuitabilityScoreFramework:
                         'Nottingham': [52.947166321488545, -1.1474515251029],
                         'Dublin': [53.347278280585556, -6.254476908039269]
                         }
-    # @staticmethod
-    # def calculate_distances(start_location: list, end_location: list):
-    #     """
-    #     Calculates the distance in kms between two lat lons
-    #     Args:
-    #         start_location: the lat / lons of the start location
-    #         end_location: the lat / lons of the end location
-    #
-    #     Returns:
-    #         the distance in km between the two
-    #     """
-    #
-    #     geom = [Point(xy) for xy in zip([start_location[0], end_location[0]],
-    #                                     [start_location[1], end_location[1]]
-    #                                     )]
-    #     gdf = gpd.GeoDataFrame(geometry=geom, crs={'init': 'epsg:4326'})
-    #     gdf.to_crs(epsg=3310, inplace=True)
-    #     data_distance = gdf.distance(gdf.shift())[1]
-    #     data_distance_km = data_distance / 1000
-    #
-    #     return data_distance_km
-    #
-    #
-    # def map_all_distances(self, locations: list):
-    #     """
-    #     This map returns a dictionary with all the possible combinations of distances mapped out.
-    #     It calculates the distance between the starting position and the other
-    #     Args:
-    #         locations: the locations from the data which need to be mapped
-    #
-    #     Returns:
-    #         a dictionary with each desination mapped from the starting point
-    #     """
-    #
-    #     all_mapped_distances = {}
-    #
-    #     for start_city in locations:
-    #         if start_city not in all_mapped_distances.keys():
-    #             all_mapped_distances[start_city] = {}
-    #
-    #         for end_city in locations:
-    #             distance_km = self.calculate_distances(start_location=self.distance_mapping[start_city], end_location=self.distance_mapping[end_city])
-    #             if end_city not in all_mapped_distances[start_city].keys():
-    #                 all_mapped_distances[start_city][end_city] = distance_km
-    #
-    #     return all_mapped_distances
+
+    def __init__(self, locations_file: str = None, rules: dict = None):
+        """
+        Args:
+            locations_file: an optional csv file with Location, Latitude and Longitude columns, adding locations
+                            to those in distance_mapping
+            rules: optional rule specifications keyed by dimension, see scoring_rules, which score those dimensions
+                   in place of their default_rules in score_frame and score_batch
+
+        Raises:
+            ValueError: if a rule is malformed or is not keyed by a dimension
+        """
+        self.location_registry = LocationRegistry(self.distance_mapping)
+
+        if locations_file is not None:
+            self.location_registry.add_locations_from_file(locations_file)
+
+        unknown_dimensions = [x for x in (rules or {}) if x not in self.kwargs_to_score_column_mapping]
+        if unknown_dimensions:
+            raise ValueError('Rules given for unknown dimensions: {}'.format(', '.join(unknown_dimensions)))
+        self.rules = compile_rules(dict(default_rules(self), **(rules or {})))
 
     framework_weighting = {'Location': 5,
                            'Salary': 5,
@@ -83,6 +60,44 @@ class SuitabilityScoreFramework:
                            'Last Move': 3,
                            'Move Status': 5,
                            }
+    kwargs_to_framework_mapping = {'salary_score': 'Salary',
+                                   'skills_score': 'Skills',
+                                   'experience_score': 'Experience',
+                                   'wfh_score': 'WFH',
+                                   'location_score': 'Location',
+                                   'sector_score': 'Sector',
+                                   'area_score': 'Area',
+                                   'expertise_score': 'Expertise',
+                                   'move_score': 'Last Move',
+                                   'status_score': 'Move Status'}
+
+    # the column each score is written to in the scored candidate frame
+    kwargs_to_score_column_mapping = {'salary_score': 'Salary Score',
+                                      'location_score': 'Location Score',
+                                      'sector_score': 'Sector Score',
+                                      'wfh_score': 'WFH Score',
+                                      'skills_score': 'Skills Score',
+                                      'experience_score': 'Years Experience Score',
+                                      'area_score': 'Minor Expertise Score',
+                                      'expertise_score': 'Major Expertise Score',
+                                      'move_score': 'Move Score',
+                                      'status_score': 'Status Score'}
+
+    # the search criteria each score depends on, the score only changes when these inputs change
+    kwargs_to_criteria_mapping = {'salary_score': ['input_salary'],
+                                  'location_score': ['input_location'],
+                                  'sector_score': ['input_sector'],
+                                  'wfh_score': ['input_wfh'],
+                                  'skills_score': ['input_skills'],
+                                  'experience_score': ['input_experience'],
+                                  'area_score': ['input_areas'],
+                                  'expertise_score': ['input_expertise'],
+                                  'move_score': ['input_moved'],
+                                  'status_score': ['input_move_status']}
+
+    # every input of the search criteria
+    criteria_inputs = [x for y in kwargs_to_criteria_mapping.values() for x in y]
+
     sector_mapping = {
         'General Insurance - Pricing' : ['General Insurance - Pricing', 'General Insurance - Capital Modelling', 'General Insurance - Reserving'],
         'General Insurance - Capital Modelling' : ['General Insurance - Pricing', 'General Insurance - Capital Modelling', 'General Insurance - Reserving'],
@@ -101,6 +116,12 @@ class SuitabilityScoreFramework:
         'Reinsurance Broker': ['Broker', "Lloyd's Syndicate", 'London Market', 'Consultancy', 'Commercial Lines'],
         'Regulator': ['Consultancy', 'Commercial Lines', 'Personal Lines']}
 
+    # the move statuses close to each searched move status
+    move_status_mapping = {
+        'Urgently Looking': ['Actively Looking'],
+        'Actively Looking': ['Urgently Looking', 'Open Minded'],
+        'Open Minded': ['Actively Looking']}
+
     def apply_framework_to_salary(self, input_salary: list, data_min_salary: int, data_max_salary: int) -> int:
         """
         This function applies the framework to the salary. Each job will be formatted with a salary range and
@@ -328,7 +349,7 @@ class SuitabilityScoreFramework:
 
         if data_wfh == 0 and input_wfh_min > 0:
             return 1
-        elif data_wfh in input_wfh:
+        elif min(input_wfh) <= data_wfh <= max(input_wfh):
             return 3
         elif data_wfh > max(input_wfh):
             if np.abs(max(input_wfh) - data_wfh) == 1:
@@ -341,7 +362,7 @@ class SuitabilityScoreFramework:
             elif np.abs(min(input_wfh) - data_wfh) > 1:
                 return 1
 
-    def apply_framework_location(self, input_location: str, data_location: str, all_mapped_distances: dict):
+    def apply_framework_location(self, input_location: str, data_location: str, all_mapped_distances: dict = None):
         """
         This function applies the framework to the job locations. The closer the job location to the users
         preferred location the higher the score given.
@@ -353,13 +374,17 @@ class SuitabilityScoreFramework:
         Args:
             input_location: the desired location of the candidates job
             data_location: the location of the job
-            all_mapped_distances: a dictionary containing the mapped start and end locations
+            all_mapped_distances: an optional dictionary containing the mapped start and end locations, otherwise
+                                  the distance is read from the location registry
 
         Returns:
             A score of 1, 2 or 3
         """
 
-        data_distance_km = all_mapped_distances[input_location][data_location]
+        if all_mapped_distances is None:
+            data_distance_km = self.location_registry.distance(input_location, data_location)
+        else:
+            data_distance_km = all_mapped_distances[input_location][data_location]
 
         if data_distance_km <= 50:
             return 3
@@ -428,20 +453,18 @@ class SuitabilityScoreFramework:
                     2 if data_move_status is within the closest move statuses but not within actual search
                     3 if data_move_status is within the search criteria
         Args:
-            input_move_status: a list of move statuses which the recruiter wishes to search
+            input_move_status: a list of move statuses which the recruiter wishes to search, or a single move status
+                               as given by the app's dropdown before a second is picked
             data_move_status: the move status of the candidate
 
         Returns:
             returns a score of 1, 2 or 3
         """
+        input_move_statuses = [input_move_status] if isinstance(input_move_status, str) else input_move_status
 
         if data_move_status in input_move_status:
             return 3
-        elif 'Urgently Looking' in input_move_status and data_move_status in ['Actively Looking']:
-            return 2
-        elif 'Actively Looking' in input_move_status and data_move_status in ['Urgently Looking', 'Open Minded']:
-            return 2
-        elif 'Open Minded' in input_move_status and data_move_status in ['Actively Looking']:
+        elif any(data_move_status in self.move_status_mapping.get(x, []) for x in input_move_statuses):
             return 2
         else:
             return 1
@@ -462,18 +485,7 @@ class SuitabilityScoreFramework:
             A score between 0-100 representing the suitability score of the job to the candidate or the
             candidate to the job search
         """
-        kwargs_to_framework_mapping = {'salary_score': 'Salary',
-                                       'skills_score': 'Skills',
-                                       'experience_score': 'Experience',
-                                       'wfh_score': 'WFH',
-                                       'location_score': 'Location',
-                                       'sector_score': 'Sector',
-                                       'area_score': 'Area',
-                                       'expertise_score': 'Expertise',
-                                       'move_score': 'Last Move',
-                                       'status_score': 'Move Status'}
-
-        all_frameworks = list(kwargs_to_framework_mapping[x] for x in kwargs.keys())
+        all_frameworks = list(self.kwargs_to_framework_mapping[x] for x in kwargs.keys())
         framework_scores = list(kwargs.values())
 
         score_check = any([True if x else False for x in framework_scores])
@@ -490,8 +502,522 @@ class SuitabilityScoreFramework:
 
             return suitability_score
 
+    def apply_framework_to_salary_batch(self, input_salary: list, data_min_salary: np.ndarray, data_max_salary: np.ndarray) -> np.ndarray:
+        """
+        Batch form of apply_framework_to_salary, scoring every candidate's salary range at once.
+
+        Args:
+            input_salary: a salary range which is input from the search criteria
+            data_min_salary: an array with the minimum salary of each candidate
+            data_max_salary: an array with the maximum salary of each candidate
+
+        Returns:
+            An array of scores of either 1, 2 or 3
+        """
+        input_min_salary = input_salary[0]
+        input_max_salary = input_salary[1]
+        high_multiplier = 1.5
+        low_multiplier = 1.2
+
+        data_min_salary = np.asarray(data_min_salary, dtype=np.float64)
+        data_max_salary = np.asarray(data_max_salary, dtype=np.float64)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            min_ratio = data_min_salary / input_min_salary
+            max_ratio = data_min_salary / input_max_salary
+
+        conditions = [(data_max_salary < input_min_salary) | (min_ratio < 1),
+                      min_ratio <= low_multiplier,
+                      max_ratio <= low_multiplier,
+                      (low_multiplier < min_ratio) & (min_ratio <= high_multiplier)]
+
+        return np.select(conditions, [1, 3, 2, 2], default=1)
+
+    def apply_framework_to_experience_job_batch(self, input_years: np.ndarray, min_data_years: np.ndarray) -> np.ndarray:
+        """
+        Batch form of apply_framework_to_experience_job, scoring the experience of users against the minimum years
+        required by jobs at once, e.g. a column of candidates against a row of jobs.
+
+        Args:
+            input_years: an array with the number of years experience of each user
+            min_data_years: an array with the minimum number of years experience required by each job, broadcastable
+                            with input_years
+
+        Returns:
+            An array of scores of either 1, 2 or 3
+        """
+        input_years, min_data_years = np.broadcast_arrays(np.asarray(input_years), np.asarray(min_data_years))
+
+        highest_pct = 1.5
+        high_pct = 1.25
+        low_pct = 0.75
+        lowest_pct = 0.5
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            experience_pct = input_years / min_data_years
+        years_apart = np.abs(input_years - min_data_years)
+
+        # users with up to 3 years are scored on the years themselves, anyone the rules below miss by their percentage
+        is_junior = input_years <= 3
+        is_three = is_junior & (input_years == 3)
+        is_under_three = is_junior & (input_years < 3)
+
+        conditions = [is_junior & (input_years == min_data_years),
+                      is_junior & (min_data_years > 6),
+                      is_three & np.isin(min_data_years, [2, 4, 5]),
+                      is_three & np.isin(min_data_years, [0, 1]),
+                      is_under_three & (years_apart == 1),
+                      is_under_three & (years_apart > 1),
+                      (experience_pct < lowest_pct) | (experience_pct > highest_pct),
+                      (experience_pct < low_pct) | (experience_pct > high_pct)]
+
+        return np.select(conditions, [3, 1, 2, 1, 2, 1, 1, 2], default=3)
+
+    def apply_framework_to_wfh_batch(self, input_wfh: list, data_wfh: np.ndarray) -> np.ndarray:
+        """
+        Batch form of apply_framework_to_wfh, scoring every candidate's WFH days at once.
+
+        Args:
+            input_wfh: at least this number of days working from home
+            data_wfh: an array with the number of days offered by each candidate
+
+        Returns:
+            An array of scores of either 1, 2 or 3
+        """
+        input_wfh_min = input_wfh[0]
+        min_wfh = min(input_wfh)
+        max_wfh = max(input_wfh)
+
+        data_wfh = np.asarray(data_wfh)
+
+        conditions = [(data_wfh == 0) & (input_wfh_min > 0),
+                      (data_wfh >= min_wfh) & (data_wfh <= max_wfh),
+                      (data_wfh > max_wfh) & (np.abs(max_wfh - data_wfh) == 1),
+                      (data_wfh < min_wfh) & (np.abs(min_wfh - data_wfh) == 1)]
+
+        return np.select(conditions, [1, 3, 2, 2], default=1)
+
+    def build_location_lookup_table(self, input_location: str, categories: list) -> np.ndarray:
+        """
+        Builds a code to score table for the location categories from the location registry's distance matrix.
+
+        Args:
+            input_location: the desired location of the candidates job
+            categories: the location categories, in code order
+
+        Returns:
+            An array where position i is the score of category i
+        """
+        input_code = self.location_registry.codes[input_location]
+        category_codes = self.location_registry.get_codes(categories)
+        data_distance_km = self.location_registry.distance_matrix[input_code, category_codes]
+
+        return np.select([data_distance_km <= 50, data_distance_km <= 100], [3, 2], default=1)
+
+    @staticmethod
+    def score_skill_matches(n_skills: np.ndarray, n_matched: np.ndarray) -> np.ndarray:
+        """
+        Scores the share of each candidate's skills which were searched for, as in apply_framework_to_skills.
+
+        Args:
+            n_skills: an array with the number of distinct skills of each candidate
+            n_matched: an array with the number of those skills searched for, broadcastable with n_skills
+
+        Returns:
+            An array of scores of either 1, 2 or 3
+        """
+        high_multipler = 0.75
+        low_multiplier = 0.25
+
+        n_skills, n_matched = np.broadcast_arrays(n_skills, n_matched)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentage_matched = n_matched / n_skills
+
+        conditions = [n_skills == 0,
+                      percentage_matched < low_multiplier,
+                      percentage_matched < high_multipler]
+
+        return np.select(conditions, [1, 1, 2], default=3)
+
+    @staticmethod
+    def score_area_matches(n_matched: np.ndarray, n_input) -> np.ndarray:
+        """
+        Scores the share of the searched areas each candidate has experience in, as in apply_framework_to_areas.
+
+        Args:
+            n_matched: an array with the number of searched areas each candidate has experience in
+            n_input: the number of areas searched for, or an array of them broadcastable with n_matched
+
+        Returns:
+            An array of scores of either 1, 2 or 3
+        """
+        matched_pct = n_matched / n_input
+        min_percentage = 0.5
+        max_percentage = 0.75
+
+        conditions = [matched_pct >= max_percentage,
+                      matched_pct >= min_percentage]
+
+        return np.select(conditions, [3, 2], default=1)
+
+    @staticmethod
+    def category_codes(values: pd.Series) -> tuple:
+        """
+        Codes a column by its distinct values, so a dimension can be scored once per distinct value and gathered
+        by code. Numeric columns are coded by their sorted distinct values, other columns by their category codes.
+
+        Args:
+            values: the column to code
+
+        Returns:
+            a tuple of the distinct values, in code order, and an array with the code of each row
+        """
+        if pd.api.types.is_numeric_dtype(values.dtype) and not isinstance(values.dtype, pd.CategoricalDtype):
+            domain, codes = np.unique(values.to_numpy(), return_inverse=True)
+            return domain, codes.reshape(-1)
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+
+        return values.cat.categories, values.cat.codes.to_numpy()
+
+    def scale_weighted_score(self, weighted_score: np.ndarray, weightings: list) -> np.ndarray:
+        """
+        Scales weighted sums of framework scores onto the 0-100 suitability score, as done in apply_framework.
+
+        Args:
+            weighted_score: an array with the weighted sum of the framework scores of each candidate
+            weightings: the weighting of each framework included in the sum, or an array of shape
+                        (n queries, n frameworks) when weighted_score has a row of candidates per query
+
+        Returns:
+            An array of suitability scores between 0-100
+        """
+        weightings = np.asarray(weightings)
+        max_available_score = (weightings * 3).sum(axis=-1, keepdims=weightings.ndim > 1)
+        min_available_score = (weightings * 1).sum(axis=-1, keepdims=weightings.ndim > 1)
+        denominator = max_available_score - min_available_score
+
+        suitability_score = np.round(((weighted_score - min_available_score) / denominator) * 100, 0)
+
+        return suitability_score.astype(np.int64)
+
+    def apply_framework_batch(self, scores: dict) -> np.ndarray:
+        """
+        Batch form of apply_framework. Combines arrays of framework scores into the 0-100 suitability score,
+        giving the same result as calling apply_framework on every row.
+
+        Args:
+            scores: a dictionary of score arrays keyed as the keyword arguments of apply_framework,
+                    e.g. {'salary_score': np.array([1, 3]), 'skills_score': np.array([2, 2])}
+
+        Returns:
+            An array of suitability scores between 0-100
+        """
+        all_frameworks = list(self.kwargs_to_framework_mapping[x] for x in scores.keys())
+        weightings = [self.framework_weighting[x] for x in all_frameworks]
+
+        weighted_score = sum([np.asarray(x, dtype=np.int64) * y for x, y in zip(scores.values(), weightings)])
+
+        return self.scale_weighted_score(weighted_score=weighted_score, weightings=weightings)
+
+    def apply_framework_matrix(self, score_matrix: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """
+        Matrix form of apply_framework. Combines a matrix of framework scores into the 0-100 suitability score
+        with one matrix-vector product, so candidates already scored can be re-ranked under new weights without
+        scoring any dimension again.
+
+        Args:
+            score_matrix: an array of shape (n candidates, n dimensions) with a score between 1 and 3 per dimension
+            weights: an array with the weighting of each dimension, in the column order of score_matrix
+
+        Returns:
+            An array of suitability scores between 0-100
+
+        Raises:
+            ValueError: if every weight is zero
+        """
+        weights = np.asarray(weights)
+
+        if not weights.any():
+            raise ValueError('At least one framework weighting must be above zero')
+
+        return self.scale_weighted_score(weighted_score=np.asarray(score_matrix) @ weights, weightings=weights.tolist())
+
+    def score_dimensions(self, df: pd.DataFrame, criteria: dict, dimensions: list = None, all_mapped_distances: dict = None, column_indexes: dict = None,
+                         on_dimension=None) -> dict:
+        """
+        Scores the chosen framework dimensions for every candidate in df at once, each with its compiled rule.
+
+        Args:
+            df: the candidate data, with Skills and Minor Expertise already converted into lists unless given in column_indexes
+            criteria: the search criteria, keyed by the input argument names of the apply_framework_* functions
+            dimensions: the dimensions to score, keyed as the keyword arguments of apply_framework, defaults to all of them
+            all_mapped_distances: an optional dictionary containing the mapped start and end locations, otherwise
+                                  distances are read from the location registry
+            column_indexes: optional per-candidate structures aligned with the rows of df, see score_frame
+            on_dimension: an optional function called before each dimension is scored, with the dimension and the
+                          share of the dimensions already scored, e.g. to report progress or stop a cancelled search
+
+        Returns:
+            a dictionary of score arrays, keyed by dimension in the order of kwargs_to_score_column_mapping
+        """
+        column_indexes = {} if column_indexes is None else column_indexes
+        dimensions = list(self.kwargs_to_score_column_mapping.keys()) if dimensions is None else dimensions
+
+        scores = {}
+        for x in self.kwargs_to_score_column_mapping:
+            if x in dimensions:
+                if on_dimension is not None:
+                    on_dimension(x, len(scores) / len(dimensions))
+                scores[x] = np.asarray(self.rules[x](criteria, df, column_indexes=column_indexes, location_registry=self.location_registry,
+                                                     all_mapped_distances=all_mapped_distances), dtype=np.int64)
+
+        return scores
+
+    def scores_to_frame(self, scores: dict, index: pd.Index) -> pd.DataFrame:
+        """
+        Builds the scored candidate frame from the score arrays of every dimension.
+
+        Args:
+            scores: a dictionary of score arrays for every dimension, keyed as the keyword arguments of apply_framework
+            index: the index of the scored candidates
 
+        Returns:
+            a DataFrame with a column for each framework score and the Suitability Score
+        """
+        # scores are between 1 and 3 and suitability between 0 and 100, so both are held as int8
+        scored_df = pd.DataFrame({self.kwargs_to_score_column_mapping[x]: np.asarray(y, dtype=np.int8) for x, y in scores.items()}, index=index)
+        scored_df['Suitability Score'] = self.apply_framework_batch(scores).astype(np.int8)
 
+        return scored_df
 
+    def score_frame(self, df: pd.DataFrame, criteria: dict, all_mapped_distances: dict = None, column_indexes: dict = None) -> pd.DataFrame:
+        """
+        Applies the full framework to every candidate in df at once. Each dimension is scored over whole
+        columns by its compiled rule, and with default_rules the scores match calling the apply_framework_*
+        functions row by row.
 
+        Args:
+            df: the candidate data, with Skills and Minor Expertise already converted into lists unless given in column_indexes
+            criteria: the search criteria, keyed by the input argument names of the apply_framework_* functions:
+                      input_salary, input_location, input_sector, input_wfh, input_skills, input_experience,
+                      input_areas, input_expertise, input_moved and input_move_status
+            all_mapped_distances: an optional dictionary containing the mapped start and end locations, otherwise
+                                  distances are read from the location registry
+            column_indexes: optional per-candidate structures aligned with the rows of df, keyed by column. BitsetColumns
+                            for Skills and / or Minor Expertise are used in place of the list columns of df, and a
+                            GridIndex under Coordinates scores the location of candidates with their own lat / lon
 
+        Returns:
+            a DataFrame, indexed as df, with a column for each framework score and the Suitability Score
+        """
+        scores = self.score_dimensions(df=df, criteria=criteria, all_mapped_distances=all_mapped_distances, column_indexes=column_indexes)
+
+        return self.scores_to_frame(scores=scores, index=df.index)
+
+    def score_frame_pruned(self, df: pd.DataFrame, criteria: dict, depth: int, all_mapped_distances: dict = None, column_indexes: dict = None) -> tuple:
+        """
+        Scores only the candidates which can reach the best depth suitability scores. Every dimension but Skills and
+        Area is scored first, giving each candidate a lowest and highest achievable suitability score. Candidates whose
+        highest score is below the depth-th best lowest score cannot make the ranking and are dropped before Skills and
+        Area are scored. Ranking the remaining candidates with select_top_k, to any offset + k up to depth, gives the
+        same candidates as ranking the scores from score_frame.
+
+        Args:
+            df: the candidate data, as for score_frame
+            criteria: the search criteria, as for score_frame
+            depth: the number of best candidates which must be kept, e.g. offset + k of the page being shown
+            all_mapped_distances: an optional dictionary containing the mapped start and end locations
+            column_indexes: optional per-candidate structures aligned with the rows of df, as for score_frame
+
+        Returns:
+            a tuple of the positions in df of the kept candidates, in ascending order, and a DataFrame of their scores
+        """
+        deferred_dimensions = ['skills_score', 'area_score']
+        all_dimensions = list(self.kwargs_to_score_column_mapping.keys())
+        column_indexes = {} if column_indexes is None else column_indexes
+
+        scores = self.score_dimensions(df=df, criteria=criteria, dimensions=[x for x in all_dimensions if x not in deferred_dimensions],
+                                       all_mapped_distances=all_mapped_distances, column_indexes=column_indexes)
+
+        weightings = [self.framework_weighting[self.kwargs_to_framework_mapping[x]] for x in all_dimensions]
+        deferred_weighting = sum([self.framework_weighting[self.kwargs_to_framework_mapping[x]] for x in deferred_dimensions])
+        partial_score = sum([y * self.framework_weighting[self.kwargs_to_framework_mapping[x]] for x, y in scores.items()])
+
+        lowest_score = self.scale_weighted_score(weighted_score=partial_score + deferred_weighting, weightings=weightings)
+        highest_score = self.scale_weighted_score(weighted_score=partial_score + 3 * deferred_weighting, weightings=weightings)
+
+        if 0 < depth < len(df):
+            # at least depth candidates will score this or more, so anyone who cannot reach it is never ranked
+            threshold = np.partition(lowest_score, len(df) - depth)[len(df) - depth]
+            positions = np.flatnonzero(highest_score >= threshold)
+        else:
+            positions = np.arange(len(df))
+
+        kept_df = df.iloc[positions]
+        kept_indexes = {x: y.take(positions) for x, y in column_indexes.items()}
+        deferred_scores = self.score_dimensions(df=kept_df, criteria=criteria, dimensions=deferred_dimensions,
+                                                all_mapped_distances=all_mapped_distances, column_indexes=kept_indexes)
+
+        all_scores = {x: scores[x][positions] if x in scores else deferred_scores[x] for x in all_dimensions}
+
+        return positions, self.scores_to_frame(scores=all_scores, index=kept_df.index)
+
+    @staticmethod
+    def select_top_k(scores: np.ndarray, k: int, offset: int = 0) -> tuple:
+        """
+        Selects the positions of the best scoring candidates without sorting the whole pool. Only the candidates
+        which can make the page are sorted, using a partial partition of the scores. Ties are broken by position,
+        so the result is the same as a stable descending sort sliced to [offset:offset + k].
+
+        Args:
+            scores: an array with the suitability score of each candidate
+            k: the number of candidates to return
+            offset: the number of better ranked candidates to skip, e.g. 25 for the second page of 25
+
+        Returns:
+            a tuple of the positions of the selected candidates, best first, and the total number of candidates
+        """
+        scores = np.asarray(scores)
+        n_candidates = len(scores)
+        end = min(offset + k, n_candidates)
+
+        if end <= 0 or offset >= n_candidates:
+            return np.array([], dtype=np.int64), n_candidates
+
+        if end == n_candidates:
+            candidates = np.arange(n_candidates)
+        else:
+            # the end-th best score, everything above it makes the page and ties on it are filled by position
+            threshold = np.partition(scores, n_candidates - end)[n_candidates - end]
+            above_threshold = np.flatnonzero(scores > threshold)
+            on_threshold = np.flatnonzero(scores == threshold)[:end - len(above_threshold)]
+            candidates = np.concatenate([above_threshold, on_threshold])
+
+        ranked = candidates[np.lexsort((candidates, -scores[candidates]))]
+
+        return ranked[offset:end], n_candidates
+
+    @staticmethod
+    def merge_top_k(best_keys: np.ndarray, keys: np.ndarray, k: int) -> np.ndarray:
+        """
+        Keeps the k largest keys of each row of two blocks of ranking keys, see score_batch.
+
+        Args:
+            best_keys: an array of shape (n queries, up to k) with the best keys so far
+            keys: an array of shape (n queries, n candidates) with the keys of the next block of candidates
+            k: the number of keys to keep per row
+
+        Returns:
+            an array of shape (n queries, up to k) with the best keys of both, in no particular order
+        """
+        keys = np.concatenate([best_keys, keys], axis=1)
+
+        if k <= 0:
+            return keys[:, :0]
+        if keys.shape[1] <= k:
+            return keys
+
+        return np.take_along_axis(keys, np.argpartition(-keys, k - 1, axis=1)[:, :k], axis=1)
+
+    def score_batch(self, df: pd.DataFrame, criteria_list: list, k: int, contract_types: list = None, weights: list = None,
+                    column_indexes: dict = None, memory_budget: int = 256 * 1024 ** 2) -> list:
+        """
+        Finds the best k candidates for each of many searches at once. The searches are scored together as a
+        searches x candidates matrix, built a block of candidates at a time so the matrix stays within
+        memory_budget. Each dimension is scored by its rule's batch kernel: categorical and small integer columns
+        are scored once per search over their distinct values and gathered by every candidate's code, bands over
+        several columns, e.g. Salary, by broadcasting the searches against the block, and Skills and Area are
+        matched with a popcount of each search's bitmask against the block's. The best k of each block are merged
+        into each search's running best k.
+
+        The candidates returned, and their order, are the same as scoring each search with score_frame and ranking
+        the candidates of its contract types with select_top_k.
+
+        Args:
+            df: the candidate data, as for score_frame
+            criteria_list: the criteria of each search, as for score_frame
+            k: the number of best candidates to return for each search
+            contract_types: the contract types to include for each search, None for a search to include them all
+            weights: the framework weighting of each search, keyed as framework_weighting, None for a search to use
+                     framework_weighting
+            column_indexes: optional per-candidate structures aligned with the rows of df, as for score_frame
+            memory_budget: the approximate number of bytes the score matrix and its temporaries may use
+
+        Returns:
+            a list with, for each search, a tuple of the positions in df of its best candidates, best first, a
+            DataFrame of their scores, indexed as df, and the number of candidates of its contract types
+
+        Raises:
+            ValueError: if every weighting of a search is zero
+        """
+        n_queries = len(criteria_list)
+        n_candidates = len(df)
+        if n_queries == 0:
+            return []
+
+        column_indexes = {} if column_indexes is None else column_indexes
+        contract_types = [None] * n_queries if contract_types is None else contract_types
+        weights = [None] * n_queries if weights is None else weights
+        dimensions = list(self.kwargs_to_score_column_mapping.keys())
+
+        weight_matrix = np.array([[(self.framework_weighting if y is None else y)[self.kwargs_to_framework_mapping[x]] for x in dimensions] for y in weights],
+                                 dtype=np.int64).reshape(n_queries, len(dimensions))
+        if not weight_matrix.any(axis=1).all():
+            raise ValueError('At least one framework weighting must be above zero')
+
+        # each dimension is scored by a kernel taking broadcastable arrays of search and candidate positions, e.g. a
+        # column of searches against a row of candidates for a block, or the matching pairs of the best candidates
+        kernels = {x: self.rules[x].batch(criteria_list, df, column_indexes=column_indexes, location_registry=self.location_registry) for x in dimensions}
+
+        job_categories, job_codes = self.category_codes(df['Job Type'])
+        included = np.array([np.ones(len(job_categories), dtype=bool) if x is None else job_categories.isin(x) for x in contract_types]).reshape(n_queries, len(job_categories))
+        n_matched = included[:, job_codes].sum(axis=1) if n_candidates else np.zeros(n_queries, dtype=np.int64)
+
+        # the bytes held per search and candidate: the weighted sum, the dimension being added, np.select's
+        # conditions and the bitmask AND of each word
+        bytes_per_cell = 64 + 16 * max([x.masks.shape[1] for x in column_indexes.values() if isinstance(x, BitsetColumn)] + [1])
+        query_block = max(1, min(n_queries, memory_budget // (bytes_per_cell * min(n_candidates, 1024) or 1)))
+        candidate_block = max(1, min(n_candidates, memory_budget // (bytes_per_cell * query_block)))
+
+        # a search's candidates are ranked by score then position, packed into one key as score * n + (n - 1 - position)
+        key_base = max(n_candidates, 1)
+        best_keys = np.empty((n_queries, min(max(k, 0), n_candidates)), dtype=np.int64)
+
+        for query_start in range(0, n_queries, query_block):
+            queries = np.arange(query_start, min(query_start + query_block, n_queries))[:, np.newaxis]
+            query_keys = np.empty((len(queries), 0), dtype=np.int64)
+
+            for start in range(0, n_candidates, candidate_block):
+                positions = np.arange(start, min(start + candidate_block, n_candidates))[np.newaxis, :]
+
+                weighted_score = np.zeros((len(queries), positions.shape[1]), dtype=np.int64)
+                for i, x in enumerate(dimensions):
+                    weighted_score += kernels[x](queries, positions) * weight_matrix[queries, i]
+
+                suitability = self.scale_weighted_score(weighted_score=weighted_score, weightings=weight_matrix[queries[:, 0]])
+                # candidates of other contract types score -1, below any candidate of the search
+                suitability = np.where(included[queries, job_codes[positions]], suitability, -1)
+
+                query_keys = self.merge_top_k(query_keys, suitability * key_base + (key_base - 1 - positions), k)
+
+            best_keys[queries[:, 0]] = query_keys
+
+        # the best candidates of every search, best first, and their dimension scores from the same kernels
+        best_keys = -np.sort(-best_keys, axis=1)
+        is_kept = best_keys >= 0
+        pair_queries = np.nonzero(is_kept)[0]
+        pair_keys = best_keys[is_kept]
+        pair_positions = key_base - 1 - pair_keys % key_base
+        pair_scores = {self.kwargs_to_score_column_mapping[x]: kernels[x](pair_queries, pair_positions).astype(np.int8) for x in dimensions}
+        pair_scores['Suitability Score'] = (pair_keys // key_base).astype(np.int8)
+
+        results = []
+        bounds = np.concatenate([[0], np.cumsum(is_kept.sum(axis=1))])
+        for i in range(n_queries):
+            positions = pair_positions[bounds[i]:bounds[i + 1]]
+            scores_df = pd.DataFrame({x: y[bounds[i]:bounds[i + 1]] for x, y in pair_scores.items()}, index=df.index[positions])
+            results.append((positions, scores_df, int(n_matched[i])))
+
+        return results
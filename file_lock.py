@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, where the app is only run as a single development process
+    fcntl = None
+
+
+@contextmanager
+def file_lock(lock_path: str):
+    """
+    Holds an exclusive lock on a lock file while the block runs, so the processes sharing the files it guards, e.g.
+    the gunicorn workers, take turns at writing them. Without fcntl nothing is locked.
+
+        with file_lock(snapshot_path + '.lock'):
+            ...
+
+    Args:
+        lock_path: the path of the lock file, created if it does not exist
+
+    Raises:
+        OSError: if the lock file cannot be opened, e.g. in a read only directory
+    """
+    if fcntl is None:
+        yield
+        return
+
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
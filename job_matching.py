@@ -0,0 +1,545 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from candidate_data import get_dataset_version, list_columns, parse_list_column
+from comparison_framework import SuitabilityScoreFramework
+from vocabulary import BitsetColumn, Vocabulary, popcount
+
+job_categorical_columns = ['Location', 'Sector', 'Major Expertise', 'Job Type']
+
+logger = logging.getLogger(__name__)
+
+
+def load_job_data(file_path: str) -> pd.DataFrame:
+    """
+    Reads the job csv, with the list columns converted back into lists and the categorical columns as pandas
+    categoricals. Each job pays a salary range, offers a number of WFH days and a contract type, and asks for a
+    minimum number of years experience, skills and areas of expertise.
+
+    Args:
+        file_path: the path of the job csv
+
+    Returns:
+        the job data
+    """
+    df = pd.read_csv(file_path)
+    for col in list_columns:
+        df[col] = parse_list_column(df[col])[0]
+
+    df[job_categorical_columns] = df[job_categorical_columns].astype('category')
+
+    return df
+
+
+class JobReloader:
+    """
+    Keeps the job data up to date with its csv, polled for a new version as CandidateReloader polls the candidate
+    csv. The job csv is small, so a new version is read whole rather than applied as a delta. The data and its version
+    are swapped in together as jobs, so a request reading jobs once sees a version matching the data.
+    """
+
+    def __init__(self, file_path: str, interval_seconds: float = 30, on_swap=None):
+        """
+        Args:
+            file_path: the path of the job csv, which need not exist
+            interval_seconds: the time between polls of the csv, 0 to only check when check is called
+            on_swap: a function called with the new jobs after each swap
+        """
+        self.file_path = file_path
+        self.interval_seconds = interval_seconds
+        self.on_swap = on_swap
+        # a tuple of the job data and its version, both None until the csv exists
+        self.jobs = (None, None)
+
+        self.reloads = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+
+        if os.path.exists(file_path):
+            version = get_dataset_version(file_path)
+            self.jobs = (load_job_data(file_path), version)
+
+    def check(self) -> bool:
+        """
+        Checks the csv for a new version, and reads and swaps it in if there is one.
+
+        Returns:
+            True if a new version was swapped in
+        """
+        with self._lock:
+            try:
+                version = get_dataset_version(self.file_path)
+            except OSError:
+                # e.g. the csv is being replaced, the next poll tries again
+                return False
+
+            if version == self.jobs[1]:
+                return False
+
+            try:
+                jobs = (load_job_data(self.file_path), version)
+            except (OSError, ValueError, TypeError, KeyError) as e:
+                # a csv caught mid-write or malformed keeps the current version until the next poll
+                logger.warning('Could not reload %s at version %s, keeping version %s: %r', self.file_path, version, self.jobs[1], e)
+                self.failures += 1
+                return False
+
+            self.jobs = jobs
+            self.reloads += 1
+
+        if self.on_swap is not None:
+            self.on_swap(jobs)
+
+        return True
+
+    def _poll(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.check()
+            except Exception:
+                logger.exception('Reloading %s failed', self.file_path)
+
+    def start(self):
+        """
+        Starts polling the csv in a background thread, unless interval_seconds is 0. Safe to call on every request:
+        the thread is started once per process.
+        """
+        if self.interval_seconds <= 0 or (self._thread is not None and self._thread_pid == os.getpid()):
+            return
+
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._poll, name='job-reloader', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def stop(self):
+        """
+        Stops polling the csv.
+        """
+        self._stop.set()
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            a dictionary with the number of reloads and failed reloads
+        """
+        return {'reloads': self.reloads, 'failures': self.failures}
+
+
+class JobMatcher:
+    """
+    Scores jobs against candidates from the candidate's side, with the candidate in the place of the user the
+    framework's job scorers were written for: the candidate's salary range, location, sector, major expertise and
+    WFH days against the job's, their skills against the share of the job's skills they have, their years against
+    the job's minimum with apply_framework_to_experience_job, and the job's areas against the candidate's. A pair
+    whose contract types differ is excluded.
+
+    Each dimension is scored by a kernel taking broadcastable arrays of job and candidate positions, e.g. a column of
+    jobs against a row of candidates, so any block of the jobs x candidates matrix, or any list of pairs, can be
+    scored. Categorical and small integer dimensions are gathered from a table over both sides' distinct values.
+    """
+
+    dimensions = ['salary_score', 'location_score', 'sector_score', 'wfh_score', 'skills_score', 'experience_score', 'area_score', 'expertise_score']
+
+    def __init__(self, framework: SuitabilityScoreFramework, jobs_df: pd.DataFrame, candidate_df: pd.DataFrame,
+                 candidate_bitsets: dict = None, weights: dict = None):
+        """
+        Args:
+            framework: the framework to score with
+            jobs_df: the job data, as from load_job_data
+            candidate_df: the candidate data, with Skills and Minor Expertise as lists unless given in candidate_bitsets
+            candidate_bitsets: optional BitsetColumns of the candidates' Skills and Minor Expertise, aligned with
+                               candidate_df
+            weights: the framework weighting to score with, keyed as framework_weighting, defaults to the framework's
+
+        Raises:
+            ValueError: if every weighting of the matched dimensions is zero
+        """
+        candidate_bitsets = {} if candidate_bitsets is None else candidate_bitsets
+        weights = framework.framework_weighting if weights is None else weights
+
+        self.framework = framework
+        self.n_jobs = len(jobs_df)
+        self.n_candidates = len(candidate_df)
+        self.weights = np.array([weights[framework.kwargs_to_framework_mapping[x]] for x in self.dimensions], dtype=np.int64)
+        if not self.weights.any():
+            raise ValueError('At least one framework weighting must be above zero')
+
+        def scalar_table(scorer):
+            return lambda candidate_values, job_values: np.array([[scorer(x, y) for y in job_values] for x in candidate_values], dtype=np.int64)
+
+        # each table is indexed by candidate code then job code
+        table_scorers = {
+            'location_score': ('Location', 'Location', lambda x, y: np.array([framework.build_location_lookup_table(input_location=z, categories=y) for z in x], dtype=np.int64)),
+            'sector_score': ('Sector', 'Sector', scalar_table(lambda x, y: framework.apply_framework_to_sector(input_sector=[x], data_sector=y))),
+            'expertise_score': ('Major Expertise', 'Major Expertise', scalar_table(lambda x, y: framework.apply_framework_to_area_of_expertise(input_expertise=[x], data_expertise=y))),
+            'wfh_score': ('WFH Days', 'WFH Days', lambda x, y: np.array([framework.apply_framework_to_wfh_batch(input_wfh=[z, z], data_wfh=np.asarray(y)) for z in x], dtype=np.int64)),
+            'experience_score': ('Years Experience', 'Min Years Experience', lambda x, y: framework.apply_framework_to_experience_job_batch(input_years=np.asarray(x)[:, np.newaxis], min_data_years=np.asarray(y)[np.newaxis, :])),
+        }
+
+        self.tables = {}
+        for dimension, (candidate_col, job_col, build_table) in table_scorers.items():
+            candidate_values, candidate_codes = framework.category_codes(candidate_df[candidate_col])
+            job_values, job_codes = framework.category_codes(jobs_df[job_col])
+            table = np.asarray(build_table(candidate_values, job_values), dtype=np.int64).reshape(len(candidate_values), len(job_values))
+            self.tables[dimension] = (table, candidate_codes, job_codes)
+
+        candidate_types, self.candidate_type_codes = framework.category_codes(candidate_df['Job Type'])
+        job_types, self.job_type_codes = framework.category_codes(jobs_df['Job Type'])
+        self.same_job_type = np.asarray(candidate_types)[:, np.newaxis] == np.asarray(job_types)[np.newaxis, :]
+
+        self.candidate_salaries = candidate_df[['Min Salary', 'Max Salary']].to_numpy(dtype=np.float64)
+        self.job_salaries = jobs_df[['Min Salary', 'Max Salary']].to_numpy(dtype=np.float64)
+
+        # both sides' lists are encoded over one vocabulary, the candidates' own with the jobs' values appended, so
+        # values only jobs ask for count towards a job's skills but match no candidate
+        self.bitsets = {}
+        for col in list_columns:
+            candidate_lists = candidate_bitsets.get(col)
+            if not isinstance(candidate_lists, BitsetColumn):
+                candidate_lists = BitsetColumn.from_column(candidate_df[col], vocabulary=Vocabulary([]))
+            vocabulary = Vocabulary(candidate_lists.vocabulary.values)
+            job_masks = vocabulary.encode_column(jobs_df[col])
+            candidate_masks = np.zeros((len(candidate_lists.masks), vocabulary.n_words), dtype=np.uint64)
+            candidate_masks[:, :candidate_lists.masks.shape[1]] = candidate_lists.masks
+            n_job_values = np.fromiter(map(len, jobs_df[col]), dtype=np.int64, count=self.n_jobs)
+            self.bitsets[col] = self._code_masks(job_masks, candidate_masks, n_job_values)
+
+    @staticmethod
+    def _code_masks(job_masks: np.ndarray, candidate_masks: np.ndarray, n_job_values: np.ndarray) -> dict:
+        # when both sides share few distinct masks, e.g. combinations of a handful of areas, the matches of each pair
+        # of distinct masks are counted once and gathered by mask code, as for a categorical dimension
+        unique_job_masks, job_codes = np.unique(job_masks, axis=0, return_inverse=True)
+        unique_candidate_masks, candidate_codes = np.unique(candidate_masks, axis=0, return_inverse=True)
+        if len(unique_job_masks) * len(unique_candidate_masks) * 4 <= len(job_masks) * len(candidate_masks):
+            n_matched = popcount(unique_job_masks[:, np.newaxis, :] & unique_candidate_masks[np.newaxis, :, :])
+            return {'n_matched': n_matched, 'job_codes': job_codes.reshape(-1), 'candidate_codes': candidate_codes.reshape(-1),
+                    'n_job_distinct': popcount(job_masks), 'n_job_values': n_job_values, 'n_candidate': popcount(candidate_masks)}
+
+        return {'job_masks': job_masks, 'candidate_masks': candidate_masks,
+                'n_job_distinct': popcount(job_masks), 'n_job_values': n_job_values, 'n_candidate': popcount(candidate_masks)}
+
+    @property
+    def n_words(self) -> int:
+        """
+        The most uint64 words of any list column whose masks are matched pair by pair
+        """
+        return max([x['job_masks'].shape[1] for x in self.bitsets.values() if 'job_masks' in x] + [1])
+
+    def _count_matches(self, col: str, jobs: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        bitset = self.bitsets[col]
+        if 'n_matched' in bitset:
+            return bitset['n_matched'][bitset['job_codes'][jobs], bitset['candidate_codes'][candidates]]
+
+        return popcount(bitset['job_masks'][jobs] & bitset['candidate_masks'][candidates])
+
+    def score_dimension(self, dimension: str, jobs: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """
+        Scores one dimension for pairs of jobs and candidates.
+
+        Args:
+            dimension: the dimension, keyed as the keyword arguments of apply_framework
+            jobs: an array of job positions
+            candidates: an array of candidate positions, broadcastable with jobs
+
+        Returns:
+            An array of scores of either 1, 2 or 3, in the broadcast shape of jobs and candidates
+        """
+        if dimension in self.tables:
+            table, candidate_codes, job_codes = self.tables[dimension]
+            return table[candidate_codes[candidates], job_codes[jobs]]
+
+        if dimension == 'salary_score':
+            return self.framework.apply_framework_to_salary_batch(input_salary=[self.candidate_salaries[candidates, 0], self.candidate_salaries[candidates, 1]],
+                                                                  data_min_salary=self.job_salaries[jobs, 0], data_max_salary=self.job_salaries[jobs, 1])
+
+        if dimension == 'skills_score':
+            # the share of the job's skills the candidate has, a candidate without skills scores 1
+            n_matched = self._count_matches('Skills', jobs, candidates)
+            skill_score = self.framework.score_skill_matches(n_skills=self.bitsets['Skills']['n_job_distinct'][jobs], n_matched=n_matched)
+            return np.where(self.bitsets['Skills']['n_candidate'][candidates] == 0, 1, skill_score)
+
+        if dimension == 'area_score':
+            # the share of the job's areas the candidate has experience in
+            n_matched = self._count_matches('Minor Expertise', jobs, candidates)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return self.framework.score_area_matches(n_matched=n_matched, n_input=self.bitsets['Minor Expertise']['n_job_values'][jobs])
+
+        raise KeyError(dimension)
+
+    def score_pairs(self, jobs: np.ndarray, candidates: np.ndarray) -> dict:
+        """
+        Scores every dimension for pairs of jobs and candidates.
+
+        Args:
+            jobs: an array of job positions
+            candidates: an array of candidate positions, broadcastable with jobs
+
+        Returns:
+            a dictionary of score arrays, keyed by dimension in the order of dimensions
+        """
+        return {x: np.asarray(self.score_dimension(x, jobs, candidates), dtype=np.int64) for x in self.dimensions}
+
+    def suitability(self, jobs: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """
+        Scores the suitability of pairs of jobs and candidates, as apply_framework does over the matched dimensions.
+
+        Args:
+            jobs: an array of job positions
+            candidates: an array of candidate positions, broadcastable with jobs
+
+        Returns:
+            An array of suitability scores between 0-100, with -1 for pairs whose contract types differ
+        """
+        weighted_score = 0
+        for weight, dimension in zip(self.weights, self.dimensions):
+            if weight:
+                weighted_score = weighted_score + self.score_dimension(dimension, jobs, candidates) * weight
+
+        suitability = self.framework.scale_weighted_score(weighted_score=weighted_score, weightings=self.weights)
+
+        return np.where(self.same_job_type[self.candidate_type_codes[candidates], self.job_type_codes[jobs]], suitability, -1)
+
+    def block_sizes(self, memory_budget: int) -> tuple:
+        """
+        Sizes the blocks of the jobs x candidates matrix scored at a time.
+
+        Args:
+            memory_budget: the approximate number of bytes a block and its temporaries may use
+
+        Returns:
+            a tuple of the number of jobs and the number of candidates in a block
+        """
+        # the bytes held per pair: the weighted sum, the dimension being added, np.select's conditions and the
+        # bitmask AND of each word
+        bytes_per_cell = 64 + 16 * self.n_words
+        job_block = max(1, min(self.n_jobs, memory_budget // (bytes_per_cell * min(self.n_candidates, 1024) or 1)))
+        candidate_block = max(1, min(self.n_candidates, memory_budget // (bytes_per_cell * job_block)))
+
+        return job_block, candidate_block
+
+    def match_candidates(self, start: int, stop: int, k: int, memory_budget: int = 256 * 1024 ** 2) -> tuple:
+        """
+        Scores every job against candidates start to stop, keeping the best k jobs of each of those candidates and
+        the best k of those candidates for each job. A pair is ranked by its score then by position, packed into one
+        key as score * n + (n - 1 - position), where n is the number of jobs or candidates being ranked.
+
+        Args:
+            start: the first candidate
+            stop: the candidate after the last
+            k: the number of best matches to keep per job and per candidate
+            memory_budget: the approximate number of bytes each block of the matrix may use
+
+        Returns:
+            a tuple of an array with a row of job keys per candidate and an array with a row of candidate keys per
+            job, each row in no particular order, with negative keys for excluded pairs
+        """
+        job_base = max(self.n_jobs, 1)
+        candidate_base = max(self.n_candidates, 1)
+        job_block, candidate_block = self.block_sizes(memory_budget)
+        job_starts = range(0, self.n_jobs, job_block)
+
+        job_keys = [np.empty((min(job_block, self.n_jobs - x), 0), dtype=np.int64) for x in job_starts]
+        candidate_keys = [np.empty((0, min(max(k, 0), self.n_jobs)), dtype=np.int64)]
+
+        for candidate_start in range(start, stop, candidate_block):
+            candidates = np.arange(candidate_start, min(candidate_start + candidate_block, stop))[np.newaxis, :]
+            best_jobs = np.empty((candidates.shape[1], 0), dtype=np.int64)
+
+            for i, job_start in enumerate(job_starts):
+                jobs = np.arange(job_start, min(job_start + job_block, self.n_jobs))[:, np.newaxis]
+                suitability = self.suitability(jobs, candidates)
+
+                best_jobs = self.framework.merge_top_k(best_jobs, (suitability * job_base + (job_base - 1 - jobs)).T, k)
+                job_keys[i] = self.framework.merge_top_k(job_keys[i], suitability * candidate_base + (candidate_base - 1 - candidates), k)
+
+            candidate_keys.append(best_jobs)
+
+        job_keys = np.concatenate(job_keys) if job_keys else np.empty((0, 0), dtype=np.int64)
+
+        return np.concatenate(candidate_keys), job_keys
+
+
+# the matcher of each worker process, set once by _set_worker_matcher when the process starts
+_worker_state = {}
+
+
+def _set_worker_matcher(matcher: JobMatcher):
+    _worker_state['matcher'] = matcher
+
+
+def _match_candidates(start: int, stop: int, k: int, memory_budget: int) -> tuple:
+    return _worker_state['matcher'].match_candidates(start, stop, k, memory_budget=memory_budget)
+
+
+def keys_to_rows(keys: np.ndarray, key_base: int) -> tuple:
+    """
+    Converts rows of ranking keys, see JobMatcher.match_candidates, into compressed rows of positions and scores,
+    best first, dropping excluded pairs.
+
+    Args:
+        keys: an array with a row of keys per job or candidate
+        key_base: the number of positions the keys were packed with
+
+    Returns:
+        a tuple of the offsets of each row, the positions and the scores
+    """
+    keys = -np.sort(-keys, axis=1)
+    is_kept = keys >= 0
+    kept_keys = keys[is_kept]
+    offsets = np.concatenate([[0], np.cumsum(is_kept.sum(axis=1))]).astype(np.int64)
+
+    return offsets, key_base - 1 - kept_keys % key_base, (kept_keys // key_base).astype(np.int8)
+
+
+class MatchIndex:
+    """
+    The sparse result of scoring every job against every candidate: the best k candidates of each job and the best
+    k jobs of each candidate, held as compressed rows of positions and scores, best first. The version records the
+    candidate and job data it was built from, so a stored index can be checked before it is used.
+    """
+
+    arrays = ['job_offsets', 'job_candidates', 'job_scores', 'candidate_offsets', 'candidate_jobs', 'candidate_scores']
+
+    def __init__(self, job_offsets: np.ndarray, job_candidates: np.ndarray, job_scores: np.ndarray, candidate_offsets: np.ndarray,
+                 candidate_jobs: np.ndarray, candidate_scores: np.ndarray, k: int, version: str):
+        """
+        Args:
+            job_offsets: the offset of each job's row, with the end of the last row appended
+            job_candidates: the positions of the candidates of every job's row
+            job_scores: the suitability scores of the candidates of every job's row
+            candidate_offsets: the offset of each candidate's row, with the end of the last row appended
+            candidate_jobs: the positions of the jobs of every candidate's row
+            candidate_scores: the suitability scores of the jobs of every candidate's row
+            k: the most matches kept per job and per candidate
+            version: the versions of the candidate and job data
+        """
+        self.job_offsets = job_offsets
+        self.job_candidates = job_candidates
+        self.job_scores = job_scores
+        self.candidate_offsets = candidate_offsets
+        self.candidate_jobs = candidate_jobs
+        self.candidate_scores = candidate_scores
+        self.k = k
+        self.version = version
+
+    @property
+    def n_jobs(self) -> int:
+        return len(self.job_offsets) - 1
+
+    @property
+    def n_candidates(self) -> int:
+        return len(self.candidate_offsets) - 1
+
+    def candidates_for_job(self, job: int) -> tuple:
+        """
+        Args:
+            job: the position of the job
+
+        Returns:
+            a tuple of the positions of the job's best candidates, best first, and their suitability scores
+        """
+        start, stop = self.job_offsets[job], self.job_offsets[job + 1]
+
+        return self.job_candidates[start:stop], self.job_scores[start:stop]
+
+    def jobs_for_candidate(self, candidate: int) -> tuple:
+        """
+        Args:
+            candidate: the position of the candidate
+
+        Returns:
+            a tuple of the positions of the candidate's best jobs, best first, and their suitability scores
+        """
+        start, stop = self.candidate_offsets[candidate], self.candidate_offsets[candidate + 1]
+
+        return self.candidate_jobs[start:stop], self.candidate_scores[start:stop]
+
+    def save(self, file_path: str):
+        """
+        Writes the index to an npz file, replacing any earlier index at once.
+
+        Args:
+            file_path: the path of the npz file
+        """
+        temp_path = '{}.{}.tmp.npz'.format(file_path, os.getpid())
+        np.savez(temp_path, k=self.k, version=self.version, **{x: getattr(self, x) for x in self.arrays})
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str):
+        """
+        Reads an index written by save.
+
+        Args:
+            file_path: the path of the npz file
+
+        Returns:
+            a MatchIndex
+        """
+        with np.load(file_path) as data:
+            return cls(k=int(data['k']), version=str(data['version']), **{x: data[x] for x in cls.arrays})
+
+
+def match_version(candidate_version: str, job_version: str) -> str:
+    """
+    The version of a match index built from a version of the candidate data and a version of the job csv.
+
+    Args:
+        candidate_version: the version of the candidate data
+        job_version: the version of the job csv, see candidate_data.get_dataset_version
+
+    Returns:
+        the version string
+    """
+    return '{}:{}'.format(candidate_version, job_version)
+
+
+def build_match_index(matcher: JobMatcher, k: int, version: str = '', n_workers: int = None, memory_budget: int = 256 * 1024 ** 2) -> MatchIndex:
+    """
+    Scores every job against every candidate and keeps the best k matches of each side. The candidates are split into
+    blocks, each scored against every job by JobMatcher.match_candidates across a pool of processes, so each
+    candidate's best jobs come from a single block and the jobs' best candidates are merged across blocks.
+
+    Args:
+        matcher: the matcher of the jobs and candidates, sent once to each worker process
+        k: the number of best matches to keep per job and per candidate
+        version: the version to record on the index, see match_version
+        n_workers: the number of worker processes, defaults to the number of cpus, with 1 scoring in process
+        memory_budget: the approximate number of bytes each worker's block of the matrix may use
+
+    Returns:
+        a MatchIndex
+    """
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    n_blocks = max(1, min(matcher.n_candidates, n_workers * 4))
+    bounds = np.linspace(0, matcher.n_candidates, n_blocks + 1).astype(np.int64)
+    blocks = [(int(x), int(y)) for x, y in zip(bounds[:-1], bounds[1:]) if y > x]
+
+    if n_workers <= 1 or len(blocks) <= 1:
+        results = [matcher.match_candidates(x, y, k, memory_budget=memory_budget) for x, y in blocks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_set_worker_matcher, initargs=(matcher,)) as executor:
+            results = list(executor.map(_match_candidates, *zip(*[(x, y, k, memory_budget) for x, y in blocks])))
+
+    # blocks are in position order, so the candidates' rows stay in position order
+    candidate_keys = np.concatenate([x[0] for x in results]) if results else np.empty((0, 0), dtype=np.int64)
+    job_keys = np.empty((matcher.n_jobs, 0), dtype=np.int64)
+    for _, block_keys in results:
+        job_keys = matcher.framework.merge_top_k(job_keys, block_keys, k)
+
+    job_offsets, job_candidates, job_scores = keys_to_rows(job_keys, key_base=max(matcher.n_candidates, 1))
+    candidate_offsets, candidate_jobs, candidate_scores = keys_to_rows(candidate_keys, key_base=max(matcher.n_jobs, 1))
+
+    return MatchIndex(job_offsets=job_offsets, job_candidates=job_candidates, job_scores=job_scores, candidate_offsets=candidate_offsets,
+                      candidate_jobs=candidate_jobs, candidate_scores=candidate_scores, k=k, version=version)
@@ -0,0 +1,248 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_distances(start_coordinates: np.ndarray, end_coordinates: np.ndarray) -> np.ndarray:
+    """
+    Calculates the great circle distance in kms between every start and every end lat / lon.
+
+    Args:
+        start_coordinates: an array of shape (n, 2) with the lat / lons of the start locations, in degrees
+        end_coordinates: an array of shape (m, 2) with the lat / lons of the end locations, in degrees
+
+    Returns:
+        an array of shape (n, m) with the distance in km between each pair
+    """
+    start_radians = np.radians(np.asarray(start_coordinates, dtype=np.float64).reshape(-1, 2))
+    end_radians = np.radians(np.asarray(end_coordinates, dtype=np.float64).reshape(-1, 2))
+
+    start_lat = start_radians[:, 0][:, None]
+    start_lon = start_radians[:, 1][:, None]
+    end_lat = end_radians[:, 0][None, :]
+    end_lon = end_radians[:, 1][None, :]
+
+    a = np.sin((end_lat - start_lat) / 2) ** 2 + np.cos(start_lat) * np.cos(end_lat) * np.sin((end_lon - start_lon) / 2) ** 2
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class LocationRegistry:
+    """
+    Holds the known locations with an integer code each and a matrix of the distances between them, so that
+    the distance between two locations is a lookup by code.
+    """
+
+    def __init__(self, coordinates: dict):
+        """
+        Args:
+            coordinates: a dictionary of location name to its [lat, lon]
+        """
+        self.names = []
+        self.codes = {}
+        self.coordinates = np.empty((0, 2), dtype=np.float64)
+        self.distance_matrix = np.empty((0, 0), dtype=np.float64)
+        self.add_locations(coordinates)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, location: str):
+        return location in self.codes
+
+    def add_locations(self, coordinates: dict):
+        """
+        Adds locations to the registry and recomputes the distance matrix. A location already in the
+        registry has its coordinates replaced.
+
+        Args:
+            coordinates: a dictionary of location name to its [lat, lon]
+        """
+        all_coordinates = dict(zip(self.names, self.coordinates.tolist()))
+        all_coordinates.update({x: list(y) for x, y in coordinates.items()})
+
+        self.names = list(all_coordinates.keys())
+        self.codes = {x: i for i, x in enumerate(self.names)}
+        self.coordinates = np.array(list(all_coordinates.values()), dtype=np.float64).reshape(-1, 2)
+        self.distance_matrix = haversine_distances(self.coordinates, self.coordinates)
+
+    def add_locations_from_file(self, file_path: str):
+        """
+        Adds the locations held in a csv file with Location, Latitude and Longitude columns.
+
+        Args:
+            file_path: the path of the csv file
+        """
+        locations_df = pd.read_csv(file_path)
+        self.add_locations({x: [y, z] for x, y, z in zip(locations_df['Location'], locations_df['Latitude'], locations_df['Longitude'])})
+
+    def get_codes(self, locations: list) -> np.ndarray:
+        """
+        Args:
+            locations: the location names
+
+        Returns:
+            an array with the code of each location
+
+        Raises:
+            KeyError: if a location is not in the registry
+        """
+        return np.array([self.codes[x] for x in locations], dtype=np.int64)
+
+    def distance(self, start_location: str, end_location: str) -> float:
+        """
+        Args:
+            start_location: the name of the start location
+            end_location: the name of the end location
+
+        Returns:
+            the distance in km between the two
+        """
+        return self.distance_matrix[self.codes[start_location], self.codes[end_location]]
+
+    def to_mapped_distances(self) -> dict:
+        """
+        Returns:
+            a dictionary with each destination mapped from each starting point, e.g. {'London': {'Leeds': 272.0, ...}, ...}
+        """
+        return {x: dict(zip(self.names, self.distance_matrix[i].tolist())) for i, x in enumerate(self.names)}
+
+
+class GridIndex:
+    """
+    A spatial index over per-candidate lat / lons. Points are bucketed into a regular lat / lon grid and sorted by
+    cell, so a radius query only measures the distance to points in the cells overlapping the radius rather than
+    to every candidate.
+    """
+
+    km_per_degree = np.pi * EARTH_RADIUS_KM / 180
+
+    def __init__(self, coordinates: np.ndarray, cell_degrees: float = 0.5):
+        """
+        Args:
+            coordinates: an array of shape (n, 2) with the lat / lon of each candidate, NaN where it is unknown
+            cell_degrees: the size of each grid cell in degrees
+        """
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        self.cell_degrees = cell_degrees
+        self.n_points = len(coordinates)
+        self.n_lon_cells = int(np.ceil(360 / cell_degrees))
+        self.has_coordinates = ~np.isnan(coordinates).any(axis=1)
+        self.positions = None
+
+        # points without coordinates are left out of the index altogether
+        indexed_points = np.flatnonzero(self.has_coordinates)
+        cell_keys = self._cell_keys(coordinates[indexed_points, 0], coordinates[indexed_points, 1])
+        order = np.argsort(cell_keys, kind='stable')
+
+        self.sorted_points = indexed_points[order]
+        self.sorted_keys = cell_keys[order]
+        self.sorted_coordinates = coordinates[self.sorted_points]
+
+    def _lat_cells(self, lat: np.ndarray) -> np.ndarray:
+        return np.floor((np.clip(lat, -90, 90) + 90) / self.cell_degrees).astype(np.int64)
+
+    def _lon_cells(self, lon: np.ndarray) -> np.ndarray:
+        return np.floor((np.clip(lon, -180, 180) + 180) / self.cell_degrees).astype(np.int64) % self.n_lon_cells
+
+    def _cell_keys(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        return self._lat_cells(lat) * self.n_lon_cells + self._lon_cells(lon)
+
+    def __len__(self):
+        return self.n_points if self.positions is None else len(self.positions)
+
+    def take(self, positions: np.ndarray):
+        """
+        Selects a subset of candidates. The index itself is shared, queries are gathered to positions.
+
+        Args:
+            positions: the row positions to select
+
+        Returns:
+            a GridIndex aligned with positions
+        """
+        subset = copy.copy(self)
+        subset.positions = np.asarray(positions) if self.positions is None else self.positions[positions]
+
+        return subset
+
+    def query_radius(self, lat: float, lon: float, radius_km: float) -> tuple:
+        """
+        Finds the indexed points within radius_km of a lat / lon.
+
+        Args:
+            lat: the latitude of the centre, in degrees
+            lon: the longitude of the centre, in degrees
+            radius_km: the radius in km
+
+        Returns:
+            a tuple of the row positions of the points within the radius and their distances in km
+        """
+        lat_radius = radius_km / self.km_per_degree
+        max_abs_lat = min(89.9, abs(lat) + lat_radius)
+        lon_radius = min(180, lat_radius / np.cos(np.radians(max_abs_lat)))
+
+        lat_cells = np.arange(self._lat_cells(lat - lat_radius), self._lat_cells(lat + lat_radius) + 1)
+        first_lon_cell = int(np.floor((lon - lon_radius + 180) / self.cell_degrees))
+        last_lon_cell = int(np.floor((lon + lon_radius + 180) / self.cell_degrees))
+
+        # each row of the grid is a contiguous run of keys, split in two where the radius wraps the antimeridian
+        lon_runs = [(max(first_lon_cell, 0), min(last_lon_cell, self.n_lon_cells - 1))]
+        if last_lon_cell - first_lon_cell + 1 >= self.n_lon_cells:
+            lon_runs = [(0, self.n_lon_cells - 1)]
+        elif first_lon_cell < 0:
+            lon_runs.append((first_lon_cell % self.n_lon_cells, self.n_lon_cells - 1))
+        elif last_lon_cell >= self.n_lon_cells:
+            lon_runs.append((0, last_lon_cell % self.n_lon_cells))
+
+        starts = []
+        ends = []
+        for first_cell, last_cell in lon_runs:
+            starts.append(np.searchsorted(self.sorted_keys, lat_cells * self.n_lon_cells + first_cell, side='left'))
+            ends.append(np.searchsorted(self.sorted_keys, lat_cells * self.n_lon_cells + last_cell, side='right'))
+        starts = np.concatenate(starts)
+        ends = np.concatenate(ends)
+
+        lengths = ends - starts
+        slots = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+        distances = haversine_distances([lat, lon], self.sorted_coordinates[slots])[0]
+        in_radius = distances <= radius_km
+
+        return self.sorted_points[slots[in_radius]], distances[in_radius]
+
+    def score_bands(self, lat: float, lon: float, bands: list, default: int) -> np.ndarray:
+        """
+        Scores every candidate by the first distance band its coordinates fall in, as the bands are applied to
+        locations in scoring_rules. Only the widest band is queried, candidates outside it keep the default score.
+
+        Args:
+            lat: the latitude of the centre, in degrees
+            lon: the longitude of the centre, in degrees
+            bands: a list of (radius_km, score) tuples, e.g. [(50, 3), (100, 2)]
+            default: the score of candidates outside every band, or without coordinates
+
+        Returns:
+            an array with the score of each candidate, aligned with the selected positions
+        """
+        scores = np.full(self.n_points, default, dtype=np.int64)
+        points, distances = self.query_radius(lat=lat, lon=lon, radius_km=max(x[0] for x in bands))
+
+        # applied last band first, so an earlier band overwrites a later one, whatever order the radii are in
+        for radius_km, score in reversed(bands):
+            scores[points[distances <= radius_km]] = score
+
+        if self.positions is not None:
+            scores = scores[self.positions]
+
+        return scores
+
+    def has_coordinates_mask(self) -> np.ndarray:
+        """
+        Returns:
+            a boolean array, aligned with the selected positions, which is True where the candidate has coordinates
+        """
+        return self.has_coordinates if self.positions is None else self.has_coordinates[self.positions]
@@ -0,0 +1,280 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# latency buckets in seconds, from sub-millisecond stages to whole searches over millions of candidates
+default_time_buckets = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+# candidate count buckets, from a single page of results to tens of millions of candidates
+default_count_buckets = [10, 25, 100, 1000, 10000, 100000, 1000000, 10000000, 100000000]
+
+
+def format_labels(labels: dict) -> str:
+    """
+    Formats labels as Prometheus text, e.g. {stage="score_dimensions",worker="123"}.
+
+    Args:
+        labels: a dictionary of label name to value
+
+    Returns:
+        the formatted labels, or an empty string when there are none
+    """
+    if not labels:
+        return ''
+
+    escaped = ['{}="{}"'.format(x, str(y).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for x, y in labels.items()]
+
+    return '{' + ','.join(escaped) + '}'
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    A count which only goes up, e.g. the number of searches served, with one count per set of label values.
+    """
+
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: list = None):
+        """
+        Args:
+            name: the metric name
+            documentation: the help text of the metric
+            label_names: the names of the labels each count is kept by
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = [] if label_names is None else list(label_names)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        """
+        Args:
+            amount: the amount to add
+            labels: the value of each label
+        """
+        key = tuple(str(labels[x]) for x in self.label_names)
+
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> list:
+        """
+        Returns:
+            a list of (name, labels, value) tuples
+        """
+        with self._lock:
+            return [(self.name + '_total', dict(zip(self.label_names, x)), y) for x, y in sorted(self.values.items())]
+
+
+class Gauge:
+    """
+    A value read when the metrics are collected, e.g. the number of candidates loaded.
+    """
+
+    metric_type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, read_value, label_name: str = None):
+        """
+        Args:
+            name: the metric name
+            documentation: the help text of the metric
+            read_value: a function returning the current value, or a dictionary of label value to value when
+                        label_name is given
+            label_name: the name of the label the keys of read_value's dictionary are reported under
+        """
+        self.name = name
+        self.documentation = documentation
+        self.read_value = read_value
+        self.label_name = label_name
+
+    def samples(self) -> list:
+        value = self.read_value()
+
+        if self.label_name is None:
+            return [(self.name, {}, value)]
+
+        return [(self.name, {self.label_name: x}, y) for x, y in value.items()]
+
+
+class ReadCounter(Gauge):
+    """
+    A count which only goes up, kept elsewhere and read when the metrics are collected, e.g. the hits counted by the
+    search cache.
+    """
+
+    metric_type = 'counter'
+
+    def samples(self) -> list:
+        return [(self.name + '_total', x, y) for _, x, y in super().samples()]
+
+
+def select_values(read_value, keys: list):
+    """
+    Picks some of the values of a dictionary read when the metrics are collected, e.g. to report the monotonic
+    counts of a stats dictionary as a counter and its sizes as a gauge.
+
+    Args:
+        read_value: a function returning a dictionary
+        keys: the keys to keep
+
+    Returns:
+        a function returning the dictionary with only the given keys
+    """
+    return lambda: {x: y for x, y in read_value().items() if x in keys}
+
+
+class Histogram:
+    """
+    Observations counted into cumulative buckets, e.g. the time each search stage takes, with one set of buckets
+    per set of label values.
+    """
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: list = None, label_names: list = None):
+        """
+        Args:
+            name: the metric name
+            documentation: the help text of the metric
+            buckets: the upper bound of each bucket, a +Inf bucket is added
+            label_names: the names of the labels each set of buckets is kept by
+        """
+        self.name = name
+        self.documentation = documentation
+        self.buckets = sorted(default_time_buckets if buckets is None else buckets) + [math.inf]
+        self.label_names = [] if label_names is None else list(label_names)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        """
+        Args:
+            value: the observed value
+            labels: the value of each label
+        """
+        key = tuple(str(labels[x]) for x in self.label_names)
+
+        with self._lock:
+            if key not in self.values:
+                self.values[key] = {'counts': [0] * len(self.buckets), 'sum': 0, 'count': 0}
+            entry = self.values[key]
+
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    entry['counts'][i] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def samples(self) -> list:
+        samples = []
+
+        with self._lock:
+            for key, entry in sorted(self.values.items()):
+                labels = dict(zip(self.label_names, key))
+                for upper_bound, count in zip(self.buckets, entry['counts']):
+                    samples.append((self.name + '_bucket', dict(labels, le=format_value(upper_bound)), count))
+                samples.append((self.name + '_sum', labels, entry['sum']))
+                samples.append((self.name + '_count', labels, entry['count']))
+
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Holds the metrics of the app and renders them in the Prometheus text exposition format. Metrics are kept per
+    process, so under gunicorn each scrape of /metrics reports the worker which served it.
+    """
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """
+        Args:
+            metric: a Counter, Gauge, ReadCounter or Histogram
+
+        Returns:
+            the metric
+        """
+        self.metrics.append(metric)
+
+        return metric
+
+    def render(self) -> str:
+        """
+        Returns:
+            every metric in the Prometheus text exposition format
+        """
+        lines = []
+
+        for metric in self.metrics:
+            lines.append('# HELP {} {}'.format(metric.name, metric.documentation))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.metric_type))
+            lines.extend('{}{} {}'.format(x, format_labels(y), format_value(z)) for x, y, z in metric.samples())
+
+        return '\n'.join(lines) + '\n'
+
+
+class SearchMetrics:
+    """
+    The metrics of the prospecting search: the time and candidate count of each stage of a search, the time of
+    whole searches and the number of searches served by each worker.
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        """
+        Args:
+            registry: the registry to add the metrics to
+        """
+        self.registry = registry
+        self.stage_seconds = registry.register(Histogram('prospecting_search_stage_seconds', 'Time taken by each stage of a search.',
+                                                         buckets=default_time_buckets, label_names=['stage']))
+        self.stage_candidates = registry.register(Histogram('prospecting_search_stage_candidates', 'Number of candidates processed by each stage of a search.',
+                                                            buckets=default_count_buckets, label_names=['stage']))
+        self.search_seconds = registry.register(Histogram('prospecting_search_seconds', 'Time taken by whole searches.',
+                                                          buckets=default_time_buckets))
+        self.requests = registry.register(Counter('prospecting_search_requests', 'Number of searches served by each worker process.',
+                                                  label_names=['worker']))
+
+    @contextmanager
+    def stage(self, name: str, n_candidates: int = None):
+        """
+        Times a stage of a search, e.g.
+
+            with search_metrics.stage('select_top_k', n_candidates=len(scores_df)):
+                ...
+
+        Args:
+            name: the name of the stage
+            n_candidates: the number of candidates the stage processes
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - start, stage=name)
+            if n_candidates is not None:
+                self.stage_candidates.observe(n_candidates, stage=name)
+
+    @contextmanager
+    def search(self):
+        """
+        Times a whole search and counts it against this worker.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.search_seconds.observe(time.perf_counter() - start)
+            self.requests.inc(worker=os.getpid())
@@ -0,0 +1,257 @@
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from comparison_framework import SuitabilityScoreFramework
+from locations import GridIndex
+from vocabulary import BitsetColumn, Vocabulary
+
+# the columns the framework scores from, all other columns stay in the parent process
+scored_columns = ['Min Salary', 'Max Salary', 'Years Experience', 'WFH Days', 'Last Moved Years',
+                  'Location', 'Sector', 'Major Expertise', 'Job Type', 'Move Status']
+coordinate_columns = ['Latitude', 'Longitude']
+
+
+class SharedCandidateColumns:
+    """
+    Holds the scored candidate columns in shared memory blocks, with categorical columns held as their codes and
+    Skills / Minor Expertise as their bitmasks. Worker processes attach to the blocks by name through spec, so the
+    candidate data is never pickled to them.
+    """
+
+    def __init__(self, df: pd.DataFrame, column_indexes: dict, extra_columns: list = None):
+        """
+        Args:
+            df: the candidate data, with the categorical columns as pandas categoricals
+            column_indexes: the BitsetColumns of Skills and Minor Expertise, aligned with df
+            extra_columns: any other columns to share, e.g. those read by the framework's scoring rules
+        """
+        self.blocks = []
+        self.spec = {'n_rows': len(df), 'columns': {}, 'bitsets': {}}
+        self._owner_pid = os.getpid()
+
+        shared_columns = scored_columns + [x for x in coordinate_columns if x in df.columns]
+        for col in shared_columns + [x for x in dict.fromkeys(extra_columns or []) if x not in shared_columns]:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                self.spec['columns'][col] = (self._share(df[col].cat.codes.to_numpy()), list(df[col].cat.categories))
+            else:
+                self.spec['columns'][col] = (self._share(df[col].to_numpy()), None)
+
+        for col in ['Skills', 'Minor Expertise']:
+            self.spec['bitsets'][col] = (self._share(column_indexes[col].masks), column_indexes[col].vocabulary)
+
+        atexit.register(self.close)
+
+    def _share(self, values: np.ndarray) -> tuple:
+        values = np.ascontiguousarray(values)
+        block = shared_memory.SharedMemory(create=True, size=max(1, values.nbytes))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+        self.blocks.append(block)
+
+        return block.name, values.shape, values.dtype.str
+
+    def close(self):
+        """
+        Releases the shared memory blocks, removing them if this is the process which created them.
+        """
+        for block in self.blocks:
+            block.close()
+            if os.getpid() == self._owner_pid:
+                block.unlink()
+        self.blocks = []
+
+
+# state of each worker process, set once by _attach_shared_columns when the process starts
+_worker_state = {}
+
+
+def _attach_shared_columns(spec: dict, framework: SuitabilityScoreFramework):
+    blocks = []
+
+    def attach(block_spec):
+        name, shape, dtype = block_spec
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+    columns = {}
+    for col, (block_spec, categories) in spec['columns'].items():
+        values = attach(block_spec)
+        columns[col] = values if categories is None else pd.Categorical.from_codes(values, categories=categories)
+
+    _worker_state['blocks'] = blocks
+    _worker_state['columns'] = columns
+    _worker_state['bitsets'] = {x: (attach(y), z) for x, (y, z) in spec['bitsets'].items()}
+    _worker_state['framework'] = framework
+    _worker_state['shards'] = {}
+
+
+def _get_shard(start: int, stop: int) -> tuple:
+    if (start, stop) not in _worker_state['shards']:
+        shard_df = pd.DataFrame({x: y[start:stop] for x, y in _worker_state['columns'].items()},
+                                index=pd.RangeIndex(start, stop), copy=False)
+        shard_indexes = {x: BitsetColumn(masks=y[start:stop], vocabulary=z) for x, (y, z) in _worker_state['bitsets'].items()}
+        if set(coordinate_columns).issubset(shard_df.columns):
+            shard_indexes['Coordinates'] = GridIndex(shard_df[coordinate_columns].to_numpy())
+        _worker_state['shards'][(start, stop)] = (shard_df, shard_indexes)
+
+    return _worker_state['shards'][(start, stop)]
+
+
+def score_shard(criteria: dict, start: int, stop: int, depth: int, contract_types: list = None) -> tuple:
+    """
+    Scores the candidates in rows start to stop of the shared columns, keeping the best depth of them.
+
+    Args:
+        criteria: the search criteria, keyed by the input argument names of the apply_framework_* functions
+        start: the first row of the shard
+        stop: the row after the last row of the shard
+        depth: the number of best candidates to keep
+        contract_types: the contract types to include, defaults to all of them
+
+    Returns:
+        a tuple of the positions of the kept candidates in ascending order, an array with a row of scores per kept
+        candidate and the number of candidates in the shard matching contract_types
+    """
+    framework = _worker_state['framework']
+    shard_df, shard_indexes = _get_shard(start, stop)
+
+    return score_top_candidates(framework=framework, df=shard_df, column_indexes=shard_indexes, criteria=criteria,
+                                depth=depth, contract_types=contract_types, first_position=start)
+
+
+def score_top_candidates(framework: SuitabilityScoreFramework, df: pd.DataFrame, column_indexes: dict, criteria: dict,
+                         depth: int, contract_types: list = None, first_position: int = 0) -> tuple:
+    """
+    Scores the candidates of df, keeping the best depth of them. Used by each shard and by the in-process fallback.
+
+    Args:
+        framework: the framework to score the candidates with
+        df: the candidate data
+        column_indexes: the per-candidate structures aligned with df, see SuitabilityScoreFramework.score_frame
+        criteria: the search criteria
+        depth: the number of best candidates to keep
+        contract_types: the contract types to include, defaults to all of them
+        first_position: the position of the first row of df in the whole pool
+
+    Returns:
+        a tuple of the positions in the whole pool of the kept candidates, in ascending order, an array with a row
+        of scores per kept candidate and the number of candidates matching contract_types
+    """
+    if contract_types is None:
+        positions = np.arange(len(df))
+    else:
+        positions = np.flatnonzero(df['Job Type'].isin(contract_types).to_numpy())
+
+    data_df = df.iloc[positions]
+    data_indexes = {x: y.take(positions) for x, y in column_indexes.items()}
+
+    kept_positions, scores_df = framework.score_frame_pruned(df=data_df, criteria=criteria, depth=depth, column_indexes=data_indexes)
+    top_positions, _ = framework.select_top_k(scores=scores_df['Suitability Score'].to_numpy(), k=depth)
+    top_positions = np.sort(top_positions)
+
+    return first_position + positions[kept_positions[top_positions]], scores_df.to_numpy()[top_positions], len(positions)
+
+
+class ParallelScorer:
+    """
+    Scores the candidate pool across a pool of processes. The scored columns are put in shared memory once, the pool
+    is split into one shard per worker and each search only sends the criteria. Every shard is scored and cut to its
+    own top K, and the parent merges the shards' results. Pools smaller than min_candidates are scored in process, as
+    are searches which reach the scorer after it was closed, e.g. a search which started before a reload.
+    """
+
+    def __init__(self, df: pd.DataFrame, framework: SuitabilityScoreFramework, column_indexes: dict = None,
+                 n_workers: int = None, min_candidates: int = 50000):
+        """
+        Args:
+            df: the candidate data, with Skills and Minor Expertise as lists and categorical columns as categoricals
+            framework: the framework to score the candidates with
+            column_indexes: the BitsetColumns of Skills and Minor Expertise, built from df if not given
+            n_workers: the number of worker processes, defaults to the number of cpus
+            min_candidates: pools with fewer candidates than this are scored in process
+        """
+        column_indexes = {} if column_indexes is None else dict(column_indexes)
+        for col in ['Skills', 'Minor Expertise']:
+            if col not in column_indexes:
+                column_indexes[col] = BitsetColumn.from_column(df[col], vocabulary=Vocabulary([]))
+
+        self.df = df
+        self.framework = framework
+        self.column_indexes = column_indexes
+        self.n_workers = os.cpu_count() if n_workers is None else n_workers
+        self.min_candidates = min_candidates
+        self.shared_columns = None
+        self.executor = None
+        self.closed = False
+        self._lock = threading.Lock()
+
+        shard_bounds = np.linspace(0, len(df), self.n_workers + 1).astype(np.int64)
+        self.shards = [(int(x), int(y)) for x, y in zip(shard_bounds[:-1], shard_bounds[1:]) if y > x]
+
+    def _start(self):
+        # the pool is started on first use, so that it belongs to the process serving the searches
+        if self.executor is None:
+            self.shared_columns = SharedCandidateColumns(df=self.df, column_indexes=self.column_indexes,
+                                                         extra_columns=[y for x in self.framework.rules.values() for y in x.columns])
+            self.executor = ProcessPoolExecutor(max_workers=self.n_workers, initializer=_attach_shared_columns,
+                                                initargs=(self.shared_columns.spec, self.framework))
+
+    def score_top_k(self, criteria: dict, depth: int, contract_types: list = None) -> tuple:
+        """
+        Finds the best depth candidates of the pool.
+
+        Args:
+            criteria: the search criteria, keyed by the input argument names of the apply_framework_* functions
+            depth: the number of best candidates to return, e.g. offset + k of the page being shown
+            contract_types: the contract types to include, defaults to all of them
+
+        Returns:
+            a tuple of the positions in df of the best candidates, in ascending order, a DataFrame of their scores
+            and the number of candidates matching contract_types
+        """
+        futures = None
+        with self._lock:
+            # once closed the pool is never started again, so a search holding an old scorer cannot leak one
+            if not self.closed and len(self.df) >= self.min_candidates and self.n_workers > 1:
+                self._start()
+                futures = [self.executor.submit(score_shard, criteria, start, stop, depth, contract_types) for start, stop in self.shards]
+
+        if futures is None:
+            positions, scores, n_matched = score_top_candidates(framework=self.framework, df=self.df,
+                                                                column_indexes=self.column_indexes, criteria=criteria,
+                                                                depth=depth, contract_types=contract_types)
+        else:
+            shard_results = [x.result() for x in futures]
+
+            # shards are in position order, so the merged positions stay ascending for select_top_k's tie-breaks
+            positions = np.concatenate([x[0] for x in shard_results])
+            scores = np.concatenate([x[1] for x in shard_results])
+            n_matched = sum(x[2] for x in shard_results)
+
+            top_positions, _ = self.framework.select_top_k(scores=scores[:, -1], k=depth)
+            top_positions = np.sort(top_positions)
+            positions = positions[top_positions]
+            scores = scores[top_positions]
+
+        score_columns = list(self.framework.kwargs_to_score_column_mapping.values()) + ['Suitability Score']
+        scores_df = pd.DataFrame(scores, columns=score_columns, index=self.df.index[positions])
+
+        return positions, scores_df, n_matched
+
+    def close(self):
+        """
+        Shuts down the worker processes, once the shards already submitted are scored, and releases the shared memory.
+        Searches after this are scored in process.
+        """
+        with self._lock:
+            self.closed = True
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.shared_columns.close()
+                self.executor = None
@@ -0,0 +1,404 @@
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from candidate_store import CandidateStore
+from comparison_framework import SuitabilityScoreFramework
+from file_lock import file_lock
+
+
+class MaterializedSearch:
+    """
+    The ranked results of a saved search against one version of the candidate data: the positions of its best
+    candidates, best first, with their dimension and suitability scores. The results are always exact, the best
+    len(positions) candidates of the search, and complete when they hold every candidate of its contract types.
+    """
+
+    def __init__(self, name: str, search: dict, depth: int, version: str, n_candidates: int, positions: np.ndarray,
+                 scores: np.ndarray, suitability: np.ndarray, n_matches: int, complete: bool):
+        """
+        Args:
+            name: the name the search was saved under
+            search: the search criteria, keyed as for score_candidates, with contract_type, a list of contract types,
+                    and optional weights, keyed as framework_weighting
+            depth: the most candidates kept
+            version: the version of the candidate data the results were scored from
+            n_candidates: the number of candidates in that version
+            positions: the positions of the best candidates in that version, best first
+            scores: an array of shape (len(positions), n dimensions) with each candidate's dimension scores, in the
+                    order of kwargs_to_score_column_mapping
+            suitability: the suitability score of each candidate, under the search's weights
+            n_matches: the number of candidates of the search's contract types
+            complete: whether positions holds every candidate of the search's contract types
+        """
+        self.name = name
+        self.search = search
+        self.depth = depth
+        self.version = version
+        self.n_candidates = n_candidates
+        self.positions = positions
+        self.scores = scores
+        self.suitability = suitability
+        self.n_matches = n_matches
+        self.complete = complete
+
+    def page(self, offset: int, k: int, score_columns: list) -> tuple:
+        """
+        Args:
+            offset: the rank of the first candidate, from 0
+            k: the number of candidates
+            score_columns: the names of the dimension score columns, see kwargs_to_score_column_mapping
+
+        Returns:
+            a tuple of the positions of the candidates ranked offset to offset + k and a DataFrame of their scores
+        """
+        rows = slice(offset, offset + k)
+        scores_df = pd.DataFrame(self.scores[rows], columns=score_columns)
+        scores_df['Suitability Score'] = self.suitability[rows].astype(np.int8)
+
+        return self.positions[rows], scores_df
+
+    def save(self, file_path: str):
+        """
+        Writes the results to an npz file, replacing any earlier results at once.
+
+        Args:
+            file_path: the path of the npz file
+        """
+        temp_path = '{}.{}.tmp.npz'.format(file_path, os.getpid())
+        np.savez(temp_path, name=self.name, search=json.dumps(self.search), depth=self.depth, version=self.version,
+                 n_candidates=self.n_candidates, positions=self.positions, scores=self.scores, suitability=self.suitability,
+                 n_matches=self.n_matches, complete=self.complete)
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str):
+        """
+        Reads results written by save.
+
+        Args:
+            file_path: the path of the npz file
+
+        Returns:
+            a MaterializedSearch
+        """
+        with np.load(file_path) as data:
+            return cls(name=str(data['name']), search=json.loads(str(data['search'])), depth=int(data['depth']), version=str(data['version']),
+                       n_candidates=int(data['n_candidates']), positions=data['positions'], scores=data['scores'], suitability=data['suitability'],
+                       n_matches=int(data['n_matches']), complete=bool(data['complete']))
+
+
+class SavedSearches:
+    """
+    Named searches whose best candidates are materialized and kept in a directory, one npz file per search, so a
+    saved search is opened by slicing its stored results rather than scoring the candidate pool.
+
+    When new candidate data is swapped in, refresh brings every saved search up to date. A store updated by a delta
+    records the rows it carried over unchanged from the previous version, whose scores cannot have changed, so only
+    the changed and appended rows are scored and merged into the stored results. Candidates below the lowest stored
+    unchanged candidate may be outranked by candidates which were never stored, so those are dropped, and a search is
+    only scored in full again when fewer than min_depth exact results remain, the data skipped a version or the store
+    was rebuilt.
+
+    Results are opened against the store they were scored from, kept until every search has been refreshed past it,
+    so a search opened while a refresh is running shows the version before it.
+    """
+
+    def __init__(self, directory: str, framework: SuitabilityScoreFramework, depth: int = 500, min_depth: int = 100):
+        """
+        Args:
+            directory: the directory the saved searches are kept in, created when the first search is saved
+            framework: the framework to score the candidates with
+            depth: the number of best candidates materialized for each search
+            min_depth: a search is scored in full again when a refresh leaves fewer exact results than this
+        """
+        self.directory = directory
+        self.framework = framework
+        self.depth = depth
+        self.min_depth = min_depth
+        self.searches = {}
+        self.stores = {}
+        self.counts = {'saved': 0, 'opened': 0, 'refreshed': 0, 'rescored': 0, 'failed': 0, 'rows_rescored': 0}
+        self._file_times = {}
+        self._lock = threading.Lock()
+
+    def file_path(self, name: str) -> str:
+        """
+        Args:
+            name: the name of the saved search
+
+        Returns:
+            the path of its npz file, named by a hash of the name so any name is a safe file name
+        """
+        return os.path.join(self.directory, hashlib.sha1(name.encode('utf-8')).hexdigest() + '.npz')
+
+    def _read(self, file_path: str):
+        # reads a search saved or refreshed by another process, unless the copy held is already up to date
+        try:
+            modified = os.stat(file_path).st_mtime_ns
+            if self._file_times.get(file_path) != modified:
+                saved = MaterializedSearch.load(file_path)
+                self.searches[saved.name] = saved
+                self._file_times[file_path] = modified
+        except FileNotFoundError:
+            # deleted by another process
+            self._file_times.pop(file_path, None)
+            for name in [x for x in self.searches if self.file_path(x) == file_path]:
+                del self.searches[name]
+        except (OSError, ValueError, KeyError):
+            # e.g. replaced while being read, the next read tries again
+            pass
+
+    def _write(self, saved: MaterializedSearch):
+        file_path = self.file_path(saved.name)
+        os.makedirs(self.directory, exist_ok=True)
+        saved.save(file_path)
+        self.searches[saved.name] = saved
+        self._file_times[file_path] = os.stat(file_path).st_mtime_ns
+
+    def score_search(self, store: CandidateStore, search: dict, positions: np.ndarray = None) -> tuple:
+        """
+        Scores the candidates of a search's contract types.
+
+        Args:
+            store: the candidate store
+            search: the saved search, see MaterializedSearch
+            positions: the positions of the candidates to score, defaults to every candidate
+
+        Returns:
+            a tuple of the positions scored, an array of their dimension scores and an array of their suitability
+            scores under the search's weights
+        """
+        df = store.df
+        dimensions = list(self.framework.kwargs_to_score_column_mapping.keys())
+        positions = np.arange(len(df), dtype=np.int64) if positions is None else np.asarray(positions, dtype=np.int64)
+        positions = positions[df['Job Type'].iloc[positions].isin(search['contract_type']).to_numpy()]
+
+        scores = self.framework.score_dimensions(df=df.iloc[positions], criteria={x: search[x] for x in self.framework.criteria_inputs},
+                                                 column_indexes={x: y.take(positions) for x, y in store.column_indexes.items()})
+        score_matrix = np.array([scores[x] for x in dimensions], dtype=np.int8).T.reshape(len(positions), len(dimensions))
+        weights = search.get('weights') or self.framework.framework_weighting
+        suitability = self.framework.apply_framework_matrix(score_matrix=score_matrix.astype(np.int64),
+                                                            weights=[weights[self.framework.kwargs_to_framework_mapping[x]] for x in dimensions])
+
+        return positions, score_matrix, suitability
+
+    def materialize(self, name: str, search: dict, store: CandidateStore) -> MaterializedSearch:
+        """
+        Scores a search against every candidate and keeps its best depth candidates.
+
+        Args:
+            name: the name of the saved search
+            search: the saved search, see MaterializedSearch
+            store: the candidate store
+
+        Returns:
+            a MaterializedSearch
+        """
+        positions, scores, suitability = self.score_search(store=store, search=search)
+        top, _ = self.framework.select_top_k(scores=suitability, k=self.depth)
+
+        return MaterializedSearch(name=name, search=search, depth=self.depth, version=store.version, n_candidates=len(store.df),
+                                  positions=positions[top], scores=scores[top], suitability=suitability[top], n_matches=len(positions),
+                                  complete=len(top) == len(positions))
+
+    def refresh_search(self, saved: MaterializedSearch, store: CandidateStore):
+        """
+        Brings a saved search up to date with a store updated from the version it was scored from, scoring only the
+        rows the update changed or appended.
+
+        Args:
+            saved: the saved search
+            store: the updated candidate store
+
+        Returns:
+            a tuple of the refreshed MaterializedSearch and the number of rows scored, or None if the search must be
+            scored in full: the store was not updated from the search's version, or too few exact results remain
+        """
+        if store.previous_version != saved.version or store.previous_positions is None:
+            return None
+
+        # the new position of each row of the previous version, -1 where it was changed or removed
+        previous_positions = np.asarray(store.previous_positions)
+        is_carried = previous_positions >= 0
+        new_positions = np.full(saved.n_candidates, -1, dtype=np.int64)
+        new_positions[previous_positions[is_carried]] = np.flatnonzero(is_carried)
+
+        kept_positions = new_positions[saved.positions]
+        is_kept = kept_positions >= 0
+        if not saved.complete and not is_kept.any():
+            return None
+
+        scored_positions, scores, suitability = self.score_search(store=store, search=saved.search, positions=np.flatnonzero(~is_carried))
+        positions = np.concatenate([kept_positions[is_kept], scored_positions])
+        scores = np.vstack([saved.scores[is_kept], scores])
+        suitability = np.concatenate([saved.suitability[is_kept], suitability])
+
+        # ranked by score then position, as select_top_k. Carried over rows keep their order, so an unchanged
+        # candidate which was not stored still ranks below every stored one
+        key_base = max(len(store.df), 1)
+        keys = suitability.astype(np.int64) * key_base + (key_base - 1 - positions)
+        order = np.argsort(-keys, kind='stable')
+        if not saved.complete:
+            order = order[keys[order] >= keys[:is_kept.sum()].min()]
+        order = order[:saved.depth]
+
+        # the contract types of the pool are compared by category, not scored
+        n_matches = int(store.df['Job Type'].isin(saved.search['contract_type']).sum())
+
+        if len(order) < min(self.min_depth, n_matches):
+            return None
+
+        refreshed = MaterializedSearch(name=saved.name, search=saved.search, depth=saved.depth, version=store.version, n_candidates=len(store.df),
+                                       positions=positions[order], scores=scores[order], suitability=suitability[order], n_matches=n_matches,
+                                       complete=len(order) == n_matches)
+
+        return refreshed, len(scored_positions)
+
+    def save(self, name: str, search: dict, store: CandidateStore) -> MaterializedSearch:
+        """
+        Saves a search under a name, replacing any search saved under it, and materializes its results.
+
+        Args:
+            name: the name of the saved search
+            search: the saved search, see MaterializedSearch
+            store: the candidate store
+
+        Returns:
+            the MaterializedSearch
+        """
+        saved = self.materialize(name=name, search=search, store=store)
+
+        with self._lock:
+            self._write(saved)
+            self.stores[store.version] = store
+            self.counts['saved'] += 1
+
+        return saved
+
+    def get(self, name: str) -> tuple:
+        """
+        Opens a saved search without scoring any candidate.
+
+        Args:
+            name: the name of the saved search
+
+        Returns:
+            a tuple of the MaterializedSearch and the store its positions refer to, which is None until the search
+            has been refreshed to a version held, or None if no search is saved under the name
+        """
+        with self._lock:
+            self._read(self.file_path(name))
+            saved = self.searches.get(name)
+            if saved is None:
+                return None
+
+            self.counts['opened'] += 1
+            return saved, self.stores.get(saved.version)
+
+    def delete(self, name: str) -> bool:
+        """
+        Args:
+            name: the name of the saved search
+
+        Returns:
+            True if a search was saved under the name
+        """
+        with self._lock:
+            file_path = self.file_path(name)
+            self._file_times.pop(file_path, None)
+            try:
+                os.remove(file_path)
+                existed = True
+            except FileNotFoundError:
+                existed = False
+
+            return self.searches.pop(name, None) is not None or existed
+
+    def list_searches(self) -> list:
+        """
+        Returns:
+            the saved searches, including those saved by other processes, as MaterializedSearches ordered by name
+        """
+        with self._lock:
+            file_paths = glob.glob(os.path.join(glob.escape(self.directory), '*.npz'))
+            for file_path in file_paths:
+                if not file_path.endswith('.tmp.npz'):
+                    self._read(file_path)
+            for file_path in {self.file_path(x) for x in self.searches} - set(file_paths):
+                self._read(file_path)
+
+            return [self.searches[x] for x in sorted(self.searches)]
+
+    def refresh(self, store: CandidateStore) -> dict:
+        """
+        Brings every saved search up to date with a store, incrementally where the store was updated from the
+        search's version, e.g. when the reloader swaps in a new version. Searches already refreshed by another
+        process are read from their files, and processes take turns at refreshing, under a lock in the directory, so
+        only the first to run scores each search, e.g. when every gunicorn worker refreshes as it starts.
+
+        Args:
+            store: the candidate store
+
+        Returns:
+            a dictionary with the number of searches refreshed incrementally, scored in full and which failed to be
+            scored, and the rows scored
+        """
+        # with no directory no search has been saved, so there is nothing to refresh in turn
+        with file_lock(os.path.join(self.directory, 'refresh.lock')) if os.path.isdir(self.directory) else contextlib.nullcontext():
+            return self._refresh(store)
+
+    def _refresh(self, store: CandidateStore) -> dict:
+        counts = {'refreshed': 0, 'rescored': 0, 'failed': 0, 'rows_rescored': 0}
+
+        for name in [x.name for x in self.list_searches()]:
+            with self._lock:
+                self._read(self.file_path(name))
+                saved = self.searches.get(name)
+            if saved is None or saved.version == store.version:
+                continue
+
+            try:
+                refreshed = self.refresh_search(saved, store)
+                if refreshed is None:
+                    refreshed = self.materialize(name=name, search=saved.search, store=store)
+                    counts['rescored'] += 1
+                    counts['rows_rescored'] += len(store.df)
+                else:
+                    refreshed, n_rows = refreshed
+                    counts['refreshed'] += 1
+                    counts['rows_rescored'] += n_rows
+            except (KeyError, TypeError, ValueError):
+                # e.g. a location no longer in the registry, the search keeps the results of its last version
+                counts['failed'] += 1
+                continue
+
+            with self._lock:
+                # a search saved again or deleted while this one was refreshing is left as it is
+                if self.searches.get(name) is saved:
+                    self._write(refreshed)
+
+        with self._lock:
+            self.stores[store.version] = store
+            # older stores are only held while a search still refers to them
+            versions = {x.version for x in self.searches.values()} | {store.version}
+            self.stores = {x: y for x, y in self.stores.items() if x in versions}
+            for x, y in counts.items():
+                self.counts[x] += y
+
+        return counts
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            a dictionary with the number of searches saved and opened, refreshed incrementally, scored in full and
+            failed to refresh, the rows scored by refreshes and the number of saved searches held
+        """
+        with self._lock:
+            return dict(self.counts, searches=len(self.searches))
@@ -0,0 +1,548 @@
+"""
+Declarative scoring rules for the framework's dimensions. A rule specification is a JSON serialisable dictionary
+which compile_rule turns into a kernel scoring a whole column of candidates at once, so a dimension can be added
+or tuned by editing its specification rather than writing another per-row function. Each specification has a
+kind:
+
+    bands       ordered bands of comparisons between candidate columns, search inputs and expressions of them,
+                the first band whose clauses hold gives the score, e.g. the salary ratios
+    window      interval windows around a searched range, each widened by a number of units, e.g. within the
+                searched years of experience scores 3 and within 2 years of it scores 2
+    overlap     the share of a list column's values which were searched for, or of the searched values the
+                candidate has, in threshold bands, e.g. the skills matched
+    adjacency   an exact match with the searched values, or a match with values linked to them, e.g. the move
+                statuses close to those searched for
+    distance    distance bands from the searched location, read from the location registry, or from the
+                candidates' own coordinates when they have them
+
+default_rules gives the specifications the framework scores with unless it is given others, reproducing its
+apply_framework_* methods, which tests/test_scoring_rules.py checks them against row by row.
+"""
+import functools
+import json
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+from vocabulary import BitsetColumn, Vocabulary, popcount
+
+def default_rules(framework) -> dict:
+    """
+    The rule specifications of the framework's dimensions, scoring as its apply_framework_* methods do. The links
+    of the adjacency rules are read from the framework's sector_mapping, expertise_mapping and move_status_mapping.
+
+    Args:
+        framework: a SuitabilityScoreFramework, or the class itself
+
+    Returns:
+        the rule specifications keyed by dimension, e.g. to be dumped to a json file and tuned
+    """
+    return {
+        'salary_score': {
+            'kind': 'bands',
+            'values': {'min_salary': {'column': 'Min Salary'}, 'max_salary': {'column': 'Max Salary'},
+                       'input_min': {'input': 'input_salary', 'item': 0}, 'input_max': {'input': 'input_salary', 'item': 1}},
+            'bands': [{'score': 1, 'any': [['max_salary', '<', 'input_min'], [['/', 'min_salary', 'input_min'], '<', 1]]},
+                      {'score': 3, 'all': [[['/', 'min_salary', 'input_min'], '<=', 1.2]]},
+                      {'score': 2, 'all': [[['/', 'min_salary', 'input_max'], '<=', 1.2]]},
+                      {'score': 2, 'all': [[['/', 'min_salary', 'input_min'], '>', 1.2], [['/', 'min_salary', 'input_min'], '<=', 1.5]]}],
+            'default': 1},
+        'location_score': {
+            'kind': 'distance', 'input': 'input_location', 'column': 'Location', 'coordinates': 'Coordinates',
+            'bands': [[50, 3], [100, 2]], 'default': 1},
+        'sector_score': {
+            # apply_framework_to_sector tests the candidate's sector against its own closest sectors
+            'kind': 'adjacency', 'input': 'input_sector', 'column': 'Sector', 'linked_from': 'self',
+            'links': {x: list(y) for x, y in framework.sector_mapping.items()},
+            'exact': 3, 'adjacent': 2, 'default': 1},
+        'wfh_score': {
+            'kind': 'window', 'value': {'column': 'WFH Days'},
+            'low': {'input': 'input_wfh', 'item': 'min'}, 'high': {'input': 'input_wfh', 'item': 'max'},
+            'values': {'first': {'input': 'input_wfh', 'item': 0}},
+            'before': [{'score': 1, 'all': [['value', '==', 0], ['first', '>', 0]]}],
+            'windows': [{'widen': 0, 'score': 3}, {'widen': 1, 'score': 2}],
+            'default': 1},
+        'skills_score': {
+            'kind': 'overlap', 'input': 'input_skills', 'column': 'Skills', 'share_of': 'data',
+            'empty': 1, 'bands': [[0.75, 3], [0.25, 2]], 'default': 1},
+        'experience_score': {
+            'kind': 'window', 'value': {'column': 'Years Experience'},
+            'low': {'input': 'input_experience', 'item': 0}, 'high': {'input': 'input_experience', 'item': 1},
+            'windows': [{'widen': 0, 'score': 3}, {'widen': 2, 'floor': 0, 'score': 2}],
+            'default': 1},
+        'area_score': {
+            'kind': 'overlap', 'input': 'input_areas', 'column': 'Minor Expertise', 'share_of': 'input',
+            'bands': [[0.75, 3], [0.5, 2]], 'default': 1},
+        'expertise_score': {
+            # apply_framework_to_area_of_expertise tests the candidate's expertise against its own closest areas,
+            # which never include it, so no candidate scores adjacent
+            'kind': 'adjacency', 'input': 'input_expertise', 'column': 'Major Expertise', 'linked_from': 'self',
+            'links': {x: list(y) for x, y in framework.expertise_mapping.items()},
+            'exact': 3, 'adjacent': 2, 'default': 1},
+        'move_score': {
+            'kind': 'window', 'value': {'column': 'Last Moved Years'},
+            'low': {'input': 'input_moved', 'item': 0}, 'high': {'input': 'input_moved', 'item': 1},
+            'windows': [{'widen': 0, 'score': 3}, {'widen': 2, 'floor': 0, 'score': 2}],
+            'default': 1},
+        'status_score': {
+            'kind': 'adjacency', 'input': 'input_move_status', 'column': 'Move Status', 'linked_from': 'input',
+            'links': {x: list(y) for x, y in framework.move_status_mapping.items()},
+            'exact': 3, 'adjacent': 2, 'default': 1},
+    }
+
+
+comparisons = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal, '==': np.equal, '!=': np.not_equal}
+operators = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.true_divide, 'max': np.maximum, 'min': np.minimum}
+input_items = {'min': min, 'max': max}
+
+
+class RuleKernel(ABC):
+    """
+    A compiled rule, called with the search criteria and the candidates to score them all at once, or prepared with
+    batch to score many searches. Specifications are checked when the kernel is compiled, so a malformed rule fails
+    at startup rather than on the first search.
+    """
+
+    def __init__(self, spec: dict):
+        """
+        Args:
+            spec: the rule specification
+
+        Raises:
+            ValueError: if the specification is malformed
+        """
+        self.spec = spec
+
+    @staticmethod
+    def _require(spec: dict, keys: list):
+        missing = [x for x in keys if x not in spec]
+        if missing:
+            raise ValueError('The {} rule is missing {}'.format(spec.get('kind'), ', '.join(missing)))
+
+    @staticmethod
+    def _check_scores(scores: list):
+        # suitability scales each dimension between the framework's scores of 1 and 3
+        if not set(scores) <= {1, 2, 3}:
+            raise ValueError('Rule scores must be 1, 2 or 3, not {}'.format(sorted(set(scores) - {1, 2, 3})))
+
+    @property
+    def columns(self) -> list:
+        """
+        The candidate columns the rule reads, other than list columns matched through their BitsetColumn
+        """
+        return [self.spec['column']]
+
+    @abstractmethod
+    def __call__(self, criteria: dict, df: pd.DataFrame, column_indexes: dict = None, location_registry=None, all_mapped_distances: dict = None) -> np.ndarray:
+        """
+        Scores every candidate of df.
+
+        Args:
+            criteria: the search criteria, keyed by the input argument names of the apply_framework_* functions
+            df: the candidate data
+            column_indexes: optional per-candidate structures aligned with the rows of df, see SuitabilityScoreFramework.score_frame
+            location_registry: the location registry distances are read from, for distance rules
+            all_mapped_distances: an optional dictionary of the distance between each pair of locations, used in
+                                  place of the location registry
+
+        Returns:
+            An array with the score of each candidate
+        """
+
+    def batch(self, criteria_list: list, df: pd.DataFrame, column_indexes: dict = None, location_registry=None):
+        """
+        Prepares the rule to score many searches against df, for SuitabilityScoreFramework.score_batch. Kinds which
+        can score every search at once override this, otherwise each search is scored in turn.
+
+        Args:
+            criteria_list: the criteria of each search
+            df: the candidate data
+            column_indexes: optional per-candidate structures aligned with the rows of df
+            location_registry: the location registry distances are read from, for distance rules
+
+        Returns:
+            a function taking broadcastable arrays of search and candidate positions, e.g. a column of searches
+            against a row of candidates, and returning their scores
+        """
+        column_indexes = {} if column_indexes is None else column_indexes
+
+        def score(queries, positions):
+            queries, positions = np.broadcast_arrays(queries, positions)
+            scores = np.empty(queries.shape, dtype=np.int64)
+            for query in np.unique(queries):
+                is_query = queries == query
+                query_positions = positions[is_query]
+                scores[is_query] = self(criteria_list[query], df.iloc[query_positions], column_indexes={x: y.take(query_positions) for x, y in column_indexes.items()},
+                                        location_registry=location_registry)
+            return scores
+
+        return score
+
+
+class BandsKernel(RuleKernel):
+    """
+    Scores ordered bands of clauses. Named values are candidate columns or search inputs, clauses compare
+    expressions of them, e.g. [['/', 'min_salary', 'input_min'], '<=', 1.2], and a band holds when all, or any, of
+    its clauses do. The first band which holds gives the score, otherwise the default.
+    """
+
+    def __init__(self, spec: dict):
+        super().__init__(spec)
+        self._require(spec, ['values', 'bands', 'default'])
+        self.values = spec['values']
+        self.bands = spec['bands']
+        self.default = spec['default']
+
+        for name, operand in spec['values'].items():
+            if not ({'column'} == set(operand) or ('input' in operand and set(operand) <= {'input', 'item'})):
+                raise ValueError('Value {} must be a column or an input'.format(name))
+
+        for band in spec['bands']:
+            if 'score' not in band or len({'all', 'any'} & set(band)) != 1:
+                raise ValueError('Each band needs a score and either all or any clauses')
+            for left, comparison, right in band.get('all', band.get('any')):
+                if comparison not in comparisons:
+                    raise ValueError('Unknown comparison {}'.format(comparison))
+                self._check_expression(left)
+                self._check_expression(right)
+        self._check_scores([x['score'] for x in spec['bands']] + [spec['default']])
+
+    @property
+    def columns(self) -> list:
+        return [x['column'] for x in self.values.values() if 'column' in x]
+
+    def _check_expression(self, expression):
+        if isinstance(expression, str):
+            if expression not in self.values:
+                raise ValueError('Unknown value {}'.format(expression))
+        elif isinstance(expression, list):
+            if len(expression) != 3 or expression[0] not in operators:
+                raise ValueError('Expressions are [operator, left, right] with an operator in {}'.format(', '.join(operators)))
+            self._check_expression(expression[1])
+            self._check_expression(expression[2])
+        elif not isinstance(expression, (int, float)):
+            raise ValueError('Unknown expression {!r}'.format(expression))
+
+    @staticmethod
+    def resolve(operand: dict, criteria: dict, df: pd.DataFrame):
+        """
+        Reads a named value of a rule.
+
+        Args:
+            operand: {'column': name} for a candidate column, or {'input': name} for a search input, with an
+                     optional item of a range input: a position, min or max
+            criteria: the search criteria
+            df: the candidate data
+
+        Returns:
+            an array for a column, otherwise the input value
+        """
+        if 'column' in operand:
+            return df[operand['column']].to_numpy()
+
+        value = criteria[operand['input']]
+        item = operand.get('item')
+        if item is None:
+            return value
+
+        return input_items[item](value) if item in input_items else value[item]
+
+    def _evaluate(self, expression, values: dict):
+        if isinstance(expression, str):
+            return values[expression]
+        if isinstance(expression, list):
+            return operators[expression[0]](self._evaluate(expression[1], values), self._evaluate(expression[2], values))
+
+        return expression
+
+    def _score(self, values: dict, shape: tuple) -> np.ndarray:
+        conditions = []
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for band in self.bands:
+                clauses = [comparisons[y](self._evaluate(x, values), self._evaluate(z, values)) for x, y, z in band.get('all', band.get('any'))]
+                conditions.append(functools.reduce(np.logical_and if 'all' in band else np.logical_or, clauses))
+
+        # bands comparing only inputs give one condition for every candidate
+        conditions = [np.broadcast_to(x, shape) for x in conditions]
+
+        return np.select(conditions, [x['score'] for x in self.bands], default=self.default)
+
+    def __call__(self, criteria: dict, df: pd.DataFrame, column_indexes: dict = None, location_registry=None, all_mapped_distances: dict = None) -> np.ndarray:
+        values = {x: self.resolve(y, criteria, df) for x, y in self.values.items()}
+
+        return self._score(values, (len(df),))
+
+    def batch(self, criteria_list: list, df: pd.DataFrame, column_indexes: dict = None, location_registry=None):
+        columns = {x: y['column'] for x, y in self.values.items() if 'column' in y}
+        inputs = {x: np.array([self.resolve(y, z, df) for z in criteria_list]) for x, y in self.values.items() if 'column' not in y}
+
+        if len(set(columns.values())) == 1:
+            domain, codes = np.unique(df[next(iter(columns.values()))].to_numpy(), return_inverse=True)
+            codes = codes.reshape(-1)
+            if len(domain) * 4 <= len(df):
+                # a single column with few distinct values, e.g. years, is scored once per search over its values and
+                # gathered by each candidate's code
+                values = dict({x: domain[np.newaxis, :] for x in columns}, **{x: y[:, np.newaxis] for x, y in inputs.items()})
+                tables = self._score(values, (len(criteria_list), len(domain)))
+                return lambda queries, positions: tables[queries, codes[positions]]
+
+        column_values = {x: df[y].to_numpy() for x, y in columns.items()}
+
+        def score(queries, positions):
+            values = dict({x: y[positions] for x, y in column_values.items()}, **{x: y[queries] for x, y in inputs.items()})
+            return self._score(values, np.broadcast_shapes(np.shape(queries), np.shape(positions)))
+
+        return score
+
+
+class WindowKernel(BandsKernel):
+    """
+    Scores a candidate value by the widest window around a searched [low, high] range it falls in. Each window is
+    widened by widen units on both sides, with its lower edge clipped to an optional floor, and windows are tried
+    in order, after any bands given as before, e.g. to score 0 WFH days as 1 whenever any are searched for.
+    Compiled into bands, with value, low and high named for the before bands.
+    """
+
+    def __init__(self, spec: dict):
+        self._require(spec, ['value', 'low', 'high', 'windows', 'default'])
+
+        bands = list(spec.get('before', []))
+        for window in spec['windows']:
+            low = ['-', 'low', window['widen']]
+            if window.get('floor') is not None:
+                low = ['max', low, window['floor']]
+            bands.append({'score': window['score'], 'all': [['value', '>=', low], ['value', '<=', ['+', 'high', window['widen']]]]})
+
+        values = dict(spec.get('values', {}), value=spec['value'], low=spec['low'], high=spec['high'])
+        super().__init__({'kind': 'bands', 'values': values, 'bands': bands, 'default': spec['default']})
+        self.spec = spec
+
+
+class OverlapKernel(RuleKernel):
+    """
+    Scores the overlap of a list column with the searched values, as the share of the candidate's distinct values
+    which were searched for (share_of data) or of the searched values which the candidate has (share_of input).
+    The share is scored by threshold bands of [at least, score], tried in order. When empty is given, a candidate
+    without values, or a search without any, scores it.
+    """
+
+    def __init__(self, spec: dict):
+        super().__init__(spec)
+        self._require(spec, ['input', 'column', 'share_of', 'bands', 'default'])
+        self._check_scores([x for _, x in spec['bands']] + [spec['default']] + ([spec['empty']] if 'empty' in spec else []))
+        if spec['share_of'] not in ['data', 'input']:
+            raise ValueError('share_of must be data or input')
+
+    @property
+    def columns(self) -> list:
+        return []
+
+    def _data_lists(self, df: pd.DataFrame, column_indexes: dict) -> BitsetColumn:
+        data_lists = (column_indexes or {}).get(self.spec['column'])
+        if not isinstance(data_lists, BitsetColumn):
+            data_lists = BitsetColumn.from_column(df[self.spec['column']], vocabulary=Vocabulary([]))
+
+        return data_lists
+
+    def score_matches(self, n_values, n_matched, n_inputs) -> np.ndarray:
+        """
+        Args:
+            n_values: the number of distinct values of each candidate
+            n_matched: the number of those values searched for
+            n_inputs: the number of values searched for, all three broadcastable
+
+        Returns:
+            An array of scores
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = n_matched / (n_values if self.spec['share_of'] == 'data' else n_inputs)
+
+        scores = np.select([share >= x for x, _ in self.spec['bands']], [x for _, x in self.spec['bands']], default=self.spec['default'])
+        if 'empty' in self.spec:
+            scores = np.where((n_values == 0) | (n_inputs == 0), self.spec['empty'], scores)
+
+        return scores
+
+    def __call__(self, criteria: dict, df: pd.DataFrame, column_indexes: dict = None, location_registry=None, all_mapped_distances: dict = None) -> np.ndarray:
+        input_values = criteria[self.spec['input']]
+        n_values, n_matched = self._data_lists(df, column_indexes).count_matches(input_values)
+
+        return self.score_matches(n_values, n_matched, len(input_values))
+
+    def batch(self, criteria_list: list, df: pd.DataFrame, column_indexes: dict = None, location_registry=None):
+        data_lists = self._data_lists(df, column_indexes)
+        query_masks = np.stack([data_lists.vocabulary.encode(x[self.spec['input']]) for x in criteria_list]).reshape(len(criteria_list), -1)
+        n_inputs = np.array([len(x[self.spec['input']]) for x in criteria_list], dtype=np.int64)
+
+        # when candidates share few distinct masks, e.g. combinations of a handful of areas, each search scores the
+        # distinct masks once and candidates gather their score by mask, as for a categorical column
+        unique_masks, mask_codes = np.unique(data_lists.masks, axis=0, return_inverse=True)
+        if len(unique_masks) * 4 <= len(data_lists.masks):
+            tables = self.score_matches(popcount(unique_masks)[np.newaxis, :], popcount(unique_masks[np.newaxis, :, :] & query_masks[:, np.newaxis, :]), n_inputs[:, np.newaxis])
+            mask_codes = mask_codes.reshape(-1)
+            return lambda queries, positions: tables[queries, mask_codes[positions]]
+
+        n_values = popcount(data_lists.masks)
+
+        def score(queries, positions):
+            n_matched = popcount(data_lists.masks[positions] & query_masks[queries])
+            return self.score_matches(n_values[positions], n_matched, n_inputs[queries])
+
+        return score
+
+
+class AdjacencyKernel(RuleKernel):
+    """
+    Scores a categorical column as exact when the candidate's value is in the searched values, adjacent when it is
+    linked to them, otherwise default. With linked_from input a value is adjacent when a searched value links to
+    it, with linked_from self when the value links to itself, as the framework's sector and expertise scorers test.
+    Each category is scored once and gathered by the candidates' codes.
+    """
+
+    def __init__(self, spec: dict):
+        super().__init__(spec)
+        self._require(spec, ['input', 'column', 'links', 'exact', 'adjacent', 'default'])
+        self._check_scores([spec['exact'], spec['adjacent'], spec['default']])
+        if spec.get('linked_from', 'input') not in ['input', 'self']:
+            raise ValueError('linked_from must be input or self')
+
+    def score_value(self, input_value, data_value) -> int:
+        """
+        Args:
+            input_value: the searched values, or a single searched value
+            data_value: a category of the column
+
+        Returns:
+            the score of the category
+        """
+        links = self.spec['links']
+
+        if data_value in input_value:
+            return self.spec['exact']
+        if self.spec.get('linked_from', 'input') == 'self':
+            is_linked = data_value in links.get(data_value, [])
+        else:
+            is_linked = any(data_value in links.get(x, []) for x in ([input_value] if isinstance(input_value, str) else input_value))
+
+        return self.spec['adjacent'] if is_linked else self.spec['default']
+
+    def _categories(self, df: pd.DataFrame) -> pd.Series:
+        data_values = df[self.spec['column']]
+
+        return data_values if isinstance(data_values.dtype, pd.CategoricalDtype) else data_values.astype('category')
+
+    def __call__(self, criteria: dict, df: pd.DataFrame, column_indexes: dict = None, location_registry=None, all_mapped_distances: dict = None) -> np.ndarray:
+        data_values = self._categories(df)
+        input_value = criteria[self.spec['input']]
+        lookup_table = np.array([self.score_value(input_value, x) for x in data_values.cat.categories], dtype=np.int64)
+
+        return lookup_table[data_values.cat.codes.to_numpy()]
+
+    def batch(self, criteria_list: list, df: pd.DataFrame, column_indexes: dict = None, location_registry=None):
+        data_values = self._categories(df)
+        categories = data_values.cat.categories
+        codes = data_values.cat.codes.to_numpy()
+        tables = np.array([[self.score_value(x[self.spec['input']], y) for y in categories] for x in criteria_list], dtype=np.int64).reshape(len(criteria_list), len(categories))
+
+        return lambda queries, positions: tables[queries, codes[positions]]
+
+
+class DistanceKernel(RuleKernel):
+    """
+    Scores the distance from the searched location to each candidate's location by bands of [at most km, score].
+    Distances between locations are read from the location registry's distance matrix, or all_mapped_distances when
+    given, once per category. Candidates with their own lat / lon in the GridIndex named by coordinates are scored
+    by radius queries instead.
+    """
+
+    def __init__(self, spec: dict):
+        super().__init__(spec)
+        self._require(spec, ['input', 'column', 'bands', 'default'])
+        self._check_scores([x for _, x in spec['bands']] + [spec['default']])
+
+    def _categories(self, df: pd.DataFrame) -> pd.Series:
+        data_location = df[self.spec['column']]
+
+        return data_location if isinstance(data_location.dtype, pd.CategoricalDtype) else data_location.astype('category')
+
+    def _lookup_table(self, input_location: str, categories: pd.Index, location_registry, all_mapped_distances: dict = None) -> np.ndarray:
+        if all_mapped_distances is not None:
+            distances = np.array([all_mapped_distances[input_location][x] for x in categories], dtype=np.float64)
+        else:
+            distances = location_registry.distance_matrix[location_registry.codes[input_location], location_registry.get_codes(categories)]
+
+        return np.select([distances <= x for x, _ in self.spec['bands']], [x for _, x in self.spec['bands']], default=self.spec['default'])
+
+    def __call__(self, criteria: dict, df: pd.DataFrame, column_indexes: dict = None, location_registry=None, all_mapped_distances: dict = None) -> np.ndarray:
+        input_location = criteria[self.spec['input']]
+        data_location = self._categories(df)
+        lookup_table = self._lookup_table(input_location, data_location.cat.categories, location_registry, all_mapped_distances)
+        scores = lookup_table[data_location.cat.codes.to_numpy()]
+
+        data_coordinates = (column_indexes or {}).get(self.spec.get('coordinates'))
+        if data_coordinates is not None and all_mapped_distances is None:
+            input_lat, input_lon = location_registry.coordinates[location_registry.codes[input_location]]
+            coordinate_scores = data_coordinates.score_bands(lat=input_lat, lon=input_lon, bands=[tuple(x) for x in self.spec['bands']], default=self.spec['default'])
+            scores = np.where(data_coordinates.has_coordinates_mask(), coordinate_scores, scores)
+
+        return scores
+
+    def batch(self, criteria_list: list, df: pd.DataFrame, column_indexes: dict = None, location_registry=None):
+        if (column_indexes or {}).get(self.spec.get('coordinates')) is not None:
+            # candidates with their own lat / lon are scored by radius queries, one search at a time
+            return super().batch(criteria_list, df, column_indexes=column_indexes, location_registry=location_registry)
+
+        data_location = self._categories(df)
+        categories = data_location.cat.categories
+        codes = data_location.cat.codes.to_numpy()
+        tables = np.array([self._lookup_table(x[self.spec['input']], categories, location_registry) for x in criteria_list], dtype=np.int64).reshape(len(criteria_list), len(categories))
+
+        return lambda queries, positions: tables[queries, codes[positions]]
+
+
+rule_kinds = {'bands': BandsKernel, 'window': WindowKernel, 'overlap': OverlapKernel, 'adjacency': AdjacencyKernel, 'distance': DistanceKernel}
+
+
+def compile_rule(spec: dict) -> RuleKernel:
+    """
+    Compiles a rule specification into its kernel.
+
+    Args:
+        spec: the rule specification, see the module docstring
+
+    Returns:
+        a RuleKernel
+
+    Raises:
+        ValueError: if the kind is unknown or the specification is malformed
+    """
+    if spec.get('kind') not in rule_kinds:
+        raise ValueError('Unknown rule kind {!r}, expected one of {}'.format(spec.get('kind'), ', '.join(rule_kinds)))
+
+    return rule_kinds[spec['kind']](spec)
+
+
+def compile_rules(specs: dict) -> dict:
+    """
+    Args:
+        specs: rule specifications keyed by dimension, as the keyword arguments of apply_framework
+
+    Returns:
+        a dictionary of the RuleKernel of each dimension
+    """
+    return {x: compile_rule(y) for x, y in specs.items()}
+
+
+def load_rules(file_path: str) -> dict:
+    """
+    Reads rule specifications from a json file, e.g. some of default_rules with their bands tuned.
+
+    Args:
+        file_path: the path of the json file
+
+    Returns:
+        the rule specifications keyed by dimension
+    """
+    with open(file_path) as f:
+        return json.load(f)
@@ -0,0 +1,256 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class SearchCache:
+    """
+    A bounded least recently used cache of scored search results. Entries are keyed on the normalised search
+    criteria, so the same search submitted with multi-select inputs in a different order is a hit, and the
+    whole cache is dropped when the version of the candidate data it was built from changes.
+    """
+
+    # inputs where the recruiter picks several values and the order they were picked in does not matter
+    multi_select_keys = ['input_skills', 'input_move_status', 'input_areas', 'contract_type']
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 256 * 1024 ** 2):
+        """
+        Args:
+            max_entries: the maximum number of searches held
+            max_bytes: the maximum total size in bytes of the results held
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.dataset_version = None
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def make_key(cls, criteria: dict) -> tuple:
+        """
+        Normalises the search criteria into a hashable key. Multi-select inputs are sorted, as their order does
+        not change the results, while ranges such as the salary keep their [min, max] order.
+
+        Args:
+            criteria: the search criteria
+
+        Returns:
+            a tuple which is equal for any two searches giving the same results
+        """
+        key = []
+
+        for name in sorted(criteria.keys()):
+            value = criteria[name]
+            if isinstance(value, (list, tuple)):
+                value = tuple(sorted(value)) if name in cls.multi_select_keys else tuple(value)
+            key.append((name, value))
+
+        return tuple(key)
+
+    @staticmethod
+    def estimate_size(value) -> int:
+        """
+        Estimates the size in bytes of a cached result, looking inside tuples of frames and arrays.
+
+        Args:
+            value: the cached result
+
+        Returns:
+            the estimated size in bytes
+        """
+        if isinstance(value, pd.DataFrame):
+            return int(value.memory_usage(index=True, deep=True).sum())
+        elif isinstance(value, pd.Series):
+            return int(value.memory_usage(index=True, deep=True))
+        elif isinstance(value, np.ndarray):
+            return int(value.nbytes)
+        elif isinstance(value, (tuple, list)):
+            return sys.getsizeof(value) + sum(SearchCache.estimate_size(x) for x in value)
+        elif isinstance(value, dict):
+            return sys.getsizeof(value) + sum(SearchCache.estimate_size(x) for x in value.values())
+        else:
+            return sys.getsizeof(value)
+
+    def _check_version(self, dataset_version):
+        if dataset_version != self.dataset_version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.total_bytes = 0
+            self.dataset_version = dataset_version
+
+    def get(self, criteria: dict, dataset_version):
+        """
+        Looks up the result of a search, marking it as most recently used.
+
+        Args:
+            criteria: the search criteria
+            dataset_version: the version of the candidate data being searched
+
+        Returns:
+            the cached result, or None if the search is not cached
+        """
+        key = self.make_key(criteria)
+
+        with self._lock:
+            self._check_version(dataset_version)
+
+            if key not in self.entries:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+            return self.entries[key][0]
+
+    def put(self, criteria: dict, dataset_version, result):
+        """
+        Stores the result of a search, evicting the least recently used searches to stay within the bounds.
+        Results larger than max_bytes are not stored.
+
+        Args:
+            criteria: the search criteria
+            dataset_version: the version of the candidate data the result was scored from
+            result: the result of the search
+        """
+        key = self.make_key(criteria)
+        n_bytes = self.estimate_size(result)
+
+        if n_bytes > self.max_bytes:
+            return
+
+        with self._lock:
+            self._check_version(dataset_version)
+
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+
+            self.entries[key] = (result, n_bytes)
+            self.total_bytes += n_bytes
+
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drops every cached result, keeping the counts.
+        """
+        with self._lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            a dictionary with the hit, miss, eviction and invalidation counts and the current size of the cache
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'invalidations': self.invalidations,
+                    'entries': len(self.entries),
+                    'bytes': self.total_bytes}
+
+
+class DimensionScoreCache:
+    """
+    Keeps the score arrays of every framework dimension from each session's last search, keyed on the inputs of
+    that dimension. When a session resubmits with only some inputs changed, e.g. after moving the WFH slider, only
+    the dimensions whose inputs changed are scored again and the rest are reused. Sessions are evicted least
+    recently used first, and all sessions are dropped when the version of the candidate data changes.
+    """
+
+    def __init__(self, max_sessions: int = 64, max_bytes: int = 512 * 1024 ** 2):
+        """
+        Args:
+            max_sessions: the maximum number of sessions held
+            max_bytes: the maximum total size in bytes of the scores held
+        """
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.dataset_version = None
+        self.sessions = OrderedDict()
+        self.total_bytes = 0
+        self.dimensions_reused = 0
+        self.dimensions_scored = 0
+        self._lock = threading.Lock()
+
+    def _session_bytes(self, session: dict) -> int:
+        return sum(x[1].nbytes for x in session['dimensions'].values())
+
+    def score(self, session_id, dataset_version, candidates_key, dimension_inputs: dict, score_dimensions) -> dict:
+        """
+        Scores every dimension for a session's search, reusing the scores of its last search where the inputs
+        of a dimension and the candidates scored are unchanged.
+
+        Args:
+            session_id: the id of the session searching
+            dataset_version: the version of the candidate data being searched
+            candidates_key: a hashable key of the candidates scored, e.g. the contract types selected, scores are
+                            only reused when it matches the session's last search
+            dimension_inputs: a dictionary of each dimension to the search criteria it is scored from
+            score_dimensions: a function taking a list of dimensions and returning a dictionary of their score arrays
+
+        Returns:
+            a dictionary of the int64 score array of every dimension in dimension_inputs, in the same order
+        """
+        input_keys = {x: SearchCache.make_key(y) for x, y in dimension_inputs.items()}
+
+        with self._lock:
+            if dataset_version != self.dataset_version:
+                self.sessions.clear()
+                self.total_bytes = 0
+                self.dataset_version = dataset_version
+
+            session = self.sessions.get(session_id)
+            if session is None or session['candidates_key'] != candidates_key:
+                cached = {}
+            else:
+                cached = {x: y[1] for x, y in session['dimensions'].items() if y[0] == input_keys.get(x)}
+
+        scores = score_dimensions([x for x in dimension_inputs if x not in cached])
+
+        # scores are between 1 and 3, so are held as int8 and widened when they are combined
+        session = {'candidates_key': candidates_key,
+                   'dimensions': {x: (input_keys[x], cached[x] if x in cached else scores[x].astype(np.int8)) for x in dimension_inputs}}
+        n_bytes = self._session_bytes(session)
+
+        with self._lock:
+            self.dimensions_reused += len(cached)
+            self.dimensions_scored += len(scores)
+
+            if session_id in self.sessions:
+                self.total_bytes -= self._session_bytes(self.sessions.pop(session_id))
+
+            if n_bytes <= self.max_bytes:
+                self.sessions[session_id] = session
+                self.total_bytes += n_bytes
+
+            while len(self.sessions) > self.max_sessions or self.total_bytes > self.max_bytes:
+                _, evicted = self.sessions.popitem(last=False)
+                self.total_bytes -= self._session_bytes(evicted)
+
+        return {x: scores[x] if x in scores else cached[x].astype(np.int64) for x in dimension_inputs}
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            a dictionary with the number of dimensions reused and scored, and the current size of the cache
+        """
+        with self._lock:
+            return {'dimensions_reused': self.dimensions_reused,
+                    'dimensions_scored': self.dimensions_scored,
+                    'sessions': len(self.sessions),
+                    'bytes': self.total_bytes}
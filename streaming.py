@@ -0,0 +1,86 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from candidate_data import parse_list_column, list_columns
+from comparison_framework import SuitabilityScoreFramework
+
+
+def stream_top_k(file_path: str, criteria: dict, framework: SuitabilityScoreFramework, k: int = 25, offset: int = 0,
+                 contract_types: list = None, chunk_size: int = 50000) -> tuple:
+    """
+    Finds the best candidates in a candidate file too large to hold in memory. The file is read, parsed and scored
+    in chunks of chunk_size rows, and only the best offset + k candidates seen so far are kept between chunks, so
+    peak memory depends on chunk_size and not on the size of the file. Ties are broken by row number in the file,
+    giving the same ranking as scoring the whole file at once.
+
+    Args:
+        file_path: the path of the candidate csv
+        criteria: the search criteria, keyed by the input argument names of the apply_framework_* functions
+        framework: the framework to score the candidates with
+        k: the number of candidates to return
+        offset: the number of better ranked candidates to skip
+        contract_types: the contract types to include, defaults to all of them
+        chunk_size: the number of rows to read at a time
+
+    Returns:
+        a tuple of a DataFrame with the ranked candidates and their scores, indexed by row number in the file, the
+        number of candidates matching contract_types and the number of rows processed
+    """
+    depth = offset + k
+    best_df = None
+    n_matched = 0
+    n_rows = 0
+
+    for chunk in pd.read_csv(file_path, chunksize=chunk_size):
+        chunk.index = pd.RangeIndex(n_rows, n_rows + len(chunk))
+        n_rows += len(chunk)
+
+        if contract_types is not None:
+            chunk = chunk.loc[chunk['Job Type'].isin(contract_types)]
+        n_matched += len(chunk)
+
+        if len(chunk) == 0:
+            continue
+
+        chunk = chunk.assign(**{col: parse_list_column(chunk[col])[0] for col in list_columns})
+
+        kept_positions, scores_df = framework.score_frame_pruned(df=chunk, criteria=criteria, depth=depth)
+        top_positions, _ = framework.select_top_k(scores=scores_df['Suitability Score'].to_numpy(), k=depth)
+        chunk_best_df = chunk.iloc[kept_positions[np.sort(top_positions)]].join(scores_df.iloc[np.sort(top_positions)])
+
+        # both frames are in row number order, so position tie-breaks in select_top_k follow the file order
+        best_df = chunk_best_df if best_df is None else pd.concat([best_df, chunk_best_df])
+        top_positions, _ = framework.select_top_k(scores=best_df['Suitability Score'].to_numpy(), k=depth)
+        best_df = best_df.iloc[np.sort(top_positions)]
+
+    if best_df is None:
+        return pd.DataFrame(), n_matched, n_rows
+
+    top_positions, _ = framework.select_top_k(scores=best_df['Suitability Score'].to_numpy(), k=k, offset=offset)
+
+    return best_df.iloc[top_positions], n_matched, n_rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scores a candidate csv in chunks and prints the best candidates.')
+    parser.add_argument('file_path', help='the candidate csv')
+    parser.add_argument('criteria', help='a json file with the search criteria, keyed by the input argument names of the apply_framework_* functions')
+    parser.add_argument('--k', type=int, default=25, help='the number of candidates to return')
+    parser.add_argument('--offset', type=int, default=0, help='the number of better ranked candidates to skip')
+    parser.add_argument('--contract-types', nargs='+', default=None, help='the contract types to include')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='the number of rows to read at a time')
+    args = parser.parse_args()
+
+    with open(args.criteria) as criteria_file:
+        search_criteria = json.load(criteria_file)
+
+    ranked_df, n_candidates, n_processed = stream_top_k(file_path=args.file_path, criteria=search_criteria,
+                                                        framework=SuitabilityScoreFramework(), k=args.k,
+                                                        offset=args.offset, contract_types=args.contract_types,
+                                                        chunk_size=args.chunk_size)
+
+    print(ranked_df.to_string())
+    print('Processed {} rows, {} matching candidates'.format(n_processed, n_candidates))
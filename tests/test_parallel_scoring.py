@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+repo_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_directory)
+
+from candidate_store import CandidateStore
+from comparison_framework import SuitabilityScoreFramework
+from parallel_scoring import ParallelScorer
+
+criteria = {'input_salary': [60000, 80000], 'input_location': 'London', 'input_sector': ['Insurance'], 'input_wfh': [1, 3],
+            'input_skills': ['Python', 'SQL'], 'input_experience': [3, 6], 'input_areas': ['Pricing'],
+            'input_expertise': 'Actuarial', 'input_moved': [1, 3], 'input_move_status': ['Actively Looking']}
+
+
+@pytest.fixture(scope='module')
+def store():
+    return CandidateStore.from_csv(os.path.join(repo_directory, 'Dummy_Candidate_Data.csv'))
+
+
+@pytest.fixture
+def scorer(store):
+    scorer = ParallelScorer(df=store.df, framework=SuitabilityScoreFramework(), column_indexes=store.column_indexes,
+                            n_workers=2, min_candidates=0)
+    yield scorer
+    scorer.close()
+
+
+def test_workers_match_the_in_process_scoring(scorer):
+    positions, scores_df, n_matched = scorer.score_top_k(criteria=criteria, depth=50)
+    scorer.close()
+    expected_positions, expected_df, expected_matched = scorer.score_top_k(criteria=criteria, depth=50)
+
+    assert (positions == expected_positions).all()
+    assert (scores_df.to_numpy() == expected_df.to_numpy()).all()
+    assert n_matched == expected_matched
+
+
+def test_searches_after_close_are_scored_in_process(scorer):
+    scorer.score_top_k(criteria=criteria, depth=50, contract_types=['Permanent'])
+    scorer.close()
+    positions, scores_df, n_matched = scorer.score_top_k(criteria=criteria, depth=50, contract_types=['Permanent'])
+
+    assert scorer.executor is None
+    assert scorer.shared_columns.blocks == []
+    assert len(positions) == 50 and n_matched > 0
+
+
+def test_a_scorer_closed_before_its_first_search_never_starts(scorer):
+    scorer.close()
+    scorer.score_top_k(criteria=criteria, depth=10)
+
+    assert scorer.executor is None
+    assert scorer.shared_columns is None
@@ -0,0 +1,219 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+repo_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_directory)
+
+from candidate_data import prepare_candidate_data
+from comparison_framework import SuitabilityScoreFramework
+from locations import GridIndex
+from scoring_rules import RuleKernel, compile_rule, default_rules
+
+
+def check_rules(framework: SuitabilityScoreFramework, df: pd.DataFrame, criteria_list: list, rules: dict = None, n_rows: int = 2000) -> pd.DataFrame:
+    """
+    Checks compiled rules against the framework's apply_framework_* methods, scoring a sample of candidates with
+    both for every search.
+
+    Args:
+        framework: the SuitabilityScoreFramework whose methods are the reference
+        df: the candidate data, with Skills and Minor Expertise as lists
+        criteria_list: the searches to check, each keyed as for score_frame
+        rules: the rule specifications to check, defaults to the framework's default_rules
+        n_rows: the number of candidates sampled, evenly through df
+
+    Returns:
+        a DataFrame with, for each dimension, the number of scores compared, how many differed and the first
+        difference found
+    """
+    kernels = SuitabilityScoreFramework(rules=rules).rules
+    positions = np.unique(np.linspace(0, len(df) - 1, min(n_rows, len(df))).astype(np.int64))
+    rows = df.iloc[positions]
+    records = rows.to_dict('records')
+
+    scalar_scorers = {
+        'salary_score': lambda c, r: framework.apply_framework_to_salary(c['input_salary'], r['Min Salary'], r['Max Salary']),
+        'location_score': lambda c, r: framework.apply_framework_location(c['input_location'], r['Location']),
+        'sector_score': lambda c, r: framework.apply_framework_to_sector(c['input_sector'], r['Sector']),
+        'wfh_score': lambda c, r: framework.apply_framework_to_wfh(c['input_wfh'], r['WFH Days']),
+        'skills_score': lambda c, r: framework.apply_framework_to_skills(c['input_skills'], r['Skills']),
+        'experience_score': lambda c, r: framework.apply_framework_experience_prospecting(c['input_experience'], r['Years Experience']),
+        'area_score': lambda c, r: framework.apply_framework_to_areas(c['input_areas'], r['Minor Expertise']),
+        'expertise_score': lambda c, r: framework.apply_framework_to_area_of_expertise(c['input_expertise'], r['Major Expertise']),
+        'move_score': lambda c, r: framework.apply_framework_to_last_moved(c['input_moved'], r['Last Moved Years']),
+        'status_score': lambda c, r: framework.apply_framework_to_move_status(c['input_move_status'], r['Move Status']),
+    }
+
+    report = []
+    for dimension, kernel in kernels.items():
+        n_compared = 0
+        n_different = 0
+        first_difference = None
+        for criteria in criteria_list:
+            scores = kernel(criteria, rows, location_registry=framework.location_registry)
+            for position, score, record in zip(positions, scores, records):
+                expected = scalar_scorers[dimension](criteria, record)
+                n_compared += 1
+                if score != expected:
+                    n_different += 1
+                    if first_difference is None:
+                        first_difference = 'row {} scored {}, expected {} for {}'.format(position, score, expected, criteria)
+        report.append((dimension, n_compared, n_different, first_difference))
+
+    return pd.DataFrame(report, columns=['Dimension', 'Compared', 'Different', 'First Difference']).set_index('Dimension')
+
+
+def sample_criteria(df: pd.DataFrame, n_searches: int, seed: int = 0, single_values: bool = False) -> list:
+    """
+    Samples searches from the values of the candidate data.
+
+    Args:
+        df: the candidate data, with Skills and Minor Expertise as lists
+        n_searches: the number of searches
+        seed: the random seed
+        single_values: whether the multi-select inputs are given as a single value rather than a list, as the app's
+                       dropdowns do before a second value is picked
+
+    Returns:
+        a list of search criteria
+    """
+    rng = np.random.default_rng(seed)
+
+    def some(values, low=1):
+        values = sorted(set(values))
+        return [values[x] for x in rng.choice(len(values), size=rng.integers(low, min(4, len(values)) + 1), replace=False)]
+
+    def one(values):
+        return str(rng.choice(sorted(set(values))))
+
+    def years_range(col):
+        low = int(rng.integers(0, df[col].max() + 1))
+        return [low, low + int(rng.integers(0, 4))]
+
+    skills = [x for y in df['Skills'] for x in y]
+    areas = [x for y in df['Minor Expertise'] for x in y]
+    criteria_list = []
+    for _ in range(n_searches):
+        min_salary = int(rng.choice(df['Min Salary'].to_numpy()))
+        wfh = sorted(rng.choice(df['WFH Days'].unique(), size=2).tolist())
+        criteria_list.append({'input_salary': [min_salary, int(min_salary * rng.uniform(1, 2))],
+                              'input_location': str(rng.choice(df['Location'].unique())),
+                              'input_sector': some(df['Sector'], low=0),
+                              'input_wfh': wfh,
+                              'input_skills': some(skills, low=0),
+                              'input_experience': years_range('Years Experience'),
+                              'input_areas': some(areas),
+                              'input_expertise': str(rng.choice(df['Major Expertise'].unique())),
+                              'input_moved': years_range('Last Moved Years'),
+                              'input_move_status': some(df['Move Status'], low=0)})
+        if single_values:
+            criteria_list[-1].update({'input_sector': one(df['Sector']),
+                                      'input_skills': one(skills),
+                                      'input_areas': one(areas),
+                                      'input_move_status': one(df['Move Status'])})
+
+    return criteria_list
+
+
+@pytest.fixture(scope='module')
+def candidate_df():
+    return prepare_candidate_data(pd.read_csv(os.path.join(repo_directory, 'Dummy_Candidate_Data.csv')))
+
+
+@pytest.fixture(scope='module')
+def framework():
+    return SuitabilityScoreFramework()
+
+
+def test_default_rules_match_the_framework(framework, candidate_df):
+    report = check_rules(framework, candidate_df, sample_criteria(candidate_df, n_searches=20), n_rows=1000)
+
+    assert report['Different'].sum() == 0, report.to_string()
+
+
+def test_default_rules_match_the_framework_for_single_values(framework, candidate_df):
+    report = check_rules(framework, candidate_df, sample_criteria(candidate_df, n_searches=10, seed=2, single_values=True), n_rows=1000)
+
+    assert report['Different'].sum() == 0, report.to_string()
+
+
+def test_move_status_links_a_single_value(framework):
+    assert framework.apply_framework_to_move_status('Urgently Looking', 'Actively Looking') == 2
+    assert framework.apply_framework_to_move_status('Urgently Looking', 'Open Minded') == 1
+    assert framework.apply_framework_to_move_status(['Urgently Looking'], 'Actively Looking') == 2
+
+
+def test_default_rules_link_the_framework_mappings(framework):
+    rules = default_rules(framework)
+
+    assert rules['sector_score']['links'] == framework.sector_mapping
+    assert rules['expertise_score']['links'] == framework.expertise_mapping
+    assert rules['status_score']['links'] == framework.move_status_mapping
+
+
+def test_score_batch_matches_score_frame(framework, candidate_df):
+    criteria_list = sample_criteria(candidate_df, n_searches=5, seed=1)
+    results = framework.score_batch(df=candidate_df, criteria_list=criteria_list, k=20, memory_budget=1024 ** 2)
+
+    for criteria, (positions, scores_df, n_matched) in zip(criteria_list, results):
+        scored_df = framework.score_frame(df=candidate_df, criteria=criteria)
+        expected_positions, _ = framework.select_top_k(scores=scored_df['Suitability Score'].to_numpy(), k=20)
+
+        assert n_matched == len(candidate_df)
+        assert (positions == expected_positions).all()
+        assert scores_df.equals(scored_df.iloc[expected_positions])
+
+
+def test_rules_replace_the_default_of_their_dimension(candidate_df):
+    spec = default_rules(SuitabilityScoreFramework)['location_score']
+    spec['bands'] = [[10000, 3]]
+    tuned = SuitabilityScoreFramework(rules={'location_score': spec})
+    criteria = sample_criteria(candidate_df, n_searches=1)[0]
+
+    scored_df = tuned.score_frame(df=candidate_df.iloc[:100], criteria=criteria)
+    default_df = SuitabilityScoreFramework().score_frame(df=candidate_df.iloc[:100], criteria=criteria)
+
+    assert (scored_df['Location Score'] == 3).all()
+    assert scored_df.drop(columns=['Location Score', 'Suitability Score']).equals(default_df.drop(columns=['Location Score', 'Suitability Score']))
+
+
+@pytest.mark.parametrize('bands', [[[50, 3], [100, 2]], [[100, 3], [50, 2]], [[300, 2], [20, 3], [150, 1]]])
+def test_coordinates_score_the_same_bands_as_locations(framework, candidate_df, bands):
+    spec = dict(default_rules(framework)['location_score'], bands=bands)
+    kernel = compile_rule(spec)
+    registry = framework.location_registry
+    rows = candidate_df.iloc[:2000]
+    coordinates = GridIndex(registry.coordinates[registry.get_codes(rows['Location'])])
+
+    for input_location in rows['Location'].unique()[:5]:
+        criteria = {'input_location': input_location}
+        expected = kernel(criteria, rows, location_registry=registry)
+        scores = kernel(criteria, rows, column_indexes={'Coordinates': coordinates}, location_registry=registry)
+
+        assert (scores == expected).all()
+
+
+@pytest.mark.parametrize('spec', [
+    {'kind': 'nope'},
+    {'kind': 'bands', 'values': {}, 'bands': [{'score': 3, 'all': [['x', '<', 1]]}], 'default': 1},
+    {'kind': 'bands', 'values': {}, 'bands': [{'score': 4, 'all': [[1, '<', 2]]}], 'default': 1},
+    {'kind': 'overlap', 'input': 'input_skills', 'column': 'Skills', 'share_of': 'x', 'bands': [], 'default': 1},
+    {'kind': 'window', 'value': {'column': 'WFH Days'}},
+])
+def test_malformed_rules_raise(spec):
+    with pytest.raises(ValueError):
+        compile_rule(spec)
+
+
+def test_rules_for_unknown_dimensions_raise():
+    with pytest.raises(ValueError):
+        SuitabilityScoreFramework(rules={'unknown_score': default_rules(SuitabilityScoreFramework)['salary_score']})
+
+
+def test_rule_kernels_must_score():
+    with pytest.raises(TypeError):
+        RuleKernel({'kind': 'bands'})
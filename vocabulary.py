@@ -0,0 +1,389 @@
+import numpy as np
+import pandas as pd
+
+# number of set bits in every possible byte, used to popcount packed masks a byte at a time
+POPCOUNT_TABLE = np.array([bin(x).count('1') for x in range(256)], dtype=np.uint8)
+
+
+def popcount(masks: np.ndarray) -> np.ndarray:
+    """
+    Counts the number of set bits in each packed bitmask.
+
+    Args:
+        masks: an array of uint64 words, with each bitmask packed along the last axis
+
+    Returns:
+        an array with the number of set bits in each bitmask
+    """
+    masks = np.ascontiguousarray(masks, dtype=np.uint64)
+    bytes_view = masks.view(np.uint8).reshape(masks.shape[:-1] + (masks.shape[-1] * 8,))
+
+    return POPCOUNT_TABLE[bytes_view].sum(axis=-1, dtype=np.int64)
+
+
+class Vocabulary:
+    """
+    Interns a set of values, e.g. the unique skills, to integer ids so that a list of values can be stored
+    as a packed bitmask, with bit i set when the value with id i is in the list.
+    """
+
+    def __init__(self, values: list):
+        """
+        Args:
+            values: the values to intern, in id order. Duplicates are dropped
+        """
+        self.values = list(dict.fromkeys(values))
+        self.ids = {x: i for i, x in enumerate(self.values)}
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def n_words(self) -> int:
+        """
+        The number of uint64 words needed to hold a bitmask over the whole vocabulary
+        """
+        return max(1, int(np.ceil(len(self.values) / 64)))
+
+    def extend(self, values: list):
+        """
+        Adds any values which are not already in the vocabulary, keeping the ids of the existing values.
+
+        Args:
+            values: the values to add
+        """
+        for x in values:
+            if x not in self.ids:
+                self.ids[x] = len(self.values)
+                self.values.append(x)
+
+    def encode(self, values: list) -> np.ndarray:
+        """
+        Encodes a list of values as a bitmask. Values which are not in the vocabulary are ignored, as they
+        cannot match any candidate.
+
+        Args:
+            values: the values to encode, e.g. the skills input by the recruiter
+
+        Returns:
+            a 1d array of uint64 words
+        """
+        mask = np.zeros(self.n_words, dtype=np.uint64)
+
+        for x in set(values):
+            if x in self.ids:
+                value_id = self.ids[x]
+                mask[value_id // 64] |= np.uint64(1) << np.uint64(value_id % 64)
+
+        return mask
+
+    def encode_column(self, df_col: pd.Series) -> np.ndarray:
+        """
+        Encodes a column of lists as one bitmask per row. Values not yet in the vocabulary are added to it.
+
+        Args:
+            df_col: a column where each value is a list, e.g. the candidate's skills
+
+        Returns:
+            a 2d array of uint64 words with one row per value in df_col
+        """
+        exploded = pd.Series(df_col.to_numpy(), index=np.arange(len(df_col))).explode().dropna()
+        self.extend(pd.unique(exploded.to_numpy()))
+
+        rows = exploded.index.to_numpy(dtype=np.int64)
+        value_ids = exploded.map(self.ids).to_numpy(dtype=np.int64)
+
+        return self.encode_ids(row_ids=rows, value_ids=value_ids, n_rows=len(df_col))
+
+    def encode_ids(self, row_ids: np.ndarray, value_ids: np.ndarray, n_rows: int) -> np.ndarray:
+        """
+        Encodes values which are already interned as one bitmask per row.
+
+        Args:
+            row_ids: the row of each value
+            value_ids: the id of each value in this vocabulary
+            n_rows: the number of rows
+
+        Returns:
+            a 2d array of uint64 words with n_rows rows
+        """
+        masks = np.zeros((n_rows, self.n_words), dtype=np.uint64)
+        bits = np.left_shift(np.uint64(1), (value_ids % 64).astype(np.uint64))
+        np.bitwise_or.at(masks, (row_ids, value_ids // 64), bits)
+
+        return masks
+
+    def decode(self, mask: np.ndarray) -> list:
+        """
+        Decodes a single bitmask back into its values, in id order.
+
+        Args:
+            mask: a 1d array of uint64 words
+
+        Returns:
+            a list of the values whose bits are set
+        """
+        bits = np.unpackbits(np.asarray(mask, dtype=np.uint64).view(np.uint8), bitorder='little')
+
+        return [self.values[x] for x in np.flatnonzero(bits[:len(self.values)])]
+
+
+class BitsetColumn:
+    """
+    A list column, e.g. Skills or Minor Expertise, stored as one packed bitmask per candidate so that
+    matching against the search criteria is an AND and a popcount rather than a set per candidate.
+    """
+
+    def __init__(self, masks: np.ndarray, vocabulary: Vocabulary):
+        """
+        Args:
+            masks: a 2d array of uint64 words, one row per candidate
+            vocabulary: the vocabulary the bits are interned against
+        """
+        self.masks = masks
+        self.vocabulary = vocabulary
+
+    @classmethod
+    def from_column(cls, df_col: pd.Series, vocabulary: Vocabulary):
+        """
+        Encodes a column of lists against vocabulary.
+
+        Args:
+            df_col: a column where each value is a list
+            vocabulary: the vocabulary to intern the values against, extended with any unseen values
+
+        Returns:
+            a BitsetColumn with one row per value in df_col
+        """
+        return cls(masks=vocabulary.encode_column(df_col), vocabulary=vocabulary)
+
+    @classmethod
+    def from_ids(cls, row_ids: np.ndarray, value_ids: np.ndarray, values: list, n_rows: int, vocabulary: Vocabulary):
+        """
+        Encodes a list column which has been parsed into ids, e.g. by candidate_data.parse_list_column, without
+        going back to the values of each row.
+
+        Args:
+            row_ids: the row of each parsed value
+            value_ids: the id of each parsed value, indexing values
+            values: the values the ids refer to
+            n_rows: the number of rows
+            vocabulary: the vocabulary to intern the values against, extended with any unseen values
+
+        Returns:
+            a BitsetColumn with n_rows rows
+        """
+        vocabulary.extend(values)
+        vocabulary_ids = np.array([vocabulary.ids[x] for x in values], dtype=np.int64)
+
+        return cls(masks=vocabulary.encode_ids(row_ids=row_ids, value_ids=vocabulary_ids[value_ids], n_rows=n_rows), vocabulary=vocabulary)
+
+    @classmethod
+    def concat(cls, columns: list, vocabulary: Vocabulary):
+        """
+        Stacks BitsetColumns interned against different vocabularies, e.g. the candidates already loaded and a
+        delta of new candidates, re-interning their bits against one vocabulary.
+
+        Args:
+            columns: the BitsetColumns to stack, in row order
+            vocabulary: the vocabulary to intern the values against, extended with any unseen values
+
+        Returns:
+            a BitsetColumn with the rows of every column
+        """
+        for column in columns:
+            vocabulary.extend(column.vocabulary.values)
+
+        masks = []
+        for column in columns:
+            vocabulary_ids = np.array([vocabulary.ids[x] for x in column.vocabulary.values], dtype=np.int64)
+            if np.array_equal(vocabulary_ids, np.arange(len(vocabulary_ids))):
+                # the column's ids are unchanged, its masks only need the words of any added values
+                padding = np.zeros((len(column), vocabulary.n_words - column.masks.shape[1]), dtype=np.uint64)
+                masks.append(np.hstack([column.masks, padding]))
+            else:
+                bits = np.unpackbits(np.ascontiguousarray(column.masks).view(np.uint8), axis=1, bitorder='little')[:, :len(vocabulary_ids)]
+                row_ids, value_ids = np.nonzero(bits)
+                masks.append(vocabulary.encode_ids(row_ids=row_ids, value_ids=vocabulary_ids[value_ids], n_rows=len(column)))
+
+        return cls(masks=np.vstack(masks), vocabulary=vocabulary)
+
+    def __len__(self):
+        return len(self.masks)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The number of bytes held by the bitmasks
+        """
+        return self.masks.nbytes
+
+    def take(self, positions: np.ndarray):
+        """
+        Selects the bitmasks of a subset of candidates.
+
+        Args:
+            positions: the row positions to select
+
+        Returns:
+            a BitsetColumn aligned with positions
+        """
+        return BitsetColumn(masks=self.masks[positions], vocabulary=self.vocabulary)
+
+    def count_matches(self, input_values: list) -> tuple:
+        """
+        Counts, for every candidate, the number of distinct values held and how many of those are in input_values.
+
+        Args:
+            input_values: the values to match against
+
+        Returns:
+            a tuple of two arrays, the number of distinct values per candidate and the number matched
+        """
+        query_mask = self.vocabulary.encode(input_values)
+
+        return popcount(self.masks), popcount(self.masks & query_mask)
+
+    def decode_matches(self, positions: np.ndarray, input_values: list) -> list:
+        """
+        Decodes the matched values for a subset of candidates, e.g. only the rows being displayed.
+
+        Args:
+            positions: the row positions to decode
+            input_values: the values which were matched against
+
+        Returns:
+            a list with the matched values of each selected candidate
+        """
+        query_mask = self.vocabulary.encode(input_values)
+
+        return [self.vocabulary.decode(x) for x in self.masks[positions] & query_mask]
+
+
+class ListColumn:
+    """
+    A list column, e.g. Skills or Minor Expertise, stored as the vocabulary ids of every row's items in one flat
+    array with the offset of each row's first item. Rows keep the order of their items without a Python list per
+    candidate, and the lists are only built for the rows being displayed.
+    """
+
+    def __init__(self, offsets: np.ndarray, ids: np.ndarray, vocabulary: Vocabulary):
+        """
+        Args:
+            offsets: an array of n_rows + 1 offsets, the items of row i are ids[offsets[i]:offsets[i + 1]]
+            ids: the vocabulary id of every item, row after row
+            vocabulary: the vocabulary the ids are interned against
+        """
+        self.offsets = offsets
+        self.ids = ids
+        self.vocabulary = vocabulary
+
+    @classmethod
+    def from_ids(cls, row_ids: np.ndarray, value_ids: np.ndarray, values: list, n_rows: int, vocabulary: Vocabulary):
+        """
+        Stores a list column which has been parsed into ids, e.g. by candidate_data.parse_list_column.
+
+        Args:
+            row_ids: the row of each parsed value, with the values of each row in their list order
+            value_ids: the id of each parsed value, indexing values
+            values: the values the ids refer to
+            n_rows: the number of rows
+            vocabulary: the vocabulary to intern the values against, extended with any unseen values
+
+        Returns:
+            a ListColumn with n_rows rows
+        """
+        vocabulary.extend(values)
+        vocabulary_ids = np.array([vocabulary.ids[x] for x in values], dtype=np.int64)
+
+        order = np.argsort(row_ids, kind='stable')
+        n_items = np.bincount(row_ids, minlength=n_rows)
+        offsets = np.concatenate([[0], np.cumsum(n_items)])
+
+        offsets_dtype = np.int32 if offsets[-1] <= np.iinfo(np.int32).max else np.int64
+        ids_dtype = np.min_scalar_type(max(len(vocabulary) - 1, 0))
+
+        return cls(offsets=offsets.astype(offsets_dtype), ids=vocabulary_ids[value_ids[order]].astype(ids_dtype), vocabulary=vocabulary)
+
+    @classmethod
+    def concat(cls, columns: list, vocabulary: Vocabulary):
+        """
+        Stacks ListColumns interned against different vocabularies, re-interning their ids against one vocabulary.
+
+        Args:
+            columns: the ListColumns to stack, in row order
+            vocabulary: the vocabulary to intern the values against, extended with any unseen values
+
+        Returns:
+            a ListColumn with the rows of every column
+        """
+        for column in columns:
+            vocabulary.extend(column.vocabulary.values)
+
+        ids = [np.array([vocabulary.ids[x] for x in y.vocabulary.values], dtype=np.int64)[y.ids] for y in columns]
+        n_items = np.concatenate([np.diff(x.offsets) for x in columns])
+        offsets = np.concatenate([[0], np.cumsum(n_items)])
+
+        offsets_dtype = np.int32 if offsets[-1] <= np.iinfo(np.int32).max else np.int64
+        ids_dtype = np.min_scalar_type(max(len(vocabulary) - 1, 0))
+
+        return cls(offsets=offsets.astype(offsets_dtype), ids=np.concatenate(ids).astype(ids_dtype), vocabulary=vocabulary)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The number of bytes held by the offsets and ids
+        """
+        return self.offsets.nbytes + self.ids.nbytes
+
+    def take(self, positions: np.ndarray):
+        """
+        Selects the lists of a subset of rows.
+
+        Args:
+            positions: the row positions to select
+
+        Returns:
+            a ListColumn aligned with positions
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = self.offsets[positions].astype(np.int64)
+        n_items = self.offsets[positions + 1].astype(np.int64) - starts
+        offsets = np.concatenate([[0], np.cumsum(n_items)])
+
+        # the position in ids of every item of the selected rows, row after row
+        item_positions = np.repeat(starts - offsets[:-1], n_items) + np.arange(offsets[-1])
+        offsets_dtype = np.int32 if offsets[-1] <= np.iinfo(np.int32).max else np.int64
+
+        return ListColumn(offsets=offsets.astype(offsets_dtype), ids=self.ids[item_positions], vocabulary=self.vocabulary)
+
+    def to_lists(self, positions: np.ndarray = None) -> list:
+        """
+        Builds the lists of a subset of rows.
+
+        Args:
+            positions: the row positions to build, defaults to every row
+
+        Returns:
+            a list with the list of values of each selected row
+        """
+        positions = np.arange(len(self)) if positions is None else np.asarray(positions)
+        values = self.vocabulary.values
+
+        return [[values[x] for x in self.ids[self.offsets[y]:self.offsets[y + 1]]] for y in positions.tolist()]
+
+    def join(self, positions: np.ndarray = None, separator: str = ', ') -> list:
+        """
+        Joins the values of each of a subset of rows into a string, e.g. for display.
+
+        Args:
+            positions: the row positions to join, defaults to every row
+            separator: the string between values
+
+        Returns:
+            a list with the joined values of each selected row
+        """
+        return [separator.join(x) for x in self.to_lists(positions)]